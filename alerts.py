@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :alerts.py
+
+"""
+temporal fire tracker: turns the flickering per-frame boxes of a video or stream into debounced
+fireStart / fireEnd events while the source is still being processed, and hands them to pluggable sinks.
+
+    python alerts.py [port]    local webhook stand-in, prints every alert posted to http://127.0.0.1:<port>/
+
+sinks are given as strings: 'log', 'file:<path>.jsonl', or an http(s) url the events are posted to as json.
+nothing in here may import Qt.
+"""
+
+import sys
+import json
+import time
+import queue
+import threading
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def boxIou(a: list[float], b: list[float]) -> float:
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class LogSink:
+    def emit(self, event: dict) -> None:
+        print(f"{event['event']}: {event['source']} track {event['track']} ({event['class']}) "
+              f"at {event['timestampMs'] / 1000:.1f}s, conf {event['conf']}")
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink:
+    """appends one json line per event"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def emit(self, event: dict) -> None:
+        with self.lock, open(self.path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+    def close(self) -> None:
+        pass
+
+
+class WebhookSink:
+    """posts every event as json to url from a background thread, a slow or dead endpoint never blocks detection"""
+
+    def __init__(self, url: str, timeout: float = 3.0):
+        self.url = url
+        self.timeout = timeout
+        self.queue: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(target=self._post, name='WebhookSink', daemon=True)
+        self.thread.start()
+
+    def emit(self, event: dict) -> None:
+        self.queue.put(event)
+
+    def _post(self) -> None:
+        while (event := self.queue.get()) is not None:
+            request = urllib.request.Request(self.url, data=json.dumps(event).encode(),
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except OSError as e:
+                print(f'alert webhook {self.url} failed: {e}')
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join(self.timeout)
+
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, event: dict) -> None:
+        self.callback(event)
+
+    def close(self) -> None:
+        pass
+
+
+def emitEvent(sinks: list, event: dict) -> None:
+    for sink in sinks:
+        try:
+            sink.emit(event)
+        except Exception as e:  # a broken sink must not stop the detection
+            print(f'alert sink {type(sink).__name__} failed: {e}')
+
+
+def makeSinks(specs: list[str]) -> list:
+    sinks = []
+    for spec in specs:
+        if spec == 'log':
+            sinks.append(LogSink())
+        elif spec.startswith('file:'):
+            sinks.append(FileSink(spec[len('file:'):]))
+        elif spec.startswith(('http://', 'https://')):
+            sinks.append(WebhookSink(spec))
+        else:
+            print(f'unknown alert sink {spec}, expected log, file:<path> or an http url')
+    return sinks
+
+
+class FireTrack:
+    def __init__(self, trackId: int, record: dict, frame: int, window: int):
+        self.id = trackId
+        self.className = record['class']
+        self.box = record['xyxy']
+        self.confidences: deque[float] = deque(maxlen=window)
+        self.lastSeen = frame
+        self.active = False
+
+    def hitRatio(self) -> float:
+        # share of the last window updates the track was seen in, a single lucky frame can not start an alert
+        return sum(1 for conf in self.confidences if conf > 0) / self.confidences.maxlen
+
+    def smoothed(self) -> float:
+        # mean confidence of the updates it was seen in, the misses of a flickering fire do not drag it down
+        hits = [conf for conf in self.confidences if conf > 0]
+        return sum(hits) / len(hits) if hits else 0.0
+
+
+class FireTracker:
+    """
+    per source tracker. boxes are associated with the tracks of the previous frames by iou (same class),
+    every track keeps the confidences of the last `window` updates (0 when it was missed).
+    a track starts an event once it was seen in at least minHitRatio of the window and its smoothed confidence
+    (the mean over the updates it was seen in) reaches startThreshold. it ends the event when it is seen in
+    less than half of minHitRatio or its confidence falls below endThreshold, the gap keeps an event from
+    flapping. a fire detected at 0.9 in every other frame starts an event, one stray box never does.
+    a track not seen for `window` updates is dropped (and ended).
+    """
+
+    def __init__(self, source: str, sinks: list, window: int = 15, startThreshold: float = 0.5,
+                 endThreshold: float | None = None, iouThreshold: float = 0.3, minHitRatio: float = 0.4):
+        self.source = source
+        self.sinks = sinks
+        self.window = max(1, window)
+        self.startThreshold = startThreshold
+        self.endThreshold = startThreshold * 0.5 if endThreshold is None else endThreshold
+        self.iouThreshold = iouThreshold
+        self.minHitRatio = minHitRatio
+
+        self.tracks: list[FireTrack] = []
+        self.nextId = 1
+        self.events = 0
+
+    def update(self, frame: int, timestampMs: float, records: list[dict]) -> None:
+        unmatched = list(range(len(records)))
+        for track in self.tracks:
+            best, bestIou = None, self.iouThreshold
+            for i in unmatched:
+                if records[i]['class'] == track.className:
+                    iou = boxIou(track.box, records[i]['xyxy'])
+                    if iou >= bestIou:
+                        best, bestIou = i, iou
+            if best is None:
+                track.confidences.append(0.0)
+                continue
+            unmatched.remove(best)
+            track.box = records[best]['xyxy']
+            track.confidences.append(records[best]['conf'])
+            track.lastSeen = frame
+
+        for i in unmatched:
+            track = FireTrack(self.nextId, records[i], frame, self.window)
+            track.confidences.append(records[i]['conf'])
+            self.tracks.append(track)
+            self.nextId += 1
+
+        for track in list(self.tracks):
+            conf, hitRatio = track.smoothed(), track.hitRatio()
+            if not track.active and hitRatio >= self.minHitRatio and conf >= self.startThreshold:
+                track.active = True
+                self._emit('fireStart', track, frame, timestampMs)
+            elif track.active and (hitRatio < self.minHitRatio / 2 or conf < self.endThreshold):
+                track.active = False
+                self._emit('fireEnd', track, frame, timestampMs)
+            if not any(track.confidences):  # missed for a whole window
+                self.tracks.remove(track)
+
+    def close(self, frame: int, timestampMs: float) -> None:
+        """the source ended, end every open event"""
+        for track in self.tracks:
+            if track.active:
+                track.active = False
+                self._emit('fireEnd', track, frame, timestampMs)
+        self.tracks.clear()
+
+    def _emit(self, name: str, track: FireTrack, frame: int, timestampMs: float) -> None:
+        self.events += 1
+        event = {'event': name, 'source': self.source, 'track': track.id, 'class': track.className,
+                 'frame': frame, 'timestampMs': round(timestampMs, 1), 'conf': round(track.smoothed(), 3),
+                 'xyxy': track.box, 'time': time.time()}
+        emitEvent(self.sinks, event)
+
+
+class WebhookServer:
+    """local stand-in for the alert endpoint, prints every json body posted to it"""
+
+    def __init__(self, port: int = 8091, host: str = '127.0.0.1'):
+        self.address = (host, port)
+        self.received: list[dict] = []
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.address[0]}:{self.address[1]}/'
+
+    def _makeHandler(self):
+        received = self.received
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    event = json.loads(body)
+                    received.append(event)
+                    print(json.dumps(event), flush=True)
+                    self.send_response(204)
+                except ValueError:
+                    self.send_response(400)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve(self) -> None:
+        self.server = ThreadingHTTPServer(self.address, self._makeHandler())
+        self.server.serve_forever()
+
+
+if __name__ == '__main__':
+    server = WebhookServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8091)
+    print(f'waiting for alerts at {server.url}, ctrl+c to stop', file=sys.stderr)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
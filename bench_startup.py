@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :bench_startup.py
+
+"""
+startup benchmark, run it for every release and keep the json line it prints:
+
+    python bench_startup.py [--runs 5] [--gui]
+
+import: wall time of `import main` and `import cli` in a fresh interpreter (median of --runs),
+plus the modules with the largest cumulative import time.
+gui: time until the window is painted and until the model is ready
+(needs a display, or QT_QPA_PLATFORM=offscreen).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def timeImport(module: str, runs: int) -> float:
+    code = f'import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)'
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(samples), 4)
+
+
+def heaviestImports(module: str, count: int = 5) -> list[tuple[str, float]]:
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=HERE, capture_output=True, text=True, check=True)
+    imports = []
+    for line in output.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((parts[2].strip(), int(parts[1]) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def timeGui(timeout: float = 120.0) -> dict:
+    started = time.perf_counter()
+    sys.path.insert(0, HERE)
+    os.chdir(HERE)
+    from PySide6.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication([])
+    window = main.MainWindow()
+    window.show()
+    app.processEvents()
+    shown = time.perf_counter()
+
+    window.warmupModel()
+    while window.warmupThread is not None and time.perf_counter() - shown < timeout:
+        app.processEvents()
+        time.sleep(0.01)
+    ready = time.perf_counter()
+    window.close()
+    return {'windowShown': round(shown - started, 4), 'modelReady': round(ready - started, 4),
+            'modelFailed': window.warmupFailed}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='FireEye startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gui', action='store_true', help='also time window and model warm-up')
+    args = parser.parse_args()
+
+    report = {
+        'python': sys.version.split()[0],
+        'importMain': timeImport('main', args.runs),
+        'importCli': timeImport('cli', args.runs),
+        'heaviestImports': heaviestImports('main'),
+    }
+    if args.gui:
+        report.update(timeGui())
+    print(json.dumps(report))
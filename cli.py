@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :cli.py
+
+"""
+headless batch runner for machines without a display, it never imports Qt.
+
+    python cli.py testSources/picture "footage/**/*.mp4" one.png --workers 4
+    python cli.py --watch /share/snapshots
+
+reads the same config/config.json as the window (every value can be overridden on the command line).
+progress is written to stdout as json lines, everything else goes to stderr.
+exit codes: 0 every source done, 1 some sources failed, 2 bad arguments or nothing to detect,
+3 the model could not be loaded, 130 interrupted.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+
+from settings import Settings, pa, IMAGE_SUFFIXES, VIDEO_SUFFIXES
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_MODEL = 3
+EXIT_INTERRUPTED = 130
+
+
+def collectSources(patterns: list[str], recursive: bool = False) -> list[str]:
+    """expand files, globs and directories into a deduplicated list of image and video paths"""
+    suffixes = IMAGE_SUFFIXES + VIDEO_SUFFIXES
+    sources: list[str] = []
+    seen: set[str] = set()
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                matches = [os.path.join(root, name) for root, _, names in os.walk(pattern) for name in sorted(names)]
+            else:
+                matches = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))]
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+
+        for path in matches:
+            path = pa(os.path.abspath(path))
+            if path not in seen and path.lower().endswith(suffixes) and os.path.isfile(path):
+                seen.add(path)
+                sources.append(path)
+    return sources
+
+
+class JsonLines:
+    """one json object per line, flushed at once so a supervising job sees the progress live"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.started = time.monotonic()
+        self.lock = threading.Lock()  # the watch mode emits from several threads
+
+    def emit(self, event: str, **fields) -> None:
+        record = {'event': event, 't': round(time.monotonic() - self.started, 3), **fields}
+        with self.lock:
+            self.stream.write(json.dumps(record) + '\n')
+            self.stream.flush()
+
+    def alert(self, event: dict) -> None:
+        # 'event' is the json line type already, the start / end goes into 'alert'
+        self.emit('alert', alert=event['event'], **{key: value for key, value in event.items()
+                                                    if key not in ('event', 'time')})
+
+
+def parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='cli.py', description='FireEye headless batch detection')
+    parser.add_argument('sources', nargs='+', help='image / video files, globs or directories')
+    parser.add_argument('-r', '--recursive', action='store_true', help='descend into sub directories')
+    parser.add_argument('--config', default='config/config.json', help='config file, default: %(default)s')
+    parser.add_argument('--model', help='override Model.ModelPath')
+    parser.add_argument('--output', help='override common.OutputPath')
+    parser.add_argument('--conf', help='override Model.confidence')
+    parser.add_argument('--batch-size', help='override Model.batchSize')
+    parser.add_argument('--workers', help='override Model.workers, 0 = auto')
+    parser.add_argument('--backend', help='override Model.backend: pytorch, onnx or openvino')
+    parser.add_argument('--sample-interval', help='override Model.sampleInterval, run the model on every n-th frame')
+    parser.add_argument('--motion-threshold', help='override Model.motionThreshold, 0 = no motion gate')
+    parser.add_argument('--prefilter', action='store_true', help='enable the colour / flicker prefilter')
+    parser.add_argument('--prefilter-color', help='override Model.prefilterColor')
+    parser.add_argument('--prefilter-flicker', help='override Model.prefilterFlicker')
+    parser.add_argument('--tiling', action='store_true', help='detect large images in tiles')
+    parser.add_argument('--tile-size', help='override Model.tileSize')
+    parser.add_argument('--tile-overlap', help='override Model.tileOverlap')
+    parser.add_argument('--tile-color', help='override Model.tileColor')
+    parser.add_argument('--no-cache', action='store_true', help='detect every source again, ignore the result cache')
+    parser.add_argument('--no-annotate', action='store_true', help='only record the boxes, no annotated copies')
+    parser.add_argument('--no-store', action='store_true', help='do not record the boxes in detections.sqlite')
+    parser.add_argument('--clips', action='store_true', help='write only padded clips around the detections')
+    parser.add_argument('--alert', action='append', metavar='SINK',
+                        help='override common.alertSinks, repeatable: log, file:<path> or a webhook url')
+    parser.add_argument('--decode-process', action='store_true',
+                        help='decode videos in a child process, the frames are shared instead of copied')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep watching the given directories and detect new files as they arrive')
+    parser.add_argument('--device', help='cpu, cuda:0, ... default: cuda if available')
+    return parser.parse_args(argv)
+
+
+def applyOverrides(settings: Settings, args: argparse.Namespace) -> None:
+    # the overrides are only for this run, the config file is left alone
+    if args.model:
+        settings.ModelPath = settings._modelPathValidator(args.model)
+    if args.output:
+        settings.outputPath = settings._outputPathValidator(args.output)
+    if args.conf:
+        settings.confidence = settings.confidenceValidator(args.conf)
+    if args.batch_size:
+        settings.batchSize = settings.batchSizeValidator(args.batch_size)
+    if args.workers:
+        settings.workers = settings.workersValidator(args.workers)
+    if args.backend:
+        settings.backend = settings.backendValidator(args.backend)
+    if args.sample_interval:
+        settings.sampleInterval = settings.sampleIntervalValidator(args.sample_interval)
+    if args.motion_threshold:
+        settings.motionThreshold = settings.motionThresholdValidator(args.motion_threshold)
+    if args.prefilter:
+        settings.prefilter = True
+    if args.prefilter_color:
+        settings.prefilterColor = settings.prefilterThresholdValidator(args.prefilter_color, 0.0005)
+    if args.prefilter_flicker:
+        settings.prefilterFlicker = settings.prefilterThresholdValidator(args.prefilter_flicker, 0.0)
+    if args.no_cache:
+        settings.resultCache = False
+    if args.no_annotate:
+        settings.saveAnnotated = False
+    if args.no_store:
+        settings.detectionStore = False
+    if args.clips:
+        settings.videoOutput = 'clips'
+    if args.tiling:
+        settings.tiling = True
+    if args.tile_size:
+        settings.tileSize = settings.tileSizeValidator(args.tile_size)
+    if args.tile_overlap:
+        settings.tileOverlap = settings.tileOverlapValidator(args.tile_overlap)
+    if args.tile_color:
+        settings.tileColor = settings.prefilterThresholdValidator(args.tile_color, 0.003)
+    if args.decode_process:
+        settings.decodeProcess = True
+    if args.alert:
+        settings.alertSinks = settings.alertSinksValidator(args.alert)
+
+
+def run(args: argparse.Namespace, events: JsonLines) -> int:
+    settings = Settings(args.config)
+    applyOverrides(settings, args)
+    if args.watch:
+        return runWatch(args, settings, events)
+
+    sources = collectSources(args.sources, args.recursive)
+    events.emit('start', sources=len(sources), model=settings.ModelPath, output=settings.outputPath)
+    if not sources:
+        events.emit('finished', ok=0, failed=0)
+        return EXIT_USAGE
+
+    # everything heavy (torch, ultralytics) is only imported from here on
+    from engine import modelRegistry, detectSources, defaultDevice
+    from scheduler import DetectionScheduler, planWorkers, makeTasks
+
+    device = args.device or ('cpu' if settings.backend != 'pytorch' else defaultDevice())
+    workers, threads = planWorkers(settings.workers, len(makeTasks(sources, settings.batchSize)), device)
+    # loaded here even when worker processes do the work: a broken model fails once with EXIT_MODEL,
+    # not in every worker with every source counted as failed
+    try:
+        modelRegistry.get(settings.ModelPath, device=device, backend=settings.backend)
+    except Exception as e:
+        events.emit('error', message=f'failed to load model: {e}')
+        return EXIT_MODEL
+    events.emit('ready', device=device, workers=workers, threads=threads)
+
+    failed = 0
+    lastPercent: dict[str, int] = {}
+
+    def onFinished(path: str, ok: bool) -> None:
+        nonlocal failed
+        failed += not ok
+        events.emit('done', path=path, ok=ok)
+
+    def onProgress(path: str, frameIndex: int, frameCount: int) -> None:
+        percent = frameIndex * 100 // frameCount if frameCount else frameIndex
+        if percent != lastPercent.get(path):
+            lastPercent[path] = percent
+            events.emit('progress', path=path, frame=frameIndex, frames=frameCount)
+
+    scheduler = DetectionScheduler()
+    try:
+        stats = detectSources(sources, settings, device=device, onFinished=onFinished, onProgress=onProgress,
+                              onAlert=events.alert, scheduler=scheduler)
+    finally:
+        scheduler.close()
+    events.emit('finished', ok=len(sources) - failed, failed=failed, **stats)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def runWatch(args: argparse.Namespace, settings: Settings, events: JsonLines) -> int:
+    # runs until interrupted, every detected file is one 'done' line
+    from watch import WatchDetector
+
+    roots = [pa(os.path.abspath(root)) for root in args.sources if os.path.isdir(root)]
+    if not roots:
+        events.emit('error', message='--watch needs at least one directory')
+        return EXIT_USAGE
+    detectors = [WatchDetector(settings, root, onQueued=lambda paths: events.emit('queued', paths=paths),
+                               onFinished=lambda path, ok: events.emit('done', path=path, ok=ok),
+                               onAlert=events.alert, device=args.device) for root in roots]
+    try:
+        for detector in detectors:
+            detector.start()
+        events.emit('watching', roots=roots)
+        while True:
+            time.sleep(1)
+    finally:
+        for detector in detectors:
+            detector.stop()
+        events.emit('watchStats', watchers=[detector.stats() for detector in detectors])
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parseArgs(argv)
+    events = JsonLines(sys.stdout)
+    # prints of the engine and of ultralytics must not end up between the json lines
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        return run(args, events)
+    except KeyboardInterrupt:
+        events.emit('interrupted')
+        return EXIT_INTERRUPTED
+    finally:
+        sys.stdout = stdout
+
+
+if __name__ == '__main__':
+    sys.exit(main())
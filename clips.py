@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :clips.py
+
+"""
+event clip output: instead of re-encoding a whole video only the stretches around detections are written,
+as <name>.event001.avi, <name>.event002.avi ... plus a <name>.events.json timeline.
+encoding runs on its own thread, the detection loop only hands frames over.
+"""
+
+import os
+import json
+import queue
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from settings import pa, clipFilePath, eventsFilePath
+
+
+class ClipWriter:
+    """
+    push() every annotated frame with its boxes. a frame with boxes opens an event: the last `padding` seconds
+    before it are written first, the clip goes on until `padding` seconds passed without boxes, so two detections
+    closer than that end up in one clip. close() finishes the last clip and writes the timeline.
+    """
+
+    def __init__(self, outputDir: str, sourcePath: str, fps: float, padding: float = 2.0, queueSize: int = 256):
+        self.outputDir = outputDir
+        self.sourcePath = sourcePath
+        self.fps = fps
+        self.padding = padding
+        self.padFrames = max(1, int(round(padding * fps)))
+
+        self.preRoll: deque[tuple[int, np.ndarray]] = deque(maxlen=self.padFrames)
+        self.events: list[dict] = []
+        self.current: dict | None = None
+        self.frames = 0
+
+        # bounded, so a writer that can not keep up slows the detection down instead of filling the memory
+        self.queue: queue.Queue = queue.Queue(maxsize=queueSize)
+        self.thread = threading.Thread(target=self._write, name='ClipWriter', daemon=True)
+        self.thread.start()
+
+    def push(self, frameIndex: int, frame: np.ndarray, records: list[dict]) -> None:
+        self.frames = frameIndex + 1
+        if self.current is None:
+            if not records:
+                self.preRoll.append((frameIndex, frame))
+                return
+            self._open(frameIndex, frame)
+
+        event = self.current
+        if records:
+            event['lastDetectionFrame'] = frameIndex
+            event['maxConf'] = max(event['maxConf'], *(record['conf'] for record in records))
+            event['classes'].update(record['class'] for record in records)
+        self.queue.put(('frame', frame))
+        event['endFrame'] = frameIndex
+        if frameIndex - event['lastDetectionFrame'] >= self.padFrames:
+            self._close()
+
+    def _open(self, frameIndex: int, frame: np.ndarray) -> None:
+        path = clipFilePath(self.outputDir, self.sourcePath, len(self.events) + 1)
+        height, width = frame.shape[:2]
+        self.queue.put(('open', path, (width, height)))
+        startFrame = self.preRoll[0][0] if self.preRoll else frameIndex
+        for _, earlier in self.preRoll:
+            self.queue.put(('frame', earlier))
+        self.preRoll.clear()
+        self.current = {'clip': os.path.basename(path), 'startFrame': startFrame, 'endFrame': frameIndex,
+                        'firstDetectionFrame': frameIndex, 'lastDetectionFrame': frameIndex,
+                        'maxConf': 0.0, 'classes': set()}
+
+    def _close(self) -> None:
+        event = self.current
+        self.queue.put(('close',))
+        event['startMs'] = round(event['startFrame'] * 1000 / self.fps, 1)
+        event['endMs'] = round((event['endFrame'] + 1) * 1000 / self.fps, 1)
+        event['classes'] = sorted(event['classes'])
+        self.events.append(event)
+        self.current = None
+
+    def _write(self) -> None:
+        writer = None
+        while (item := self.queue.get()) is not None:
+            try:
+                if item[0] == 'open':
+                    writer = cv2.VideoWriter(item[1], cv2.VideoWriter_fourcc(*'MJPG'), self.fps, item[2])
+                elif item[0] == 'frame' and writer is not None:
+                    writer.write(item[1])
+                elif item[0] == 'close' and writer is not None:
+                    writer.release()
+                    writer = None
+            except cv2.error as e:  # keep draining, the detection thread must never block on a dead writer
+                print(f'clip writer: {e}')
+        if writer is not None:
+            writer.release()
+
+    def close(self) -> list[dict]:
+        """finish the open clip, wait for the encoder and write the timeline, returns the events"""
+        if self.current is not None:
+            self._close()
+        self.queue.put(None)
+        self.thread.join()
+        with open(eventsFilePath(self.outputDir, self.sourcePath), 'w') as f:
+            json.dump({'source': pa(self.sourcePath), 'fps': self.fps, 'frames': self.frames,
+                       'padding': self.padding, 'events': self.events}, f, indent=4)
+        return self.events
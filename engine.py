@@ -0,0 +1,857 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :engine.py
+
+"""
+detection engine shared by the GUI and anything else that runs the model.
+nothing in here may import Qt, and ultralytics (with torch, matplotlib, pandas behind it) is only imported
+when the first model is loaded, so importing this module stays cheap.
+"""
+
+import os
+import glob
+import json
+import time
+import queue
+import shutil
+import hashlib
+import threading
+import multiprocessing
+
+import cv2
+import numpy as np
+from typing import TYPE_CHECKING
+from PIL import Image
+
+from settings import pa, isVideoPath, outputFilePath, clipFilePath, eventsFilePath, VIDEO_SUFFIXES, BACKENDS
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+    from ultralytics.engine.results import Results
+    from prefilter import FirePrefilter
+    from tiling import Tiler
+    from resultcache import ResultCache
+    from store import DetectionStore
+    from alerts import FireTracker
+
+
+def defaultDevice() -> str:
+    import torch
+    return 'cuda:0' if torch.cuda.is_available() else 'cpu'
+
+
+_hashCache: dict[tuple, str] = {}
+
+
+def modelFiles(path: str) -> list[str]:
+    """the files a model consists of, an openvino .xml only holds the graph, the weights are in the .bin next to it"""
+    weights = os.path.splitext(path)[0] + '.bin'
+    return [path, weights] if path.endswith('.xml') and os.path.exists(weights) else [path]
+
+
+def modelMtime(path: str) -> float:
+    return max(os.path.getmtime(file) for file in modelFiles(path))
+
+
+def weightsHash(path: str) -> str:
+    """content hash of a model (every file of it), remembered per (path, mtime) so it is only computed once"""
+    files = modelFiles(path)
+    cacheKey = tuple((file, os.path.getmtime(file)) for file in files)
+    if cacheKey not in _hashCache:
+        digest = hashlib.sha256()
+        for file in files:
+            with open(file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        _hashCache[cacheKey] = digest.hexdigest()[:16]
+    return _hashCache[cacheKey]
+
+
+def openvinoDir(xmlPath: str) -> str:
+    """ultralytics only recognises an openvino model by its <name>_openvino_model folder, not by the .xml"""
+    directory = pa(os.path.dirname(os.path.abspath(xmlPath)))
+    if not directory.endswith('_openvino_model'):
+        raise ValueError(f'{xmlPath}: an openvino model has to be in a folder named <name>_openvino_model '
+                         f'(as written by the export), rename {directory}')
+    return directory
+
+
+def exportModel(weightsPath: str, backend: str) -> str:
+    """
+    path of the model to load for backend. a .pt model is exported once per weights hash into
+    <model dir>/.export/<hash>/ and the exported file is reused from then on.
+    an openvino .xml is loaded from its folder, .onnx models and the pytorch backend are returned unchanged.
+    """
+    if weightsPath.endswith('.xml'):
+        return openvinoDir(weightsPath)
+    if backend == 'pytorch' or not weightsPath.endswith('.pt') or not os.path.exists(weightsPath):
+        return weightsPath
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown backend {backend}, expected one of {BACKENDS}')
+
+    fileName = os.path.basename(weightsPath)
+    stem = os.path.splitext(fileName)[0]
+    cacheDir = pa(os.path.join(os.path.dirname(os.path.abspath(weightsPath)), '.export', weightsHash(weightsPath)))
+    exported = pa(os.path.join(cacheDir, f'{stem}.onnx' if backend == 'onnx' else f'{stem}_openvino_model'))
+    if os.path.exists(exported):
+        return exported
+
+    # export a copy inside the cache dir, ultralytics writes its output next to the weights it is given
+    os.makedirs(cacheDir, exist_ok=True)
+    weightsCopy = os.path.join(cacheDir, fileName)
+    shutil.copy2(weightsPath, weightsCopy)
+    try:
+        from ultralytics import YOLO
+        # dynamic axes so batched and differently shaped inputs work like they do with the .pt model
+        exported = pa(str(YOLO(weightsCopy).export(format=backend, dynamic=True)))
+    finally:
+        os.remove(weightsCopy)
+    print(f'model exported to {exported}')
+    return exported
+
+
+class ModelRegistry:
+    """
+    process-wide cache of loaded YOLO models.
+
+    a model is keyed by (ModelPath, file mtime, device, precision, backend), so it is loaded and warmed up once
+    and then reused for every file and every click of detect. replacing the weights on disk changes the
+    mtime and therefore the key, so stale models are never served. with the onnx / openvino backend the
+    .pt model is exported once (see exportModel) and the exported model is what gets loaded.
+    a predictor is not thread safe, users running next to the batch detection (e.g. a live stream) ask for
+    their own slot and get their own instance.
+    """
+
+    def __init__(self, warmupSize: int = 640):
+        self.warmupSize = warmupSize
+        self._models: dict[tuple, 'YOLO'] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def makeKey(modelPath: str, device: str, half: bool, backend: str = 'pytorch', slot: str = 'default') -> tuple:
+        modelPath = pa(os.path.abspath(modelPath))
+        mtime = modelMtime(modelPath) if os.path.exists(modelPath) else 0.0  # let YOLO() report missing files
+        return modelPath, mtime, device, 'fp16' if half else 'fp32', backend, slot
+
+    def get(self, modelPath: str, device: str | None = None, half: bool = False,
+            backend: str = 'pytorch', slot: str = 'default') -> 'YOLO':
+        """return the cached model for this key, loading and warming it up on first use"""
+        if not modelPath.endswith('.pt'):
+            backend = 'pytorch'  # an .onnx / .xml model is loaded as it is
+        if backend != 'pytorch':
+            device = 'cpu'  # the exported runtimes are used for the cpu-only machines
+        device = device or defaultDevice()
+        half = half and backend == 'pytorch' and not device.startswith('cpu')  # fp16 is only meaningful on gpu
+        key = self.makeKey(modelPath, device, half, backend, slot)
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                # an older mtime of the same file is now stale, drop it before loading the new one
+                self._dropStale(key)
+                from ultralytics import YOLO
+                model = YOLO(exportModel(modelPath, backend), task='detect')
+                self._warmup(model, device, half)
+                self._models[key] = model
+                print(f'model loaded: {key}')
+            return model
+
+    def _warmup(self, model: 'YOLO', device: str, half: bool) -> None:
+        # the first predict call builds the predictor, fuses the layers and moves the weights to the device
+        dummy = np.zeros((self.warmupSize, self.warmupSize, 3), dtype=np.uint8)
+        model.predict(source=dummy, device=device, half=half, verbose=False)
+
+    def _dropStale(self, key: tuple) -> None:
+        for stale in [k for k in self._models if k[0] == key[0] and k[1] != key[1]]:
+            del self._models[stale]
+
+    def _dropPath(self, modelPath: str) -> None:
+        for key in [k for k in self._models if k[0] == modelPath]:
+            del self._models[key]
+
+    def resolve(self, modelPath: str, backend: str) -> str:
+        """export the model for backend now (if needed), e.g. before worker processes start loading it"""
+        with self._lock:
+            return exportModel(modelPath, backend)
+
+    def invalidate(self, modelPath: str | None = None) -> None:
+        """forget the models of one path, or every model if no path is given"""
+        with self._lock:
+            if modelPath is None:
+                self._models.clear()
+            else:
+                self._dropPath(pa(os.path.abspath(modelPath)))
+
+    def __contains__(self, modelPath: str) -> bool:
+        modelPath = pa(os.path.abspath(modelPath))
+        return any(k[0] == modelPath for k in self._models)
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+modelRegistry = ModelRegistry()
+
+
+class ImageBatcher:
+    """
+    groups image paths into batches of similar aspect ratio and decodes them on a background thread.
+
+    ultralytics letterboxes a batch with minimal (rectangular) padding only when every image in it has the
+    same shape, so images are ordered by aspect ratio and shape before they are cut into batches.
+    while the model runs on one batch the decode thread is already filling the next ones.
+    """
+
+    def __init__(self, paths: list[str], batchSize: int = 8, prefetch: int = 2, aspectTolerance: float = 0.1):
+        self.paths = paths
+        self.batchSize = max(1, batchSize)
+        self.prefetch = max(1, prefetch)
+        self.aspectTolerance = aspectTolerance
+
+    @staticmethod
+    def imageSize(path: str) -> tuple[int, int]:
+        """read (width, height) from the header only, without decoding the pixels"""
+        try:
+            with Image.open(path) as image:
+                return image.size
+        except (OSError, ValueError):
+            return 0, 0
+
+    def plan(self) -> list[list[str]]:
+        """split the paths into batches, each one holding images of (nearly) the same aspect ratio"""
+        groups: dict[int, list[tuple[tuple[int, int], str]]] = {}
+        for path in self.paths:
+            width, height = self.imageSize(path)
+            bucket = round((width / height) / self.aspectTolerance) if height else -1
+            groups.setdefault(bucket, []).append(((width, height), path))
+
+        batches = []
+        for bucket in sorted(groups):
+            items = sorted(groups[bucket])  # identical shapes end up next to each other
+            for i in range(0, len(items), self.batchSize):
+                batches.append([path for _, path in items[i:i + self.batchSize]])
+        return batches
+
+    def __iter__(self):
+        """yield (paths, frames) per batch, a frame is None when the file could not be decoded"""
+        batches = self.plan()
+        ready: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def decode():
+            for batch in batches:
+                if not put((batch, [cv2.imread(path) for path in batch])):
+                    return
+            put(None)
+
+        decoder = threading.Thread(target=decode, name='ImageBatcherDecode', daemon=True)
+        decoder.start()
+        try:
+            while (item := ready.get()) is not None:
+                yield item
+        finally:
+            stop.set()
+            decoder.join()
+
+
+def emptyResult(model: 'YOLO', frame: np.ndarray, path: str = '') -> 'Results':
+    """a result without boxes, for frames the prefilter kept away from the model"""
+    import torch
+    from ultralytics.engine.results import Results
+    return Results(frame, path=path, names=model.names, boxes=torch.zeros((0, 6)))
+
+
+def detectImages(model: 'YOLO', paths: list[str], outputDir: str, conf: float, batchSize: int = 8,
+                 onResult=None, prefilter: 'FirePrefilter | None' = None, tiler: 'Tiler | None' = None,
+                 annotate: bool = True, store: 'DetectionStore | None' = None) -> None:
+    """
+    run batched detection over image files and save the annotated images into outputDir (unless annotate is off)
+    and the boxes into store.
+    onResult(path, result) is called for every path, result is None if the image could not be read.
+    images rejected by the prefilter get an empty result (saved unchanged),
+    images large enough for the tiler are detected tile by tile instead of scaled down.
+    """
+    os.makedirs(outputDir, exist_ok=True)
+
+    def finish(path: str, result) -> None:
+        if annotate:
+            cv2.imwrite(outputFilePath(outputDir, path), result.plot())
+        if store is not None:
+            store.add(store.beginRun(path), 0, None, resultToRecords(result))
+        onResult(path, result) if onResult else None
+
+    for batchPaths, frames in ImageBatcher(paths, batchSize):
+        readable = [(path, frame) for path, frame in zip(batchPaths, frames) if frame is not None]
+        for path, frame in zip(batchPaths, frames):
+            if frame is None:
+                print(f'failed to read image: {path}')
+                onResult(path, None) if onResult else None
+        if prefilter is not None:
+            passed = []
+            for path, frame in readable:
+                if prefilter.check(frame):
+                    passed.append((path, frame))
+                    continue
+                finish(path, emptyResult(model, frame, path))
+            readable = passed
+        if tiler is not None:
+            for path, frame in [(path, frame) for path, frame in readable if tiler.applies(frame)]:
+                finish(path, tiler.detect(model, frame, conf, path))
+            readable = [(path, frame) for path, frame in readable if not tiler.applies(frame)]
+        if not readable:
+            continue
+
+        results = model.predict(source=[frame for _, frame in readable], conf=conf, verbose=False)
+        for (path, _), result in zip(readable, results):
+            finish(path, result)
+
+
+def resultToRecords(result) -> list[dict]:
+    """plain python view of the boxes of one ultralytics Results object"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    records = []
+    for cls, conf, xyxy in zip(boxes.cls.tolist(), boxes.conf.tolist(), boxes.xyxy.tolist()):
+        records.append({'class': result.names[int(cls)], 'conf': round(conf, 4),
+                        'xyxy': [round(v, 1) for v in xyxy]})
+    return records
+
+
+class FrameSampler:
+    """
+    decides per video frame whether the model has to run on it.
+
+    the model runs on every interval-th frame, and in between as soon as the motion score (share of pixels of a
+    small grey copy that changed since the last inferred frame) reaches motionThreshold. after a frame with
+    detections every frame is inferred until holdFrames frames in a row came back empty, so the onset and the
+    course of a fire are never sampled. interval 1 infers every frame, motionThreshold 0 turns the gate off.
+    """
+
+    def __init__(self, interval: int = 1, motionThreshold: float = 0.0, holdFrames: int = 30,
+                 motionWidth: int = 160, pixelThreshold: int = 25):
+        self.interval = max(1, interval)
+        self.motionThreshold = motionThreshold
+        self.holdFrames = holdFrames
+        self.motionWidth = motionWidth
+        self.pixelThreshold = pixelThreshold
+
+        self.reference = None  # small grey copy of the last inferred frame
+        self.sinceInferred = 0
+        self.hold = 0
+        self.inferred = 0
+        self.frames = 0
+
+    def _small(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (self.motionWidth, max(1, height * self.motionWidth // width))
+        grey = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(grey, (5, 5), 0)
+
+    def motionScore(self, frame: np.ndarray) -> float:
+        if self.reference is None:
+            return 1.0
+        diff = cv2.absdiff(self._small(frame), self.reference)
+        return np.count_nonzero(diff > self.pixelThreshold) / diff.size
+
+    def shouldInfer(self, frame: np.ndarray) -> bool:
+        self.frames += 1
+        self.sinceInferred += 1
+        infer = (self.interval == 1 or self.hold > 0 or self.reference is None
+                 or self.sinceInferred >= self.interval
+                 or (self.motionThreshold > 0 and self.motionScore(frame) >= self.motionThreshold))
+        self.hold = max(0, self.hold - 1)
+        if infer:
+            self.inferred += 1
+            self.sinceInferred = 0
+            if self.interval > 1:
+                self.reference = self._small(frame)
+        return infer
+
+    def update(self, detected: bool) -> None:
+        """report whether the last inferred frame had detections"""
+        if detected:
+            self.hold = self.holdFrames
+
+
+class StageClock:
+    """adds up the time a pipeline stage spends working, `with clock:` around the work, not around the waiting"""
+
+    def __init__(self):
+        self.busy = 0.0
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.busy += time.perf_counter() - self._started
+
+
+def detectVideo(model: 'YOLO', path: str, outputDir: str, conf: float, onProgress=None,
+                sampleInterval: int = 1, motionThreshold: float = 0.0, prefilter: 'FirePrefilter | None' = None,
+                annotate: bool = True, store: 'DetectionStore | None' = None, clipPadding: float | None = None,
+                tracker: 'FireTracker | None' = None, queueSize: int = 4, decodeProcess: bool = False,
+                cancel: threading.Event | None = None) -> int:
+    """
+    run detection over a video, a few frames in memory at a time.
+
+    three stages run at the same time: a decode thread reads the frames, the calling thread runs the model,
+    an encode thread draws the boxes and writes the output. they are connected by queues of queueSize frames,
+    a stage that runs ahead blocks until the next one catches up, so memory stays flat no matter how long
+    the video is. at the end the share of the time every stage was busy is printed, the one near 100% is
+    the bottleneck. with decodeProcess the frames are decoded by a child process into a framering.FrameRing,
+    only slot numbers cross the process boundary and the model reads the pixels in place.
+    the annotated frames are appended to an .avi and the boxes of every frame to a .jsonl next to it.
+    with annotate off only the .jsonl is written, store gets the boxes of every inferred frame with its timestamp.
+    with clipPadding (seconds) only clips around the detections are written instead of the whole video,
+    see clips.ClipWriter.
+    tracker gets the boxes of every inferred frame and raises fire start / end alerts while the video is running.
+    with sampleInterval / motionThreshold the model only runs on the frames picked by a FrameSampler,
+    the other frames get the boxes of the last inferred frame ("inferred": false in the .jsonl).
+    picked frames the prefilter rejects get an empty result without running the model.
+    onProgress(frameIndex, frameCount) is called after every frame, frameCount is 0 when it is unknown.
+    once cancel is set the video stops after the current frame and InterruptedError is raised.
+    returns the number of processed frames.
+    """
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frameCount = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    sampler = FrameSampler(sampleInterval, motionThreshold, holdFrames=int(fps))
+    prefilter.reset() if prefilter is not None else None
+    runId = store.beginRun(path) if store is not None else None
+    clips = None
+    if annotate and clipPadding is not None:
+        from clips import ClipWriter
+        clips = ClipWriter(outputDir, path, fps, clipPadding)
+
+    os.makedirs(outputDir, exist_ok=True)
+    videoOutputPath = outputFilePath(outputDir, path)
+    writer = None
+    frameIndex = 0
+
+    decoded: queue.Queue = queue.Queue(maxsize=max(1, queueSize))  # frames waiting for the model
+    inferred: queue.Queue = queue.Queue(maxsize=max(1, queueSize))  # results waiting to be drawn and written
+    stop = threading.Event()  # set when a stage failed, or when everything is done
+    clocks = {'decode': StageClock(), 'infer': StageClock(), 'encode': StageClock()}
+    errors: list[Exception] = []
+
+    ring = decoderProcess = stopDecoder = None
+    if decodeProcess:
+        ok, first = cap.read()  # the slots are sized after the real first frame, not after the container header
+        if ok:
+            from framering import FrameRing, decodeVideo
+            context = multiprocessing.get_context('spawn')
+            ring = FrameRing(2 * queueSize + 2, first.shape, context=context)  # every queue full plus one per stage
+            stopDecoder = context.Event()
+            decoderProcess = context.Process(target=decodeVideo, args=(path, ring, stopDecoder),
+                                             name='VideoDecode', daemon=True)
+        cap.release()
+
+    def put(stage: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                stage.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(stage: queue.Queue):
+        while not stop.is_set():
+            try:
+                return stage.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def decode() -> None:
+        try:
+            while True:
+                with clocks['decode']:
+                    ok, frame = cap.read()
+                if not ok or not put(decoded, (None, frame)):
+                    break
+        except Exception as e:
+            errors.append(e)
+        put(decoded, None)
+
+    def receive() -> None:
+        # decodeProcess: the child decodes into ring, only the slot numbers arrive here
+        try:
+            decoderProcess.start()
+            while not stop.is_set():
+                try:
+                    slot, meta = ring.receive(timeout=0.1)
+                except queue.Empty:
+                    if not decoderProcess.is_alive():
+                        raise RuntimeError(f'the decoder process of {path} stopped ({decoderProcess.exitcode})')
+                    continue
+                if slot is None:
+                    clocks['decode'].busy = meta.get('busy', 0.0)
+                    break
+                if not put(decoded, (slot, ring.view(slot))):
+                    break
+        except Exception as e:
+            errors.append(e)
+        put(decoded, None)
+
+    def encode(detectionFile) -> None:
+        nonlocal writer
+        try:
+            while (item := get(inferred)) is not None:
+                index, slot, frame, result, isInferred, records = item
+                with clocks['encode']:
+                    if annotate:
+                        # a skipped frame carries the last boxes over, same video so same geometry
+                        annotated = result.plot() if isInferred else result.plot(img=frame)
+                        if clips is not None:
+                            clips.push(index, annotated, records)
+                        else:
+                            if writer is None:
+                                height, width = annotated.shape[:2]
+                                writer = cv2.VideoWriter(videoOutputPath, cv2.VideoWriter_fourcc(*'MJPG'), fps,
+                                                         (width, height))
+                            writer.write(annotated)
+                    detectionFile.write(json.dumps({'frame': index, 'inferred': isInferred, 'boxes': records}) + '\n')
+                ring.release(slot) if slot is not None else None  # drawn and written, the decoder may reuse it
+        except Exception as e:
+            errors.append(e)
+            stop.set()  # the other stages must not block on a queue nobody empties
+
+    started = time.perf_counter()
+    with open(os.path.splitext(videoOutputPath)[0] + '.jsonl', 'w') as detectionFile:
+        decoder = threading.Thread(target=decode if ring is None else receive, name='VideoDecode', daemon=True)
+        encoder = threading.Thread(target=encode, args=(detectionFile,), name='VideoEncode', daemon=True)
+        decoder.start()
+        encoder.start()
+        result = None
+        try:
+            while (item := get(decoded)) is not None:
+                if cancel is not None and cancel.is_set():
+                    errors.append(InterruptedError(f'detection of {path} cancelled'))
+                    break
+                slot, frame = item
+                with clocks['infer']:
+                    # inferred: this frame was answered, by the model or by the prefilter saying no fire. only the
+                    # frames the sampler skipped carry the last boxes over
+                    isInferred = sampler.shouldInfer(frame)  # always true for the first frame
+                    if isInferred:
+                        if prefilter is None or prefilter.check(frame, temporal=True):
+                            result = model.predict(source=frame, conf=conf, verbose=False)[0]
+                        else:
+                            result = emptyResult(model, frame, path)  # a miss for the tracker, not a skip
+                        sampler.update(result.boxes is not None and len(result.boxes) > 0)
+                    records = resultToRecords(result)
+                    if isInferred:  # carried over boxes are not detections
+                        store.add(runId, frameIndex, round(frameIndex * 1000 / fps, 1), records) if store is not None else None
+                        tracker.update(frameIndex, frameIndex * 1000 / fps, records) if tracker is not None else None
+                if not put(inferred, (frameIndex, slot, frame, result, isInferred, records)):
+                    break
+                frameIndex += 1
+                onProgress(frameIndex, frameCount) if onProgress else None
+            put(inferred, None)
+            encoder.join()  # everything queued is written before the stages are stopped
+        finally:
+            stop.set()
+            decoder.join()
+            encoder.join()
+            cap.release()
+            if decoderProcess is not None:
+                stopDecoder.set()
+                if decoderProcess.pid is not None:  # started
+                    decoderProcess.join(timeout=5)
+                    decoderProcess.terminate() if decoderProcess.is_alive() else None
+                result = frame = item = None  # drop the views into the ring before it is closed
+                ring.close()
+            tracker.close(frameIndex, frameIndex * 1000 / fps) if tracker is not None else None
+            if writer is not None:
+                writer.release()
+            if clips is not None:
+                print(f'{os.path.basename(path)}: {len(clips.close())} event clips')
+    if errors:
+        raise errors[0]
+
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    print(f'{os.path.basename(path)}: {frameIndex / elapsed:.1f} fps, busy ' +
+          ', '.join(f'{name} {clock.busy / elapsed:.0%}' for name, clock in clocks.items()))
+    if sampler.interval > 1:
+        print(f'{os.path.basename(path)}: inferred {sampler.inferred} of {frameIndex} frames')
+    return frameIndex
+
+
+def makePrefilter(settings) -> 'FirePrefilter | None':
+    if not settings.prefilter:
+        return None
+    from prefilter import FirePrefilter
+    return FirePrefilter(settings.prefilterColor, settings.prefilterFlicker)
+
+
+def makeTiler(settings) -> 'Tiler | None':
+    if not settings.tiling:
+        return None
+    from tiling import Tiler
+    return Tiler(settings.tileSize, settings.tileOverlap, settings.batchSize, colorThreshold=settings.tileColor)
+
+
+_resultCaches: dict[str, 'ResultCache'] = {}
+_resultCachesLock = threading.Lock()
+
+
+def makeResultCache(settings) -> 'ResultCache | None':
+    """
+    the result cache of settings.outputPath, one instance per folder and process: the detect thread and the watch
+    folder run at the same time and must not overwrite each other's index entries.
+    """
+    if not settings.resultCache:
+        return None
+    from resultcache import ResultCache
+    cacheDir = pa(os.path.join(settings.outputPath, '.cache'))
+    with _resultCachesLock:
+        if cacheDir not in _resultCaches:
+            _resultCaches[cacheDir] = ResultCache(cacheDir, settings.cacheSizeMB << 20)
+        cache = _resultCaches[cacheDir]
+        cache.maxBytes = settings.cacheSizeMB << 20
+        return cache
+
+
+def storePath(settings) -> str | None:
+    return pa(os.path.join(settings.outputPath, 'detections.sqlite')) if settings.detectionStore else None
+
+
+def outputFiles(outputDir: str, path: str, settings=None) -> list[str]:
+    """
+    the files detecting path writes into outputDir with the values of settings, every file it may write
+    without settings. a full .avi left from an earlier run in full mode is not an output of clips mode.
+    """
+    output = outputFilePath(outputDir, path)
+    annotate = settings is None or settings.saveAnnotated
+    if not isVideoPath(path):
+        return [output] if annotate else []
+    files = [os.path.splitext(output)[0] + '.jsonl']
+    if annotate and (settings is None or settings.videoOutput != 'clips'):
+        files.append(output)
+    if annotate and (settings is None or settings.videoOutput == 'clips'):
+        clipPrefix = os.path.splitext(clipFilePath(outputDir, path, 1))[0][:-3]  # <name>.event
+        files.append(eventsFilePath(outputDir, path))
+        files += sorted(glob.glob(glob.escape(clipPrefix) + '[0-9][0-9][0-9].avi'))
+    return files
+
+
+def sourceStem(path: str) -> str:
+    return os.path.splitext(pa(path).split('/')[-1])[0]
+
+
+def retargetEvents(restored: list[str], path: str) -> None:
+    """the events timeline of a cache hit filled by another source with the same content names that source"""
+    for file in restored:
+        if not file.endswith('.events.json'):
+            continue
+        with open(file) as f:
+            events = json.load(f)
+        if events.get('source') != pa(path):
+            events['source'] = pa(path)
+            os.remove(file)  # linked to the cache
+            with open(file, 'w') as f:
+                json.dump(events, f)
+
+
+def storeCachedResult(store: 'DetectionStore', path: str, records: list | None, restored: list[str]) -> None:
+    """record a result cache hit like a detection: images with the cached boxes, videos from the restored .jsonl"""
+    if not isVideoPath(path):
+        store.add(store.beginRun(path), 0, None, records) if records is not None else None
+        return
+    detections = [file for file in restored if file.endswith('.jsonl')]
+    if not detections:
+        return
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.release()
+    runId = store.beginRun(path)
+    with open(detections[0]) as f:
+        for line in f:
+            frame = json.loads(line)
+            if frame['inferred']:  # carried over boxes are not detections
+                store.add(runId, frame['frame'], round(frame['frame'] * 1000 / fps, 1), frame['boxes'])
+
+
+def resultOptions(settings) -> dict:
+    """the settings besides model and confidence that change what a detection writes"""
+    return {
+        'backend': settings.backend,
+        'annotated': settings.saveAnnotated,
+        'video': [settings.videoOutput, settings.clipPadding],
+        'sampling': [settings.sampleInterval, settings.motionThreshold],
+        'prefilter': [settings.prefilterColor, settings.prefilterFlicker] if settings.prefilter else None,
+        'tiling': [settings.tileSize, settings.tileOverlap, settings.tileColor] if settings.tiling else None,
+    }
+
+
+def alertOptions(settings) -> dict:
+    """what a worker process needs to build its fire trackers, the events go back to the sinks of the caller"""
+    return {'window': settings.alertWindow, 'threshold': settings.alertThreshold}
+
+
+def detectSources(paths: list[str], settings, device: str | None = None, onFinished=None,
+                  onProgress=None, onAlert=None, workers: int | None = None, slot: str = 'default',
+                  scheduler=None, cancel: threading.Event | None = None) -> dict:
+    """
+    the one entry point for detecting a list of files with the values of a Settings object.
+    onFinished(path, ok) is called once per path as soon as it is done,
+    onProgress(path, frameIndex, frameCount) after every frame of a video.
+    sources found in the result cache are linked into the output folder (and recorded in the detection store)
+    without loading the model.
+    with tiling on, images of at least two tiles are detected in tiles (see tiling.Tiler).
+    every detection goes into <outputPath>/detections.sqlite (see store.DetectionStore) unless detectionStore is off.
+    videos raise fire start / end events through the alertSinks while they run (see alerts.FireTracker),
+    onAlert(event) is called for them too. progress and alerts of videos detected by worker processes are sent
+    back and reported here like the ones of this process, progress once per percent.
+    workers overrides settings.workers (1 = always in this process), slot is the modelRegistry slot used then.
+    scheduler is the scheduler.DetectionScheduler to run big lists on, its worker processes stay up for the next
+    call. without one a pool is started for this call only.
+    once cancel is set a video detected in this process stops after its current frame, it and the videos not
+    started yet are reported failed.
+    returns {'cached': sources served from the cache, 'prefilter': pass / reject counts or None,
+    'tiling': tiles seen / run or None}.
+    """
+    from resultcache import ResultCache
+
+    outputDir = pa(os.path.join(settings.outputPath, 'predict'))
+    stats = {'cached': 0, 'prefilter': None, 'tiling': None}
+    cache = makeResultCache(settings)
+    keys: dict[str, str] = {}
+    records: dict[str, list] = {}
+
+    if cache is not None and os.path.exists(settings.ModelPath):
+        from store import DetectionStore
+
+        modelHash = weightsHash(settings.ModelPath)
+        misses = []
+        store = None
+        try:
+            for path in paths:
+                try:
+                    keys[path] = cache.makeKey(path, modelHash, settings.confidence, options=resultOptions(settings))
+                except OSError:  # unreadable, let the detection report it
+                    misses.append(path)
+                    continue
+                hit = cache.restore(keys[path], outputDir, sourceStem(path))
+                if hit is None:
+                    misses.append(path)
+                    continue
+                retargetEvents(hit[1], path)
+                if settings.detectionStore:  # the store answers for cached sources too
+                    store = store or DetectionStore(storePath(settings), model=settings.ModelPath)
+                    storeCachedResult(store, path, *hit)
+                    store.flush()
+                stats['cached'] += 1
+                onFinished(path, True) if onFinished else None
+        finally:
+            store.close() if store is not None else None
+        print(f'result cache: {stats["cached"]} of {len(paths)} sources cached')
+        paths = misses
+    for path in paths:  # outputs linked to the cache are replaced, not written into, also with the cache off
+        ResultCache.detach(outputFiles(outputDir, path))
+
+    def finished(path: str, ok: bool) -> None:
+        if ok and path in keys:
+            cache.put(keys[path], outputFiles(outputDir, path, settings), records.pop(path, None),
+                      sourceStem(path))
+        onFinished(path, ok) if onFinished else None
+
+    try:
+        if paths:
+            stats |= _detectSources(paths, settings, device, outputDir, finished,
+                                    lambda path, boxes: records.__setitem__(path, boxes), onProgress,
+                                    onAlert, workers, slot, scheduler, cancel)
+    finally:
+        cache.save() if cache is not None else None
+    return stats
+
+
+def _detectSources(paths: list[str], settings, device: str | None, outputDir: str, onFinished, onRecords,
+                   onProgress, onAlert, workers: int | None = None, slot: str = 'default',
+                   scheduler=None, cancel: threading.Event | None = None) -> dict:
+    from scheduler import DetectionScheduler, planWorkers, makeTasks
+    from store import DetectionStore
+    from alerts import FireTracker, CallbackSink, makeSinks, emitEvent
+
+    device = device or ('cpu' if settings.backend != 'pytorch' else defaultDevice())
+    prefilter = makePrefilter(settings)
+    tiler = makeTiler(settings)
+    clipPadding = settings.clipPadding if settings.videoOutput == 'clips' else None
+    workers = settings.workers if workers is None else workers
+    if planWorkers(workers, len(makeTasks(paths, settings.batchSize)), device)[0] > 1:
+        options = {'outputDir': outputDir, 'conf': settings.confidence, 'batchSize': settings.batchSize,
+                   'sampleInterval': settings.sampleInterval, 'motionThreshold': settings.motionThreshold,
+                   'prefilter': prefilter, 'tiler': tiler, 'annotate': settings.saveAnnotated,
+                   'storePath': storePath(settings), 'clipPadding': clipPadding, 'alerts': alertOptions(settings),
+                   'decodeProcess': settings.decodeProcess}
+        owned = scheduler is None
+        scheduler = DetectionScheduler() if owned else scheduler
+        sinks = makeSinks(settings.alertSinks) + ([CallbackSink(onAlert)] if onAlert else [])
+        try:
+            return scheduler.run(paths, settings.ModelPath, options, workers=workers, device=device,
+                                 backend=settings.backend, onFinished=onFinished, onRecords=onRecords,
+                                 onProgress=onProgress, onAlert=lambda event: emitEvent(sinks, event))
+        finally:
+            scheduler.close() if owned else None
+            for sink in sinks:
+                sink.close()
+
+    def onResult(path: str, result) -> None:
+        if result is not None:
+            onRecords(path, resultToRecords(result))
+        onFinished(path, result is not None)
+
+    model = modelRegistry.get(settings.ModelPath, device=device, backend=settings.backend, slot=slot)
+    store = DetectionStore(storePath(settings), model=settings.ModelPath) if settings.detectionStore else None
+    sinks = makeSinks(settings.alertSinks) + ([CallbackSink(onAlert)] if onAlert else [])
+    try:
+        imagePaths = [path for path in paths if not isVideoPath(path)]
+        if imagePaths:
+            detectImages(model, imagePaths, outputDir, settings.confidence, settings.batchSize,
+                         onResult=onResult, prefilter=prefilter, tiler=tiler, annotate=settings.saveAnnotated,
+                         store=store)
+
+        for path in paths:
+            if not isVideoPath(path):
+                continue
+            if cancel is not None and cancel.is_set():
+                onFinished(path, False)
+                continue
+            try:
+                detectVideo(model, path, outputDir, settings.confidence,
+                            onProgress=lambda i, n, path=path: onProgress(path, i, n) if onProgress else None,
+                            sampleInterval=settings.sampleInterval, motionThreshold=settings.motionThreshold,
+                            prefilter=prefilter, annotate=settings.saveAnnotated, store=store,
+                            clipPadding=clipPadding,
+                            tracker=FireTracker(path, sinks, settings.alertWindow, settings.alertThreshold),
+                            decodeProcess=settings.decodeProcess, cancel=cancel)
+                ok = True
+            except Exception as e:
+                print(f'failed to detect {path}: {e}')
+                ok = False
+            store.flush() if store is not None else None  # a finished source is queryable right away
+            onFinished(path, ok)
+    finally:
+        store.close() if store is not None else None
+        for sink in sinks:
+            sink.close()
+
+    if prefilter is not None:
+        print(f'prefilter: {prefilter.stats()}')
+    if tiler is not None:
+        print(f'tiling: {tiler.stats()}')
+    return {'prefilter': prefilter.stats() if prefilter is not None else None,
+            'tiling': tiler.stats() if tiler is not None else None}
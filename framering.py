@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :framering.py
+
+"""
+shared memory transport of decoded frames between processes.
+a decoded 1080p frame is 6 MB, sending it through a multiprocessing queue pickles, pipes and unpickles all of it.
+here the frames are written once into fixed slots of one shared memory block, only the slot index and a small
+meta dict go through the queues, the receiving process reads the pixels in place through a numpy view.
+
+    python framering.py <video>    compares the frames per second of a pickling queue and of the ring
+"""
+
+import os
+import sys
+import time
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    """
+    slots frames of one shape in one shared memory block.
+
+    producer: slot = acquire(), write into view(slot), publish(slot, meta). consumer: receive() -> (slot, meta),
+    read view(slot), release(slot) once nothing needs the pixels any more. when every slot is in use acquire()
+    blocks, that is the backpressure on the producer. finish(meta) ends the stream, receive() then returns
+    (None, meta). the ring is handed to a child process as a Process argument, the child attaches to the same
+    block, only the process that created it removes it in close().
+    """
+
+    def __init__(self, slots: int, shape: tuple[int, ...], dtype: str = 'uint8', context=None):
+        context = context or multiprocessing.get_context('spawn')
+        self.slots = max(1, slots)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        slotBytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.memory = shared_memory.SharedMemory(create=True, size=slotBytes * self.slots)
+        self.owner = True
+        self.free = context.Queue()
+        self.ready = context.Queue()
+        for slot in range(self.slots):
+            self.free.put(slot)
+        self._attach()
+
+    def _attach(self) -> None:
+        self.frames = np.ndarray((self.slots, *self.shape), dtype=self.dtype, buffer=self.memory.buf)
+
+    def __getstate__(self) -> dict:
+        return {'name': self.memory.name, 'slots': self.slots, 'shape': self.shape, 'dtype': self.dtype.str,
+                'free': self.free, 'ready': self.ready}
+
+    def __setstate__(self, state: dict) -> None:
+        self.slots, self.shape, self.dtype = state['slots'], state['shape'], np.dtype(state['dtype'])
+        self.free, self.ready = state['free'], state['ready']
+        self.memory = shared_memory.SharedMemory(name=state['name'])
+        self.owner = False
+        self._attach()
+
+    def view(self, slot: int) -> np.ndarray:
+        return self.frames[slot]
+
+    def acquire(self, timeout: float | None = None) -> int | None:
+        """a free slot, None when none got free within timeout"""
+        try:
+            return self.free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def publish(self, slot: int, meta: dict | None = None) -> None:
+        self.ready.put((slot, meta or {}))
+
+    def finish(self, meta: dict | None = None) -> None:
+        self.ready.put((None, meta or {}))
+
+    def receive(self, timeout: float | None = None) -> tuple[int | None, dict]:
+        """the next published (slot, meta), raises queue.Empty after timeout"""
+        return self.ready.get(timeout=timeout)
+
+    def release(self, slot: int) -> None:
+        self.free.put(slot)
+
+    def close(self) -> None:
+        self.frames = None
+        try:
+            self.memory.close()
+        except BufferError:  # a view is still alive somewhere (e.g. the last input kept by the model)
+            pass  # the mapping goes away with it
+        if self.owner:
+            self.memory.unlink()
+
+
+def decodeVideo(path: str, ring: FrameRing, stop=None) -> None:
+    """
+    process target: decode path straight into the slots of ring, frames of another size are scaled to the slot.
+    runs until the video ends or stop (a multiprocessing Event) is set, then finish({'frames', 'busy'}),
+    busy is the time spent decoding, not waiting for a free slot.
+    """
+    os.dup2(2, 1)  # stdout belongs to the parent (the json lines of cli.py)
+    cap = cv2.VideoCapture(path)
+    height, width = ring.shape[:2]
+    frames = 0
+    busy = 0.0
+    try:
+        while stop is None or not stop.is_set():
+            slot = ring.acquire(timeout=0.1)
+            if slot is None:
+                continue
+            view = ring.view(slot)
+            started = time.perf_counter()
+            ok, frame = cap.read(view)  # decodes into the slot when the shape matches
+            if ok and frame.ctypes.data != view.ctypes.data:
+                if frame.shape == view.shape:
+                    view[...] = frame
+                else:
+                    cv2.resize(frame, (width, height), dst=view)
+            busy += time.perf_counter() - started
+            if not ok:
+                ring.release(slot)
+                break
+            ring.publish(slot, {'frame': frames})
+            frames += 1
+    finally:
+        cap.release()
+        ring.finish({'frames': frames, 'busy': busy})
+
+
+def _pickleDecode(path: str, frames: multiprocessing.Queue) -> None:
+    cap = cv2.VideoCapture(path)
+    while True:
+        ok, frame = cap.read()
+        frames.put(frame if ok else None)
+        if not ok:
+            break
+    cap.release()
+
+
+def benchmark(path: str, slots: int = 8) -> dict:
+    """frames per second a consumer process receives, through a pickling queue and through a FrameRing"""
+    context = multiprocessing.get_context('spawn')
+    cap = cv2.VideoCapture(path)
+    ok, first = cap.read()
+    cap.release()
+    if not ok:
+        raise OSError(f'can not read {path}')
+
+    frames = context.Queue(maxsize=slots)
+    process = context.Process(target=_pickleDecode, args=(path, frames), daemon=True)
+    started = time.perf_counter()
+    process.start()
+    count = 0
+    while frames.get() is not None:
+        count += 1
+    pickled = count / (time.perf_counter() - started)
+    process.join()
+
+    ring = FrameRing(slots, first.shape, context=context)
+    process = context.Process(target=decodeVideo, args=(path, ring), daemon=True)
+    started = time.perf_counter()
+    process.start()
+    count = 0
+    checksum = 0
+    while True:
+        slot, meta = ring.receive()
+        if slot is None:
+            break
+        checksum += int(ring.view(slot)[0, 0, 0])  # touch the pixels like a consumer would
+        ring.release(slot)
+        count += 1
+    shared = count / (time.perf_counter() - started)
+    process.join()
+    ring.close()
+    return {'frames': count, 'shape': first.shape, 'pickleFps': round(pickled, 1), 'sharedFps': round(shared, 1)}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python framering.py <video>', file=sys.stderr)
+        sys.exit(2)
+    print(benchmark(sys.argv[1]))
@@ -7,300 +7,328 @@
 
 # 写了两天写吐了不想再看到一眼这个大屎山让我走吧让我走吧让我走吧让我走吧求你了求你了求你了
 
-# TODO: STREAM SUPPORT BY CV
+# DONE: STREAM SUPPORT BY CV
 # TODO: LOGGING TO DO
 # TODO: CONTEXT ACTIONS
 # TODO: MENU PAGES: about, help, github page
 
 import os
-import json
-from typing import Dict, Any
-import cv2
-
-from ultralytics import YOLO
+import time
+import threading
 
 from PySide6.QtWidgets import (QMainWindow, QWidget, QApplication,
-                               QMessageBox, QFileDialog,
-                               QLabel, QSlider, QPushButton,
+                               QMessageBox, QFileDialog, QInputDialog,
+                               QLabel, QSlider, QPushButton, QComboBox,
                                QHeaderView, QAbstractItemView)
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QPixmap, QImage, QIcon
-from PySide6.QtCore import Qt, Signal, Slot, QThread, QObject, QTimer
+from PySide6.QtGui import QPixmap, QImage, QIcon
+from PySide6.QtCore import (Qt, Signal, Slot, QThread, QObject, QTimer, QElapsedTimer,
+                            QAbstractTableModel, QModelIndex)
 from ui_GUI import Ui_MainWindow
+from settings import Settings, pa, isVideoPath, outputFilePath, clipFilePath, BACKENDS
+from engine import modelRegistry, detectSources
+from scheduler import DetectionScheduler
+from playback import FrameSource, FrameCache
+from stream import StreamPipeline, isStreamPath
+from alerts import FireTracker, CallbackSink, makeSinks
+from scanner import SourceScanner
+from watch import WatchDetector
 
 
-def pa(path: str) -> str:
-    return path.replace('\\', '/')
-
-
-class ConfigManager(QWidget):
+class ConfigManager(Settings, QWidget):
     def __init__(self):
         """
-        initialize and read the config file
+        initialize and read the config file, warnings are shown in a message box
         """
 
-        super().__init__()
-
-        self.configFileFolder = 'config'
-        self.configFilePath = pa(os.path.join(self.configFileFolder, 'config.json'))
+        QWidget.__init__(self)
+        Settings.__init__(self)
 
-        self.sourcePathList = []
-        # outputPath 是在系统中的绝对路径
-        self.outputPath = pa(os.path.join(os.getcwd(), 'output'))
-        self.alertAfterComplete = True
+    def warn(self, message: str) -> None:
+        QMessageBox.warning(self, 'Warning', message)
 
-        self.ModelPath = pa(os.path.join(os.getcwd(), 'model/best.pt'))
-        self.confidence = '0.5'
-
-        # check if the config file and folder exist
-        if not os.path.exists(self.configFilePath):
-            self.createDefaultConfig()
-        else:
-            self.readConfigFile()
-
-    def _modelPathValidator(self, modelPath: str) -> str:
-        if os.path.exists(modelPath):
-            if modelPath.endswith('.pt'):
-                return modelPath
-            else:
-                QMessageBox.warning(self, 'Warning', 'The model should be a .pt file')
-                return "model/yolo8n.pt"
-        else:
-            QMessageBox.warning(self, 'Warning', 'The model path is not valid!')
-            return "model/yolo8n.pt"
-
-    def _outputPathValidator(self, outputPath: str) -> str:
-        if os.path.exists(outputPath):
-            return outputPath
-        else:
-            QMessageBox.warning(self, 'Warning', 'The output path is not valid\n auto create it now')
-            os.mkdir(outputPath)
-            return outputPath
-
-    def confidenceValidator(self, confidence: str) -> float:
-        try:
-            confidence = float(confidence)
-            if 0 < confidence <= 1:
-                return confidence
-            else:
-                QMessageBox.warning(self, 'Warning', 'The confidence should be a number between 0 and 1, set confidence = 0.5 now')
-                return 0.5
-        except TypeError:
-            QMessageBox.warning(self, 'Warning', 'The confidence should be a number, set confidence = 0.5 now')
-            return 0.5
-
-    def readConfigFile(self) -> None:
-        """read config file (json)
-        and give out data"""
-        with open(self.configFilePath) as f:
-            config = json.load(f)
-
-            # common settings
-            self.outputPath = self._outputPathValidator(config['common']['OutputPath']) if config['common']['OutputPath'] != "" else self.outputPath
-            self.alertAfterComplete = config['common']['alertAfterComplete']
-
-            # model settings
-            self.ModelPath = self._modelPathValidator(config['Model']['ModelPath']) if config['Model']['ModelPath'] != "" else self.ModelPath
-            self.confidence = self.confidenceValidator(config['Model']['confidence']) if config['Model']['confidence'] != "" else self.confidence
-
-        # Done: analyse the data: for example: does the ckpt exist?
-
-    def updateConfigFile(self, **kwargs) -> None:
-        # validation and update first
-        self.outputPath = self._outputPathValidator(kwargs.get('OutputPath', self.outputPath))
-        self.alertAfterComplete = kwargs.get('alertAfterComplete', self.alertAfterComplete)
-        self.confidence = self.confidenceValidator(kwargs.get('confidence', self.confidence))
-        self.ModelPath = self._modelPathValidator(kwargs.get('ModelPath', self.ModelPath))
-
-        with open(self.configFilePath, 'w') as f:
-            config = {
-                "common": {
-                    "OutputPath": self.outputPath,
-                    "alertAfterComplete": self.alertAfterComplete
-                },
-                "Model": {
-                    "ModelPath": self.ModelPath,
-                    "confidence": self.confidence
-                }
-            }
-            json.dump(config, f, indent=4)
-
-        # self.readConfigFile()  # update information in the class' attributes  # no need now
-
-    def createDefaultConfig(self) -> None:
-        """Create the folder 'config' and put default config file in it."""
-        if not os.path.exists(self.configFileFolder):
-            os.mkdir(self.configFileFolder)
-
-        new_config: Dict[str, Dict[str, Any]] = {
-            "common": {
-                "OutputPath": "",
-                "alertAfterComplete": True
-            },
-            "Model": {
-                "ModelPath": "",
-                "confidence": ""
-            }
-        }
-
-        with open(self.configFilePath, 'w') as f:
-            json.dump(new_config, f, indent=4)
-            print("Default config file created at", self.configFilePath)
-
-
-class YOLODetector:
-    def __init__(self, **kwargs):
-        self.model = kwargs['ModelPath']
-        self.sources: list = kwargs['sourcesPath']
-        self.name = 'predict'
-        self.project: str = kwargs['OutputPath']
-        self.conf: float = kwargs['confidence']
-
-        self.save = True
-        self.show = False
-
-    def inference(self):
-        model = YOLO(self.model)
-        results = model.predict(source=self.sources,
-                                save=self.save,
-                                project=self.project,
-                                name=self.name,
-                                show=self.show,
-                                conf=self.conf,
-                                exist_ok=True)
-
-    def returnOutputPath(self) -> str:
-        return pa(os.path.join(self.project, self.name))
-
-    def returnOutputFilePath(self) -> list[str]:
-        filePaths = []
-        for file in self.sources:
-            fileName = file.split('/')[-1].replace('.mp4', '.avi')
-            filePaths.append(pa(os.path.join(self.project, self.name, fileName)))
-        return filePaths
+    def modelPathChanged(self, oldModelPath: str) -> None:
+        modelRegistry.invalidate(oldModelPath)
 
 
 class YOLOWorker(QObject):
     finished = Signal()
+    failed = Signal(str)
 
     def __init__(self, yolo_func):
         super().__init__()
         self.yolo_func = yolo_func
 
     def run(self):
-        self.yolo_func()
+        try:
+            self.yolo_func()
+        except Exception as e:  # finished must still be emitted, otherwise the thread never quits
+            print(f'worker failed: {e}')
+            self.failed.emit(str(e))
         self.finished.emit()
 
 
-class SourceListTable(QStandardItemModel):
-    sourceSingleChanged = Signal(dict, int)
+class SourceListTable(QAbstractTableModel):
+    """
+    the source list, one column per field instead of one dict and three items per row, so 100k+ sources stay cheap.
+    the view only asks for the rows it shows. status changes are collected and sent to the view at most every
+    refreshMs as a few dataChanged ranges, a big batch finishing file by file never repaints the whole table.
+    only touch it from the gui thread, the detect thread goes through signals.
+    """
+    HEADERS = ('Need', 'Path', 'Status')
 
-    def __init__(self):
+    def __init__(self, refreshMs: int = 100):
         super().__init__()
-        # set Headers
-        self.setHorizontalHeaderLabels(['Need', 'Path', 'Status'])
-
-        self.itemChanged.connect(self.onItemChanged)
-
-    def onItemChanged(self, item: QStandardItem):
-        if item.isCheckable():
-            source = item.data(Qt.ItemDataRole.UserRole)
-            if source:
-                source['checked'] = (item.checkState() == Qt.CheckState.Checked)
-                index = item.index().row()
-                self.sourceSingleChanged.emit(source, index)
-                print(f'Source updated: {source} at index {index}')
-
-    def updateSourceList(self, sources: list):
-        self.setRowCount(0)  # clear all
-        for row, source in enumerate(sources):
-            needItem = QStandardItem()
-            needItem.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
-            needItem.setData(Qt.CheckState.Checked if source['checked'] else Qt.CheckState.Unchecked,
-                             role=Qt.ItemDataRole.CheckStateRole)
-            needItem.setData(source, Qt.ItemDataRole.UserRole)
-            needItem.setText("")
-
-            pathItem = QStandardItem(source["path"])
-            statusItem = QStandardItem(source['status'])
-
-            self.setItem(row, 0, needItem)
-            self.setItem(row, 1, pathItem)
-            self.setItem(row, 2, statusItem)
+        self.paths: list[str] = []
+        self.statuses: list[str] = []
+        self.checked = bytearray()
+        self.listed: set[str] = set()  # the paths, for telling listed ones apart without a scan over the list
+
+        self._dirtyRows: set[int] = set()
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setSingleShot(True)
+        self.refreshTimer.setInterval(refreshMs)
+        self.refreshTimer.timeout.connect(self.flushStatus)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.paths)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index: QModelIndex):
+        if index.column() == 0:
+            return Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        row, column = index.row(), index.column()
+        if not index.isValid() or row >= len(self.paths):
+            return None
+        if role == Qt.ItemDataRole.CheckStateRole and column == 0:
+            return Qt.CheckState.Checked if self.checked[row] else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 1:
+                return self.paths[row]
+            if column == 2:
+                return self.statuses[row]
+        return None
+
+    def setData(self, index: QModelIndex, value, role=Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        self.checked[index.row()] = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        return True
+
+    def appendSources(self, paths: list[str], status: str = 'pending', skipListed: bool = False) -> int:
+        """add rows for paths (those already in the list are left out with skipListed), returns the rows added"""
+        if skipListed:
+            paths = [path for path in paths if path not in self.listed]
+        if not paths:
+            return 0
+        first = len(self.paths)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        self.paths.extend(paths)
+        self.statuses.extend([status] * len(paths))
+        self.checked.extend(b'\x01' * len(paths))
+        self.listed.update(paths)
+        self.endInsertRows()
+        return len(paths)
+
+    def path(self, row: int) -> str:
+        return self.paths[row]
+
+    def checkedSources(self) -> list[tuple[int, str]]:
+        """(row, path) of every checked source"""
+        return [(row, self.paths[row]) for row in range(len(self.paths)) if self.checked[row]]
+
+    @Slot(int, str)
+    def updateSourceStatus(self, row: int, status: str):
+        if 0 <= row < len(self.statuses) and self.statuses[row] != status:
+            self.statuses[row] = status
+            self._dirtyRows.add(row)
+            if not self.refreshTimer.isActive():
+                self.refreshTimer.start()
+
+    @Slot(list, str)
+    def updateSourcesStatus(self, rows: list[int], status: str):
+        for row in rows:
+            self.updateSourceStatus(row, status)
+
+    @Slot()
+    def flushStatus(self) -> None:
+        # one dataChanged per run of consecutive rows
+        rows = sorted(self._dirtyRows)
+        self._dirtyRows.clear()
+        first = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i] != rows[i - 1] + 1:
+                self.dataChanged.emit(self.index(rows[first], 2), self.index(rows[i - 1], 2),
+                                      [Qt.ItemDataRole.DisplayRole])
+                first = i
 
 
 class VideoPlayer(QObject):
-    def __init__(self, slider: QSlider, playButton: QPushButton):
+    frameReady = Signal()  # emitted from a decoder thread when a seek result is waiting
+
+    def __init__(self, slider: QSlider, playButton: QPushButton, indexDir: str | None = None):
         super().__init__()
         self.slider = slider
         self.playButton = playButton
+        self.indexDir = indexDir  # where the keyframe index of every opened video is cached
         self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.isPlaying = False
-        self.caps = []  # 用于存储多个视频捕获对象
+        # the slider is in milliseconds, every stream shows its frame that is due at the playback clock
+        self.clock = QElapsedTimer()
+        self.clockStartMs = 0
+        self.sources: list[FrameSource] = []  # 每个视频一个后台解码的 FrameSource
         self.labels = []  # 用于存储多个QLabel对象
+        self.frameCache = FrameCache()  # scaled frames of every video, scrubbing over them again is free
         self.timer.timeout.connect(self.nextFrame)  # 确保定时器只连接一次
 
+        # a fast drag changes the value many times per frame time, only the latest value is decoded
+        self.seekTimer = QTimer(self)
+        self.seekTimer.setSingleShot(True)
+        self.seekTimer.setInterval(15)
+        self.seekTimer.timeout.connect(self.seekToSlider)
+
+        # playback moves the slider with its signals blocked, so valueChanged only fires when the user scrubs
+        self.slider.valueChanged.connect(self.updateFrames)
+        self.frameReady.connect(self.showSeekedFrames)
         self.playButton.clicked.connect(self.playPauseVideo)
 
     def addVideo(self, videoPath: str, label: QLabel):
-        cap = cv2.VideoCapture(videoPath)
-        if not cap.isOpened():
+        source = FrameSource(videoPath, onFrameReady=self.frameReady.emit,
+                             cache=self.frameCache, indexDir=self.indexDir)
+        if not source.isOpened():
             print(f"Failed to open video: {videoPath}")
             return
-        self.caps.append(cap)
+
+        # a label shows one video at a time, replace whatever it was showing before
+        self.removeVideo(label)
+        self.sources.append(source)
         self.labels.append(label)
 
-        # 设置滑块的最大值为第一个视频的帧数（假设所有视频帧数相同）
-        if len(self.caps) == 1:
-            self.slider.setMinimum(0)
-            self.slider.setMaximum(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) - 1)
-            self.slider.valueChanged.connect(self.updateFrames)
+        # 滑块的范围是最长的视频的时长（毫秒），输入和输出的帧数可以不同
+        self.updateSliderRange()
 
-        # 加载视频的第一帧到对应的 QLabel
-        self.updateFrame(label, cap, self.slider.value())
+        # 加载视频的当前帧到对应的 QLabel
+        source.setTargetSize(label.width(), label.height())
+        source.seek(source.positionAt(self.slider.value()))
+        if self.isPlaying:
+            source.play()
+            self.timer.setInterval(self.frameInterval())
+
+    def removeVideo(self, label: QLabel):
+        if label in self.labels:
+            index = self.labels.index(label)
+            self.sources.pop(index).close()
+            self.labels.pop(index)
+            self.updateSliderRange()
+
+    def updateSliderRange(self):
+        self.slider.blockSignals(True)
+        self.slider.setMinimum(0)
+        self.slider.setMaximum(int(max((source.durationMs for source in self.sources), default=0)))
+        self.slider.blockSignals(False)
+
+    def frameInterval(self) -> int:
+        # tick at the rate of the fastest stream so that every stream can run at its native fps
+        return max(5, int(1000 / max(source.fps for source in self.sources)))
+
+    def clockMs(self) -> int:
+        return self.clockStartMs + self.clock.elapsed()
 
     def updateFrames(self):
-        position = self.slider.value()
-        for cap, label in zip(self.caps, self.labels):
-            self.updateFrame(label, cap, position)
-
-    def updateFrame(self, label: QLabel, cap: cv2.VideoCapture, position: int):
-        cap.set(cv2.CAP_PROP_POS_FRAMES, position)
-        ret, frame = cap.read()
-        if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            height, width, channel = frame.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(frame.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_img)
-            label.setPixmap(pixmap.scaled(label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        # the user moved the slider, coalesce the drag into at most one seek per timer interval
+        if not self.seekTimer.isActive():
+            self.seekTimer.start()
+
+    def seekToSlider(self):
+        # this is the only place a seek happens, every stream goes to its own frame at that time
+        timestampMs = self.slider.value()
+        for source, label in zip(self.sources, self.labels):
+            source.setTargetSize(label.width(), label.height())
+            source.seek(source.positionAt(timestampMs))
+        if self.isPlaying:
+            self.clockStartMs = timestampMs
+            self.clock.restart()
+
+    @Slot()
+    def showSeekedFrames(self):
+        if self.isPlaying:  # the timer paces the frames while playing
+            return
+        for source, label in zip(self.sources, self.labels):
+            item = source.takeLatest()
+            if item is not None:
+                self.updateFrame(label, item[2])
+
+    def updateFrame(self, label: QLabel, frame):
+        # the decoder already scaled the frame to the label size, Qt reads the BGR bytes in place
+        height, width, channel = frame.shape
+        q_img = QImage(frame.data, width, height, frame.strides[0], QImage.Format.Format_BGR888)
+        label.setPixmap(QPixmap.fromImage(q_img))
 
     def playPauseVideo(self):
-        if not self.caps or not all(cap.isOpened() for cap in self.caps):
+        if not self.sources or not all(source.isOpened() for source in self.sources):
             return
 
         if self.isPlaying:
-            self.timer.stop()
-            self.isPlaying = False
-            self.playButton.setText('Play')
-            self.playButton.setIcon(QIcon(':/icons/play.svg'))
+            self.stopPlaying()
         else:
-            self.timer.start(30)  # refresh 30 ms per frame
+            for source in self.sources:
+                source.play()
+            self.clockStartMs = self.slider.value()
+            self.clock.start()
+            self.timer.start(self.frameInterval())
             self.isPlaying = True
             self.playButton.setText('Pause')
             self.playButton.setIcon(QIcon(':/icons/pause.svg'))
 
+    def stopPlaying(self):
+        self.timer.stop()
+        for source in self.sources:
+            source.pause()
+        self.isPlaying = False
+        self.playButton.setText('Play')
+        self.playButton.setIcon(QIcon(':/icons/play.svg'))
+
     def nextFrame(self):
-        current_position = self.slider.value()
-        if current_position < self.slider.maximum():
-            self.slider.setValue(current_position + 1)
-        else:
-            self.timer.stop()
-            self.isPlaying = False
-            self.playButton.setText("Play")
-            self.playButton.setIcon(QIcon(':/icons/play.svg'))
+        nowMs = self.clockMs()
+        if nowMs >= self.slider.maximum() or all(source.isFinished() for source in self.sources):
+            self.stopPlaying()
+            return
+
+        # each stream shows the newest frame whose timestamp is due, a stream that falls behind drops frames
+        # instead of dragging the other one out of sync
+        for source, label in zip(self.sources, self.labels):
+            item = source.takeUntil(nowMs)
+            if item is not None:
+                self.updateFrame(label, item[2])
+
+        self.slider.blockSignals(True)
+        self.slider.setValue(nowMs)
+        self.slider.blockSignals(False)
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
+    sourceStatusChanged = Signal(int, str)  # emitted from the detect thread, (row, status)
+    sourcesStatusChanged = Signal(list, str)  # emitted from the detect thread, (rows, status)
+    streamFrameReady = Signal(object, dict)  # emitted from the stream render thread, (annotated frame, stats)
+    streamStopped = Signal()
+    fireAlert = Signal(dict)  # emitted from the detect / stream threads, see alerts.FireTracker
+    sourcesFound = Signal(object, list)  # emitted from the scan thread, (its SourceScanner, a chunk of paths)
+    scanFinished = Signal(object, dict)  # emitted from the scan thread, (its SourceScanner, SourceScanner.stats())
+    watchQueued = Signal(list)  # emitted from the watch thread, new files that are completely written
+    watchFinished = Signal(str, bool)  # emitted from the watch detect thread, (path, ok)
+    watchCancelled = Signal(list)  # emitted from the watch detect thread as it ends, files it never detected
+
     def __init__(self):
         """
         initialize first
@@ -316,41 +344,61 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.isSingleFile = bool(self.comboBox.currentIndex)
         # PLAN: improve robustness, what the index is more than 1 in the future update? -- NO PLAN NOW
 
-        self.sourceList = []
-        self.model = SourceListTable()
+        self.model = SourceListTable()  # holds the source list, see SourceListTable
 
         # video Player config
-        self.VideoPlayer = VideoPlayer(self.horizontalSlider, self.playButton)
+        self.VideoPlayer = VideoPlayer(self.horizontalSlider, self.playButton,
+                                       indexDir=pa(os.path.join(self.configManager.outputPath, '.index')))
         self.isPlaying = False
 
-        """
-        sourceList will contain all the Source in the List in the format like
-        [
-            {
-                "checked": true,
-                "status": 0,
-                "path": "path/to/first/file1"
-            },
-            {
-                "checked": true,
-                "status": 0,
-                "path": "path/to/first/file2"
-            }
-        ]
-        """
-
         self.thread = None
         self.worker = None
+        self.scheduler = DetectionScheduler()  # worker processes of big lists, kept between clicks of detect
+
+        # the model is loaded in the background once the window is shown, see warmupModel
+        self.warmupThread = None
+        self.warmupWorker = None
+        self.warmupStarted = 0.0
+        self.warmupFailed = False
+        self.modelStatusLabel = QLabel('model: not loaded')
+        self.statusbar.addPermanentWidget(self.modelStatusLabel)
+        self.alertLabel = QLabel('')  # the last fire start / end, stays while the status bar messages change
+        self.statusbar.addPermanentWidget(self.alertLabel)
+
+        # live stream detection, one stream at a time
+        self.isStream = False
+        self.streamPipeline = None
+        self.streamRow = -1
+        self.streamSinks = []
+
+        # directories are scanned on a background thread, one scan at a time
+        self.scanner = None
+        self.scanThread = None
+        self.scanListed = 0  # found sources that were in the list already
+
+        # watch folder mode, new files are detected as they arrive
+        self.isWatch = False
+        self.watchDetector = None
+        self.watchRows: dict[str, int] = {}
 
         self.bindModelConfig()
         self.bindCommonConfig()
         self.bindDisplayTab()
 
         # signal binding
-        self.model.sourceSingleChanged.connect(self.sourceSingleChangedSignalReceiver)
+        self.sourceStatusChanged.connect(self.model.updateSourceStatus)
+        self.sourcesStatusChanged.connect(self.model.updateSourcesStatus)
+        self.streamFrameReady.connect(self.showStreamFrame)
+        self.streamStopped.connect(self.stopStream)
+        self.fireAlert.connect(self.showFireAlert)
+        self.sourcesFound.connect(self.addFoundSources)
+        self.scanFinished.connect(self.showScanFinished)
+        self.watchQueued.connect(self.addWatchedSources)
+        self.watchFinished.connect(self.showWatchedResult)
+        self.watchCancelled.connect(self.cancelWatchedSources)
 
     def bindDisplayTab(self):
-        # the source display and outputDisplay should be updated when a line in sourceList is selected
+        # the source display and outputDisplay should be updated when a line in the source list is selected
         self.listTableView.setModel(self.model)
         self.listTableView.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         header = self.listTableView.horizontalHeader()
@@ -358,60 +406,57 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
         self.listTableView.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        # self.model.updateSourceList([  # test
-        #     {'checked': True, 'path': '/path/to/file1dsfsdfsdsf', 'status': 'Completed'},
-        #     {'checked': False, 'path': '/path/to/file2', 'status': 'Pending'},
-        #     {'checked': True, 'path': '/path/to/file3', 'status': 'Failed'}
-        # ])
         self.listTableView.doubleClicked.connect(self.isPathItemClicked)
 
         self.detectStartButton.clicked.connect(self.detectStartButtonClicked)
 
-    def yolo(self) -> None:
-        sourcePathList: list[str] = []
-        updateList: list[dict] = []
-
-        for item in self.sourceList:
-            if item['checked']:
-                updateList.append(item)
-                sourcePathList.append(item['path'])
-                item['status'] = 'Detecting'
-
-        self.model.updateSourceList(self.sourceList)
-
-        if sourcePathList:
-            for path in sourcePathList:
-                if self._isPathVideo(path):
-                    self.yoloProcessVideo(path)
-                else:
-                    self.yoloProcessImage(path)
-
-            for item in self.sourceList:
-                if item['status'] == 'Detecting':
-                    item['status'] = 'Completed'
-
-            self.model.updateSourceList(self.sourceList)
-
-    def yoloProcessImage(self, image_path: str) -> None:
-        Detector = YOLO(self.configManager.ModelPath)
-        results = Detector.predict(source=image_path,
-                                   save=True,
-                                   project=self.configManager.outputPath,
-                                   conf=self.configManager.confidence)
-
-    def yoloProcessVideo(self, video_path: str) -> None:
-        Detector = YOLO(self.configManager.ModelPath)
-        results = Detector.predict(source=video_path,
-                                   save=True,
-                                   project=self.configManager.outputPath,
-                                   conf=self.configManager.confidence)
+    def yolo(self, sources: list[tuple[int, str]]) -> None:
+        # sources: (row, path) of the checked rows, taken in the gui thread before the detect thread started
+        sources = [(row, path) for row, path in sources if not isStreamPath(path)]  # streams run from the list
+        if sources:
+            self.sourcesStatusChanged.emit([row for row, _ in sources], 'Detecting')
+            finished: set[int] = set()
+            failed = True
+            try:
+                self.yoloProcessSources(sources, finished)
+                failed = False
+            finally:
+                # rows the detection never reported: done when it ran through, failed when it raised
+                self.sourcesStatusChanged.emit([row for row, _ in sources if row not in finished],
+                                               'Failed' if failed else 'Completed')
+
+    def yoloProcessSources(self, sources: list[tuple[int, str]], finished: set[int]) -> None:
+        # images are batched, videos streamed, big lists spread over worker processes; see engine.detectSources
+        # every row that got its final status is added to finished
+        rows: dict[str, list[int]] = {}
+        for row, path in sources:
+            rows.setdefault(path, []).append(row)
+        lastPercent: dict[str, int] = {}
+
+        def onFinished(path: str, ok: bool) -> None:
+            # a row is updated as soon as its file is done
+            self.sourcesStatusChanged.emit(rows.get(path, []), 'Completed' if ok else 'Failed')
+            finished.update(rows.get(path, []))
+
+        def onProgress(path: str, frameIndex: int, frameCount: int) -> None:
+            # only touch the table when the shown text actually changes
+            percent = frameIndex * 100 // frameCount if frameCount else frameIndex
+            if percent != lastPercent.get(path):
+                lastPercent[path] = percent
+                status = f'Detecting {percent}%' if frameCount else f'Detecting frame {frameIndex}'
+                for row in rows.get(path, []):
+                    self.sourceStatusChanged.emit(row, status)
+
+        detectSources(list(rows), self.configManager, onFinished=onFinished, onProgress=onProgress,
+                      onAlert=self.fireAlert.emit, scheduler=self.scheduler)
 
     def detectStartButtonClicked(self) -> None:
         self.detectStartButton.setEnabled(False)
 
         # config
         self.thread = QThread()
-        self.worker = YOLOWorker(self.yolo)
+        sources = self.model.checkedSources()
+        self.worker = YOLOWorker(lambda: self.yolo(sources))
 
         self.worker.moveToThread(self.thread)
 
@@ -427,20 +472,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # work
         self.thread.start()
 
-    @Slot(dict)
-    def sourceSingleChangedSignalReceiver(self, updatedSourceSingle: dict, index: int) -> None:
-        self.sourceList[index] = updatedSourceSingle
-        # self.model.updateSourceList(self.sourceList)
-
     def isOutputPathExist(self, originalPath: str) -> (bool, str):
-        fileName = originalPath.split('/')[-1].replace('.mp4', '.avi')
-        outputPath = pa(os.path.join(self.configManager.outputPath, 'predict', fileName))
+        outputDir = pa(os.path.join(self.configManager.outputPath, 'predict'))
+        outputPath = outputFilePath(outputDir, originalPath)
+        if not os.path.exists(outputPath) and isVideoPath(originalPath):
+            outputPath = clipFilePath(outputDir, originalPath, 1)  # clip output mode: show the first event
         return os.path.exists(outputPath), outputPath
 
-    def isPathItemClicked(self, index: QStandardItem):
+    def isPathItemClicked(self, index: QModelIndex):
         print(f"clicked on {index.row()}, {index.column()}")
         if index.column() == 1:
-            path = self.model.item(index.row(), index.column()).text()
+            path = self.model.path(index.row())
+            if isStreamPath(path):
+                self.toggleStream(path, index.row())
+                return
             self.updateSourceLabelDisplay(path)
 
             isOutputExist = self.isOutputPathExist(path)
@@ -454,15 +499,97 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             # DONE: VIDEO DISPLAY
 
 
+    def toggleStream(self, path: str, row: int) -> None:
+        # double click on a stream starts live detection, a second double click stops it
+        wasRunning = self.streamPipeline is not None and self.streamRow == row
+        self.stopStream()
+        if wasRunning:
+            return
+
+        self.VideoPlayer.removeVideo(self.sourceDisplayLabel)
+        self.VideoPlayer.removeVideo(self.outputDisplayLabel)
+        self.sourceDisplayLabel.setText(f'Live: {path}')
+        modelPath, backend = self.configManager.ModelPath, self.configManager.backend
+        try:
+            self.streamSinks = makeSinks(self.configManager.alertSinks) + [CallbackSink(self.fireAlert.emit)]
+            tracker = FireTracker(path, self.streamSinks, self.configManager.alertWindow,
+                                  self.configManager.alertThreshold)
+            # the model is loaded on the inference thread of the pipeline, not shared with the detect thread
+            self.streamPipeline = StreamPipeline(
+                path, None, self.configManager.confidence, onFrame=self.streamFrameReady.emit,
+                onStopped=self.streamStopped.emit, tracker=tracker,
+                loadModel=lambda: modelRegistry.get(modelPath, backend=backend, slot='stream'))
+            self.streamRow = row
+            self.streamPipeline.start()
+        except Exception as e:
+            print(f'can not start the stream {path}: {e}')
+            for sink in self.streamSinks:
+                sink.close()
+            self.streamSinks = []
+            self.streamPipeline = None
+            self.streamRow = -1
+            self.model.updateSourceStatus(row, 'Failed')
+            self.statusbar.showMessage(f'stream failed: {e}')
+            return
+        self.model.updateSourceStatus(row, 'Streaming')
+
+    @Slot()
+    def stopStream(self) -> None:
+        if self.streamPipeline is None:
+            return
+        self.streamPipeline.stop()
+        stats = self.streamPipeline.stats()
+        error = self.streamPipeline.error
+        self.streamPipeline = None
+        for sink in self.streamSinks:
+            sink.close()
+        self.streamSinks = []
+        self.model.updateSourceStatus(self.streamRow, 'Failed' if error else 'Stopped')
+        self.streamRow = -1
+        if error:
+            self.statusbar.showMessage(f'stream failed: {error}')
+        else:
+            self.statusbar.showMessage(f"stream stopped, {stats['rendered']} frames shown, {stats['dropped']} dropped")
+
+    @Slot(object, dict)
+    def showStreamFrame(self, frame, stats: dict) -> None:
+        if self.streamPipeline is None:  # a frame that was queued before the stream stopped
+            return
+        height, width, channel = frame.shape
+        q_img = QImage(frame.data, width, height, frame.strides[0], QImage.Format.Format_BGR888)
+        self.outputDisplayLabel.setPixmap(
+            QPixmap.fromImage(q_img).scaled(self.outputDisplayLabel.size(), Qt.AspectRatioMode.KeepAspectRatio,
+                                            Qt.TransformationMode.FastTransformation))
+        self.statusbar.showMessage(f"live: {stats['latencyMs']} ms latency, {stats['fps']} fps, "
+                                   f"{stats['dropped']} frames dropped")
+
+    @Slot(dict)
+    def showFireAlert(self, event: dict) -> None:
+        name = os.path.basename(event['source']) or event['source']
+        if event['event'] == 'fireStart':
+            self.alertLabel.setText(f"FIRE: {name} at {event['timestampMs'] / 1000:.1f}s ({event['class']})")
+            self.alertLabel.setStyleSheet('color: red; font-weight: bold')
+        else:
+            self.alertLabel.setText(f"fire ended: {name} at {event['timestampMs'] / 1000:.1f}s")
+            self.alertLabel.setStyleSheet('')
+
+    def closeEvent(self, event) -> None:
+        self.stopStream()
+        self.stopScan()
+        self.stopWatch()
+        self.scheduler.close()
+        super().closeEvent(event)
+
     @staticmethod
     def _isPathVideo(path: str) -> bool:
-        return path.endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv', '.mpeg'))
+        return isVideoPath(path)
 
     def updateSourceLabelDisplay(self, path: str):
         isVideo = self._isPathVideo(path)
         if isVideo:
             self.VideoPlayer.addVideo(path, self.sourceDisplayLabel)  # 绑定 sourceDisplayLabel 到控制条
         else:  # it is a picture
+            self.VideoPlayer.removeVideo(self.sourceDisplayLabel)
             print('pixmap source display part')
             print(path)
             pixmap = QPixmap(path)  # 直接从路径加载图片
@@ -479,6 +606,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if isVideo:
                 self.VideoPlayer.addVideo(path, self.outputDisplayLabel)
             else:
+                self.VideoPlayer.removeVideo(self.outputDisplayLabel)
                 pixmap = QPixmap(path)  # 直接从路径加载图片
                 if not pixmap.isNull():  # 检查图片是否加载成功
                     self.outputDisplayLabel.setPixmap(
@@ -488,6 +616,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                     print("Failed to load the image.")
             return pa(path), isVideo
         else:
+            self.VideoPlayer.removeVideo(self.outputDisplayLabel)
             self.outputDisplayLabel.setText('No Output')
 
     def bindModelConfig(self) -> None:
@@ -497,6 +626,19 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.confidenceLineEdit.textEdited.connect(self.confidenceLineEditChanged)
         self.confidenceLineEdit.setText(str(self.configManager.confidence))
 
+        # backend selector, onnx / openvino run an exported copy of the .pt model on the cpu
+        self.backendLabel = QLabel('Backend', self.groupBox_2)
+        self.backendComboBox = QComboBox(self.groupBox_2)
+        self.backendComboBox.addItems(BACKENDS)
+        self.backendComboBox.setCurrentText(self.configManager.backend)
+        self.backendComboBox.currentTextChanged.connect(self.backendComboBoxChanged)
+        self.gridLayout_4.addWidget(self.backendLabel, 2, 0, 1, 1)
+        self.gridLayout_4.addWidget(self.backendComboBox, 2, 1, 1, 2)
+
+    def backendComboBoxChanged(self, backend: str) -> None:
+        self.configManager.updateConfigFile(backend=backend)
+        self.warmupModel()  # the first switch to a backend exports the model, do it before detect is clicked
+
     def confidenceLineEditChanged(self) -> None:
         newConfidence = self.confidenceLineEdit.text()
         self.configManager.updateConfigFile(confidence=newConfidence)
@@ -505,15 +647,54 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def selectModeButtonClicked(self) -> None:
         modelpath = QFileDialog.getOpenFileName(
             self,
-            'Select pt model',
+            'Select model',
             '',
-            '*.pt'
+            'model(*.pt *.onnx *.xml)'
         )[0]
         self.configManager.updateConfigFile(ModelPath=modelpath) if modelpath else None
         self.modelPathLineEdit.setText(self.configManager.ModelPath) if modelpath else None
+        self.warmupModel() if modelpath else None
+
+    def warmupModel(self) -> None:
+        # torch / ultralytics are imported and the model is warmed up on a background thread,
+        # the window is already on screen and detect simply waits for the same cached model
+        if self.warmupThread is not None:
+            return
+        self.warmupStarted = time.monotonic()
+        self.warmupFailed = False
+        self.modelStatusLabel.setText('model: loading...')
+
+        modelPath, backend = self.configManager.ModelPath, self.configManager.backend
+        self.warmupThread = QThread()
+        self.warmupWorker = YOLOWorker(lambda: modelRegistry.get(modelPath, backend=backend))
+        self.warmupWorker.moveToThread(self.warmupThread)
+
+        self.warmupThread.started.connect(self.warmupWorker.run)
+        self.warmupWorker.failed.connect(self.modelWarmupFailed)
+        self.warmupWorker.finished.connect(self.warmupThread.quit)
+        self.warmupWorker.finished.connect(self.warmupWorker.deleteLater)
+        self.warmupThread.finished.connect(self.warmupThread.deleteLater)
+        self.warmupThread.finished.connect(self.modelWarmedUp)
+        self.warmupThread.start()
+
+    @Slot(str)
+    def modelWarmupFailed(self, message: str) -> None:
+        self.warmupFailed = True
+        self.modelStatusLabel.setText('model: failed to load')
+        self.modelStatusLabel.setToolTip(message)
+
+    @Slot()
+    def modelWarmedUp(self) -> None:
+        self.warmupThread = None
+        self.warmupWorker = None
+        if not self.warmupFailed:
+            self.modelStatusLabel.setText(f'model: ready ({time.monotonic() - self.warmupStarted:.1f} s)')
+            self.modelStatusLabel.setToolTip(self.configManager.ModelPath)
 
     def bindCommonConfig(self) -> None:
         self.inputFileSelectButton.clicked.connect(self.inputSelectButtonClicked)
+        self.comboBox.addItem('Stream')
+        self.comboBox.addItem('Watch')
         self.comboBox.currentTextChanged.connect(self.setIsSingleFile)
 
         self.outputPathSelectPathButton.clicked.connect(self.selectOutputPath)
@@ -530,6 +711,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         )
         self.configManager.updateConfigFile(OutputPath=outputPath) if outputPath else None
         self.outputLineEdit.setText(outputPath) if outputPath else None
+        self.VideoPlayer.indexDir = pa(os.path.join(self.configManager.outputPath, '.index'))
 
     def changeAlertMode(self):
         alertMode = self.alertAfterCompleteCheckBox.isChecked()
@@ -537,25 +719,108 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         print(f"alert mode changed to {alertMode}")
 
     def putFileToSourceList(self, files: list):
-        for filePath in files:
-            newSource = {
-                "checked": True,
-                "status": 'pending',
-                "path": pa(filePath)
-            }
-            self.sourceList.append(newSource)
-        self.model.updateSourceList(self.sourceList)
+        self.model.appendSources([pa(filePath) for filePath in files], skipListed=True)
 
     def putDirToSourceList(self, Dir: str):
-        # 输入的应该是一个dir的path: str，接着检查这个dir下面（只有一层）中有没有指定格式的文件，如果有，则加入一个列表中
-        _list = []
-        for file in os.listdir(Dir):
-            if file.endswith(('.jpg', '.bmp', '.png', '.mp4', '.avi', '.mov', '.mkv', 'flv', '.mpeg')):
-                _list.append(file)
-        self.putFileToSourceList(_list)
+        # every image / video below Dir, found on a background thread and added in chunks while the scan goes on
+        self.stopScan()
+        config = self.configManager
+        scanner = SourceScanner(config.scanInclude, config.scanExclude, sniff=config.scanSniff)
+
+        def scan() -> None:
+            for paths in scanner.scan([Dir]):
+                self.sourcesFound.emit(scanner, paths)
+            self.scanFinished.emit(scanner, scanner.stats())
+
+        self.scanner = scanner
+        self.scanListed = 0
+        self.scanThread = threading.Thread(target=scan, name='SourceScanner', daemon=True)
+        self.scanThread.start()
+        self.statusbar.showMessage(f'scanning {Dir} ...')
+
+    def stopScan(self) -> None:
+        # never waits on the gui thread, a scan stuck in a slow share ends on its own, its late chunks are dropped
+        if self.scanner is not None:
+            self.scanner.stop()
+        self.scanner = None
+        self.scanThread = None
+
+    @Slot(object, list)
+    def addFoundSources(self, scanner, paths: list) -> None:
+        if scanner is not self.scanner:  # queued before its scan was stopped
+            return
+        # adding a folder again (or one below an added folder) only adds what is new
+        self.scanListed += len(paths) - self.model.appendSources(paths, skipListed=True)
+        self.statusbar.showMessage(f'scanning ... {scanner.files} sources in {scanner.dirs} folders')
+
+    @Slot(object, dict)
+    def showScanFinished(self, scanner, stats: dict) -> None:
+        if scanner is not self.scanner:
+            return
+        self.scanner = None
+        self.scanThread = None
+        self.statusbar.showMessage(f"{stats['files']} sources found in {stats['dirs']} folders, "
+                                   f"{self.scanListed} already listed, "
+                                   f"{stats['duplicates']} duplicates and {stats['rejected']} broken files skipped")
+
+    def startWatch(self, directory: str) -> None:
+        self.stopWatch()
+        self.watchDetector = WatchDetector(self.configManager, directory, onQueued=self.watchQueued.emit,
+                                           onFinished=self.watchFinished.emit, onAlert=self.fireAlert.emit,
+                                           onCancelled=self.watchCancelled.emit)
+        self.watchDetector.start()
+        self.statusbar.showMessage(f'watching {directory}, new files are detected as they arrive')
+
+    def stopWatch(self) -> None:
+        # never waits on the gui thread, a video being detected is cancelled after its current frame
+        if self.watchDetector is not None:
+            self.watchDetector.stop(wait=False)
+            print(f'watch stopped: {self.watchDetector.stats()}')
+        self.watchDetector = None  # its rows stay mapped, the last results and the cancelled files still arrive
+
+    @Slot(list)
+    def addWatchedSources(self, paths: list) -> None:
+        first = self.model.rowCount()
+        self.model.appendSources(paths, status='Queued')
+        for i, path in enumerate(paths):
+            self.watchRows[path] = first + i
+
+    @Slot(list)
+    def cancelWatchedSources(self, paths: list) -> None:
+        for path in paths:
+            row = self.watchRows.pop(path, None)
+            self.model.updateSourceStatus(row, 'Cancelled') if row is not None else None
+
+    @Slot(str, bool)
+    def showWatchedResult(self, path: str, ok: bool) -> None:
+        row = self.watchRows.pop(path, None)
+        if row is not None:
+            self.model.updateSourceStatus(row, 'Completed' if ok else 'Failed')
+        if ok and self.streamPipeline is None and not isVideoPath(path):  # the latest snapshot stays in view
+            isOutputExist = self.isOutputPathExist(path)
+            if isOutputExist[0]:
+                self.updateSourceLabelDisplay(path)
+                self.updateOutputLabelDisplay(isOutputExist[1])
 
     def inputSelectButtonClicked(self):
-        if self.isSingleFile:  # if index of comboBox is 0 (false)
+        if self.isWatch:  # if index of comboBox is 3
+            directory = QFileDialog.getExistingDirectory(
+                None,
+                "Select a directory to watch",
+                "/",
+                QFileDialog.Option.ShowDirsOnly
+            )
+            self.startWatch(directory) if directory else None
+
+        elif self.isStream:  # if index of comboBox is 2
+            stream, ok = QInputDialog.getText(
+                self,
+                'add stream',
+                'camera:0, rtsp://..., http://... or loop:path/to/video.mp4'
+            )
+            self.putFileToSourceList([stream.strip()]) if ok and isStreamPath(stream.strip()) else None
+
+        elif self.isSingleFile:  # if index of comboBox is 0 (false)
             files = QFileDialog.getOpenFileNames(
                 self,
                 'choose file (video/picture)',
@@ -575,11 +840,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def setIsSingleFile(self):
         self.isSingleFile = not bool(self.comboBox.currentIndex())
-        print(f'single file mode: {self.isSingleFile}')
+        self.isStream = self.comboBox.currentIndex() == 2
+        self.isWatch = self.comboBox.currentIndex() == 3
+        print(f'single file mode: {self.isSingleFile}, stream mode: {self.isStream}, watch mode: {self.isWatch}')
 
 
 if __name__ == '__main__':
     app = QApplication([])
     mainWindow = MainWindow()
     mainWindow.show()
+    app.processEvents()  # paint the window before anything heavy starts
+    mainWindow.warmupModel()
     app.exec()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :playback.py
+
+"""
+video decoding for the preview player.
+nothing in here may import Qt, the player in main.py only pulls ready frames out of it.
+"""
+
+import os
+import json
+import bisect
+import threading
+from collections import deque, OrderedDict
+
+import cv2
+import numpy as np
+
+
+def fitSize(width: int, height: int, targetSize: tuple[int, int]) -> tuple[int, int]:
+    """the largest (width, height) with the same aspect ratio that fits into targetSize"""
+    scale = min(targetSize[0] / width, targetSize[1] / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class FrameIndex:
+    """
+    frame count and keyframe positions of one video.
+
+    it is built once by demuxing the packets without decoding them (opencv raw mode) and cached as json,
+    the cache file name carries the size and mtime of the video so an edited video gets a new index.
+    with it a seek is only issued when a keyframe lies between the decoder and the target,
+    short jumps forward are decoded through instead, which is what the seek would do anyway.
+    """
+
+    def __init__(self, frameCount: int, fps: float, keyframes: list[int]):
+        self.frameCount = frameCount
+        self.fps = fps
+        self.keyframes = keyframes
+
+    @classmethod
+    def build(cls, videoPath: str) -> 'FrameIndex':
+        cap = cv2.VideoCapture(videoPath, cv2.CAP_FFMPEG)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        hasKeyFrame = getattr(cv2, 'CAP_PROP_LRF_HAS_KEY_FRAME', None)
+        keyframes = []
+        frameCount = 0
+        if hasKeyFrame is not None and cap.set(cv2.CAP_PROP_FORMAT, -1):  # raw packets, nothing is decoded
+            while cap.grab():
+                if cap.get(hasKeyFrame):
+                    keyframes.append(frameCount)
+                frameCount += 1
+        else:  # old opencv or another backend, only the header is known
+            frameCount = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+        cap.release()
+        return cls(frameCount, fps, keyframes)
+
+    @staticmethod
+    def cachePath(videoPath: str, cacheDir: str) -> str:
+        stat = os.stat(videoPath)
+        fileName = f'{os.path.basename(videoPath)}.{stat.st_size}-{int(stat.st_mtime)}.index.json'
+        return os.path.join(cacheDir, fileName).replace('\\', '/')
+
+    @classmethod
+    def load(cls, videoPath: str, cacheDir: str) -> 'FrameIndex':
+        """read the cached index of videoPath, build and cache it on first use"""
+        cachePath = cls.cachePath(videoPath, cacheDir)
+        if os.path.exists(cachePath):
+            with open(cachePath) as f:
+                data = json.load(f)
+            return cls(data['frameCount'], data['fps'], data['keyframes'])
+
+        index = cls.build(videoPath)
+        if index.keyframes:  # nothing worth caching when the keyframes are unknown
+            os.makedirs(cacheDir, exist_ok=True)
+            with open(cachePath, 'w') as f:
+                json.dump({'frameCount': index.frameCount, 'fps': index.fps, 'keyframes': index.keyframes}, f)
+        return index
+
+    def keyframeBefore(self, position: int) -> int:
+        i = bisect.bisect_right(self.keyframes, position)
+        return self.keyframes[i - 1] if i else 0
+
+    def needsSeek(self, current: int, target: int) -> bool:
+        """is a real seek cheaper than decoding forward from current to target"""
+        if target < current:
+            return True
+        if not self.keyframes:
+            return target - current > self.fps  # unknown gop, decode through at most one second
+        return self.keyframeBefore(target) > current
+
+
+class FrameCache:
+    """
+    memory budgeted LRU cache of decoded, already scaled frames, shared by every FrameSource of a player.
+    scrubbing back and forth over the same region is served from here without touching the decoder.
+    """
+
+    def __init__(self, budgetBytes: int = 256 * 1024 * 1024):
+        self.budgetBytes = budgetBytes
+        self.usedBytes = 0
+        self._frames: OrderedDict[tuple, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key: tuple, frame) -> None:
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return
+            self._frames[key] = frame
+            self.usedBytes += frame.nbytes
+            while self.usedBytes > self.budgetBytes and len(self._frames) > 1:
+                _, evicted = self._frames.popitem(last=False)
+                self.usedBytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.usedBytes = 0
+
+
+class FrameSource:
+    """
+    decodes one video sequentially on a background thread into a small prefetch ring buffer.
+
+    while playing the decoder just keeps reading forward, a seek only happens when seek() is called,
+    i.e. when the user actually moves the slider. while paused only the frame of the last seek is decoded,
+    older seek requests that have not started yet are simply overwritten.
+    frames are scaled to targetSize on the decoder thread before anything else touches them, so the GUI only
+    wraps the BGR bytes. while playing they are written into a ring of preallocated slots with the fast
+    interpolation, while paused they get the smooth one and are kept in the shared FrameCache.
+    every frame carries its container timestamp so that several sources can be aligned by time.
+    onFrameReady() is called from the decoder thread whenever a seek result is ready.
+    """
+
+    def __init__(self, path: str, bufferSize: int = 8, onFrameReady=None,
+                 cache: FrameCache | None = None, indexDir: str | None = None):
+        self.path = path
+        self.bufferSize = max(1, bufferSize)
+        self.onFrameReady = onFrameReady
+        self.cache = cache
+        self.targetSize: tuple[int, int] | None = None
+        self.index: FrameIndex | None = None
+
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.frameCount = max(int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)), 1)
+
+        self._buffer: deque[tuple[int, float, object]] = deque()  # (position, timestamp ms, frame)
+        self._decoded = None  # reused by cap.read()
+        # a slot is only rewritten after bufferSize newer frames, by then the GUI has long copied it to a pixmap
+        self._slots: list[np.ndarray] = []
+        self._slotIndex = 0
+        self._cond = threading.Condition()
+        self._seekTo: int | None = None
+        self._resumeAt: int | None = None  # where to continue after a seek that was served by the cache
+        self._generation = 0  # bumped by every seek, frames of an older generation are dropped
+        self._playing = False
+        self._finished = False
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name=f'FrameSource {path}', daemon=True)
+        if self.cap.isOpened():
+            self._thread.start()
+            if indexDir:
+                threading.Thread(target=self._loadIndex, args=(indexDir,), daemon=True).start()
+
+    def _loadIndex(self, indexDir: str) -> None:
+        try:
+            self.index = FrameIndex.load(self.path, indexDir)
+        except (OSError, ValueError, KeyError) as e:
+            print(f'failed to index {self.path}: {e}')
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def setTargetSize(self, width: int, height: int) -> None:
+        self.targetSize = (width, height)
+
+    def cacheKey(self, position: int) -> tuple:
+        return self.path, position, self.targetSize
+
+    @property
+    def durationMs(self) -> float:
+        frameCount = self.index.frameCount if self.index and self.index.frameCount else self.frameCount
+        return frameCount * 1000 / self.fps
+
+    def timestampOf(self, position: int) -> float:
+        return position * 1000 / self.fps
+
+    def positionAt(self, timestampMs: float) -> int:
+        """the frame shown at timestampMs, streams are aligned by time and not by frame number"""
+        return max(0, int(timestampMs * self.fps / 1000))
+
+    def seek(self, position: int) -> None:
+        position = max(0, position)
+        cached = self.cache.get(self.cacheKey(position)) if self.cache else None
+        with self._cond:
+            self._generation += 1
+            self._buffer.clear()
+            self._finished = False
+            if cached is not None:
+                self._buffer.append((position, self.timestampOf(position), cached))
+                self._seekTo = None
+                self._resumeAt = position + 1
+            else:
+                self._seekTo = position
+                self._resumeAt = None
+            self._cond.notify_all()
+        if cached is not None and self.onFrameReady:
+            self.onFrameReady()
+
+    def play(self) -> None:
+        with self._cond:
+            self._playing = True
+            self._cond.notify_all()
+
+    def pause(self) -> None:
+        with self._cond:
+            self._playing = False
+
+    def ready(self) -> bool:
+        with self._cond:
+            return bool(self._buffer)
+
+    def isFinished(self) -> bool:
+        """the decoder reached the end of the file and every decoded frame has been taken"""
+        with self._cond:
+            return self._finished and not self._buffer
+
+    def take(self) -> tuple[int, float, object] | None:
+        """pop the oldest decoded (position, timestamp, frame), None if the decoder has not caught up yet"""
+        with self._cond:
+            if not self._buffer:
+                return None
+            item = self._buffer.popleft()
+            self._cond.notify_all()  # a slot in the ring buffer is free again
+            return item
+
+    def takeUntil(self, timestampMs: float) -> tuple[int, float, object] | None:
+        """
+        pop the newest frame that is due at timestampMs, frames that are already late are dropped.
+        None if no frame is due yet, or the decoder has not caught up.
+        """
+        with self._cond:
+            item = None
+            while self._buffer and self._buffer[0][1] <= timestampMs:
+                item = self._buffer.popleft()
+            if item is not None:
+                self._cond.notify_all()
+            return item
+
+    def takeLatest(self) -> tuple[int, float, object] | None:
+        """drop everything but the newest decoded frame and return it"""
+        with self._cond:
+            if not self._buffer:
+                return None
+            item = self._buffer.pop()
+            self._buffer.clear()
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.cap.release()
+
+    def _mustWait(self) -> bool:
+        if self._closed or self._seekTo is not None:
+            return False
+        return not self._playing or self._finished or len(self._buffer) >= self.bufferSize
+
+    def _moveTo(self, current: int, target: int) -> None:
+        index = self.index
+        if index is not None and not index.needsSeek(current, target):
+            for _ in range(target - current):  # no keyframe in between, decoding through is cheaper
+                self.cap.grab()
+        elif target != current:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+
+    def _nextSlot(self, shape: tuple) -> np.ndarray:
+        if not self._slots or self._slots[0].shape != shape:
+            self._slots = [np.empty(shape, dtype=np.uint8) for _ in range(self.bufferSize + 2)]
+        self._slotIndex = (self._slotIndex + 1) % len(self._slots)
+        return self._slots[self._slotIndex]
+
+    def _scale(self, frame: np.ndarray, playing: bool) -> np.ndarray:
+        """resize the decoded frame into a buffer of its own, a reused ring slot while playing"""
+        height, width = frame.shape[:2]
+        if self.targetSize is not None:
+            width, height = fitSize(width, height, self.targetSize)
+        shape = (height, width) + frame.shape[2:]
+        out = self._nextSlot(shape) if playing else np.empty(shape, dtype=np.uint8)
+        if out.shape == frame.shape:
+            np.copyto(out, frame)
+        else:
+            cv2.resize(frame, (width, height), dst=out,
+                       interpolation=cv2.INTER_LINEAR if playing else cv2.INTER_AREA)
+        return out
+
+    def _run(self) -> None:
+        position = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._mustWait())
+                if self._closed:
+                    return
+                seekTo, self._seekTo = self._seekTo, None
+                target = seekTo if seekTo is not None else self._resumeAt
+                self._resumeAt = None
+                generation = self._generation
+                playing = self._playing
+
+            if target is not None:
+                self._moveTo(position, target)
+                position = target
+            ok, self._decoded = self.cap.read(self._decoded)
+            if ok:
+                # the container timestamp survives frames that were dropped or duplicated when re-encoding
+                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+                timestamp = timestamp if timestamp > 0 or position == 0 else self.timestampOf(position)
+                frame = self._scale(self._decoded, playing)
+                if not playing and self.cache:  # slots are reused, only frames of their own can be cached
+                    self.cache.put(self.cacheKey(position), frame)
+
+            with self._cond:
+                if generation != self._generation:  # the user moved on while this frame was decoding
+                    position += ok
+                    continue
+                if not ok:
+                    self._finished = True
+                    continue
+                self._buffer.append((position, timestamp, frame))
+            position += 1
+
+            if seekTo is not None and self.onFrameReady:
+                self.onFrameReady()
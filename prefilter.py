@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :prefilter.py
+
+"""
+cheap first stage in front of the model: frames without anything fire coloured (or, in videos, without
+anything flickering) are answered with an empty result and never reach the network.
+
+    python prefilter.py testSources [--model model/best.pt] [--step 5]
+
+benchmarks a grid of thresholds against the model: recall is the share of the frames with detections
+that the prefilter lets through, skipped the share of all frames the model would not have to see.
+"""
+
+import os
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from settings import Settings, pa, IMAGE_SUFFIXES, VIDEO_SUFFIXES, isVideoPath
+
+
+class FirePrefilter:
+    """
+    HSV fire colour + temporal flicker test on a downscaled frame.
+
+    colour: share of pixels with a red to yellow hue, enough saturation and high brightness,
+    a frame passes when it reaches colorThreshold.
+    flicker: mean brightness change of those pixels since the previously checked frame of the same video,
+    a frame passes when it reaches flickerThreshold (0 turns the stage off, still images always pass it).
+    counts[stage] holds how many frames every stage passed and rejected.
+    """
+
+    def __init__(self, colorThreshold: float = 0.0005, flickerThreshold: float = 0.0, width: int = 160,
+                 hueMax: int = 35, hueMin: int = 165, saturationMin: int = 60, valueMin: int = 150):
+        self.colorThreshold = colorThreshold
+        self.flickerThreshold = flickerThreshold
+        self.width = width
+        self.hueMax = hueMax  # opencv hue is 0-180: 0-35 red to yellow, 165-180 the red wrapping around
+        self.hueMin = hueMin
+        self.saturationMin = saturationMin
+        self.valueMin = valueMin
+
+        self.previous = None  # value channel of the previously checked video frame
+        self.counts = {'color': [0, 0], 'flicker': [0, 0]}  # stage -> [passed, rejected]
+
+    def reset(self) -> None:
+        """forget the previous frame, call it before the first frame of every video"""
+        self.previous = None
+
+    def resetCounts(self) -> None:
+        self.counts = {stage: [0, 0] for stage in self.counts}
+
+    def stats(self) -> dict:
+        return {stage: {'passed': passed, 'rejected': rejected} for stage, (passed, rejected) in self.counts.items()}
+
+    def scores(self, frame: np.ndarray, temporal: bool = False) -> tuple[float, float | None]:
+        """(colour score, flicker score), the flicker score is None without a previous frame"""
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, height * self.width // width))
+        hsv = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2HSV)
+        hue, saturation, value = cv2.split(hsv)
+        mask = (((hue <= self.hueMax) | (hue >= self.hueMin))
+                & (saturation >= self.saturationMin) & (value >= self.valueMin))
+        colorScore = np.count_nonzero(mask) / mask.size
+
+        flickerScore = None
+        if temporal:
+            if self.previous is not None and self.previous.shape == value.shape and mask.any():
+                flickerScore = float(cv2.absdiff(value, self.previous)[mask].mean()) / 255
+            self.previous = value
+        return colorScore, flickerScore
+
+    def decide(self, colorScore: float, flickerScore: float | None) -> tuple[bool, bool]:
+        """(colour stage passed, flicker stage passed)"""
+        colorOk = colorScore >= self.colorThreshold
+        flickerOk = self.flickerThreshold <= 0 or flickerScore is None or flickerScore >= self.flickerThreshold
+        return colorOk, flickerOk
+
+    def check(self, frame: np.ndarray, temporal: bool = False) -> bool:
+        """true when the frame has to go to the model"""
+        colorOk, flickerOk = self.decide(*self.scores(frame, temporal))
+        self.counts['color'][not colorOk] += 1
+        if colorOk:
+            self.counts['flicker'][not flickerOk] += 1
+        return colorOk and flickerOk
+
+
+def mergeStats(total: dict, stats: dict) -> dict:
+    for stage, counts in stats.items():
+        for key, value in counts.items():
+            total.setdefault(stage, {}).setdefault(key, 0)
+            total[stage][key] += value
+    return total
+
+
+def benchmarkFrames(folder: str, step: int = 5, maxVideoFrames: int = 600):
+    """
+    yield (frame, is a video frame, first frame of its video, evaluated) for the images and every video frame,
+    evaluated for the images and every step-th video frame. the frames in between are yielded too: the flicker
+    score compares consecutive frames like detectVideo does, not frames step apart.
+    """
+    sources = sorted(pa(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names
+                     if name.lower().endswith(IMAGE_SUFFIXES + VIDEO_SUFFIXES))
+    for path in sources:
+        if not isVideoPath(path):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame, False, True, True
+            continue
+        cap = cv2.VideoCapture(path)
+        index = 0
+        while index < maxVideoFrames * step:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame, True, index == 0, index % step == 0
+            index += 1
+        cap.release()
+
+
+def benchmark(folder: str, modelPath: str, conf: float, colorThresholds: list[float],
+              flickerThresholds: list[float], step: int = 5) -> dict:
+    """
+    score every frame once, run the model once on every evaluated one, then evaluate every threshold pair on the
+    recorded scores
+    """
+    from engine import modelRegistry
+
+    model = modelRegistry.get(modelPath, device='cpu')
+    prefilter = FirePrefilter()
+    samples = []  # (colour score, flicker score, model found something)
+    prefilterTime = modelTime = 0.0
+    scored = 0
+    for frame, temporal, first, evaluated in benchmarkFrames(folder, step):
+        if first:
+            prefilter.reset()
+        started = time.perf_counter()
+        colorScore, flickerScore = prefilter.scores(frame, temporal)
+        prefilterTime += time.perf_counter() - started
+        scored += 1
+        if not evaluated:
+            continue
+        started = time.perf_counter()
+        result = model.predict(source=frame, conf=conf, verbose=False)[0]
+        modelTime += time.perf_counter() - started
+        samples.append((colorScore, flickerScore, result.boxes is not None and len(result.boxes) > 0))
+
+    positives = sum(found for _, _, found in samples)
+    grid = []
+    for colorThreshold in colorThresholds:
+        for flickerThreshold in flickerThresholds:
+            candidate = FirePrefilter(colorThreshold, flickerThreshold)
+            passed = [all(candidate.decide(c, f)) for c, f, _ in samples]
+            kept = sum(p and found for p, (_, _, found) in zip(passed, samples))
+            grid.append({
+                'colorThreshold': colorThreshold,
+                'flickerThreshold': flickerThreshold,
+                'recall': round(kept / positives, 4) if positives else 1.0,
+                'skipped': round(1 - sum(passed) / len(samples), 4) if samples else 0.0,
+            })
+    return {
+        'frames': len(samples),
+        'framesWithDetections': positives,
+        'prefilterMsPerFrame': round(prefilterTime * 1000 / max(1, scored), 3),
+        'modelMsPerFrame': round(modelTime * 1000 / max(1, len(samples)), 3),
+        'grid': grid,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='FireEye prefilter recall benchmark')
+    parser.add_argument('folder', help='images / videos to benchmark on, e.g. testSources')
+    parser.add_argument('--config', default='config/config.json')
+    parser.add_argument('--model', help='default: Model.ModelPath of the config')
+    parser.add_argument('--step', type=int, default=5, help='evaluate every n-th video frame')
+    parser.add_argument('--color', type=float, nargs='+', default=[0.0001, 0.0005, 0.001, 0.005, 0.01])
+    parser.add_argument('--flicker', type=float, nargs='+', default=[0.0, 0.005, 0.01, 0.02])
+    args = parser.parse_args()
+
+    settings = Settings(args.config)
+    report = benchmark(args.folder, args.model or settings.ModelPath, settings.confidence,
+                       args.color, args.flicker, args.step)
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :quantize.py
+
+"""
+INT8 post-training quantization of the fire model (openvino + nncf through ultralytics).
+
+    python quantize.py testSources [--tolerance 0.02] [--data labeled.yaml] [--max-frames 300]
+
+the images of the folder and frames sampled from its videos are used for calibration. the report compares
+speed and mAP / recall of the INT8 model with the FP32 model. without --data the FP32 predictions on the
+calibration frames are the reference, so the numbers say how much of what FP32 finds INT8 still finds.
+when the fire recall drop stays within the tolerance the INT8 model is copied next to the weights as
+<stem>_int8_openvino_model/, pick the .xml inside it with the model picker (the report names it as 'modelPath').
+the model is loaded from that folder, keep its name when moving it.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+import cv2
+
+from settings import Settings, pa, IMAGE_SUFFIXES, VIDEO_SUFFIXES, isVideoPath
+
+
+def collectCalibrationFrames(folder: str, outputDir: str, maxFrames: int = 300) -> list[str]:
+    """copy / extract up to maxFrames images from folder (recursive) into outputDir as jpg"""
+    sources = sorted(pa(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names
+                     if name.lower().endswith(IMAGE_SUFFIXES + VIDEO_SUFFIXES))
+    images = [path for path in sources if not isVideoPath(path)]
+    videos = [path for path in sources if isVideoPath(path)]
+    frames: list[str] = []
+
+    for path in images[:maxFrames]:
+        image = cv2.imread(path)
+        if image is not None:
+            frames.append(pa(os.path.join(outputDir, f'{len(frames):06d}.jpg')))
+            cv2.imwrite(frames[-1], image)
+
+    # the rest of the budget is spread evenly over the videos and over the length of each video
+    perVideo = (maxFrames - len(frames)) // len(videos) if videos else 0
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, frameCount // max(1, perVideo))
+        for position in range(0, frameCount, step)[:perVideo]:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            ok, frame = cap.read()
+            if ok:
+                frames.append(pa(os.path.join(outputDir, f'{len(frames):06d}.jpg')))
+                cv2.imwrite(frames[-1], frame)
+        cap.release()
+    return frames
+
+
+def writePseudoLabels(model, images: list[str], labelsDir: str, conf: float) -> None:
+    """yolo format labels from the FP32 predictions, they are the reference when no labeled data is given"""
+    os.makedirs(labelsDir, exist_ok=True)
+    for path in images:
+        result = model.predict(source=path, conf=conf, verbose=False)[0]
+        lines = [f'{int(cls)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}'
+                 for cls, (x, y, w, h) in zip(result.boxes.cls.tolist(), result.boxes.xywhn.tolist())]
+        labelPath = os.path.join(labelsDir, os.path.splitext(os.path.basename(path))[0] + '.txt')
+        with open(labelPath, 'w') as f:
+            f.write('\n'.join(lines))
+
+
+def writeDatasetYaml(root: str, names: dict[int, str]) -> str:
+    # json is valid yaml, no need for a yaml writer
+    path = pa(os.path.join(root, 'data.yaml'))
+    with open(path, 'w') as f:
+        json.dump({'path': root, 'train': 'images', 'val': 'images', 'names': names}, f, indent=4)
+    return path
+
+
+def evaluate(model, data: str, names: dict[int, str]) -> dict:
+    metrics = model.val(data=data, batch=1, plots=False, verbose=False)
+    box = metrics.box
+    fireClasses = [i for i, name in names.items() if 'fire' in name.lower()]
+    classRecall = {names[int(c)]: round(float(box.class_result(i)[1]), 4) for i, c in enumerate(box.ap_class_index)}
+    fireRecalls = [classRecall[names[c]] for c in fireClasses if names[c] in classRecall]
+    return {
+        'mAP50': round(float(box.map50), 4),
+        'mAP50-95': round(float(box.map), 4),
+        'precision': round(float(box.mp), 4),
+        'recall': round(float(box.mr), 4),
+        'fireRecall': round(sum(fireRecalls) / len(fireRecalls), 4) if fireRecalls else round(float(box.mr), 4),
+        'classRecall': classRecall,
+        'inferenceMs': round(metrics.speed['inference'], 2),
+    }
+
+
+def quantize(weightsPath: str, calibrationFolder: str, tolerance: float = 0.02, data: str | None = None,
+             maxFrames: int = 300, conf: float = 0.25) -> dict:
+    """quantize weightsPath to INT8, compare it with FP32 and publish it next to the weights if accepted"""
+    from ultralytics import YOLO
+
+    weightsPath = pa(os.path.abspath(weightsPath))
+    stem = os.path.splitext(os.path.basename(weightsPath))[0]
+    published = pa(os.path.join(os.path.dirname(weightsPath), f'{stem}_int8_openvino_model'))
+
+    with tempfile.TemporaryDirectory(prefix='fireeye-int8-') as workDir:
+        imagesDir = os.path.join(workDir, 'images')
+        os.makedirs(imagesDir)
+        frames = collectCalibrationFrames(calibrationFolder, imagesDir, maxFrames)
+        if not frames:
+            raise ValueError(f'no images or videos found in {calibrationFolder}')
+
+        fp32 = YOLO(weightsPath, task='detect')
+        names = dict(fp32.names)
+        calibrationData = writeDatasetYaml(pa(workDir), names)
+        if data is None:
+            writePseudoLabels(fp32, frames, os.path.join(workDir, 'labels'), conf)
+            data, reference = calibrationData, 'fp32 predictions'
+        else:
+            reference = data
+
+        # ultralytics writes the export next to the weights it is given, keep the original folder clean
+        weightsCopy = os.path.join(workDir, os.path.basename(weightsPath))
+        shutil.copy2(weightsPath, weightsCopy)
+        quantized = pa(str(YOLO(weightsCopy).export(format='openvino', int8=True, data=calibrationData)))
+
+        report = {
+            'model': weightsPath,
+            'calibrationFolder': pa(os.path.abspath(calibrationFolder)),
+            'calibrationFrames': len(frames),
+            'reference': reference,
+            'fp32': evaluate(fp32, data, names),
+            'int8': evaluate(YOLO(quantized, task='detect'), data, names),
+            'tolerance': tolerance,
+        }
+        report['speedup'] = round(report['fp32']['inferenceMs'] / max(report['int8']['inferenceMs'], 1e-6), 2)
+        report['fireRecallDrop'] = round(report['fp32']['fireRecall'] - report['int8']['fireRecall'], 4)
+        report['accepted'] = report['fireRecallDrop'] <= tolerance
+
+        if report['accepted']:
+            shutil.rmtree(published, ignore_errors=True)
+            shutil.copytree(quantized, published)
+            report['quantized'] = published
+            report['modelPath'] = pa(os.path.join(published, f'{stem}.xml'))  # what goes into Model.ModelPath
+
+    with open(pa(os.path.join(os.path.dirname(weightsPath), f'{stem}_int8_report.json')), 'w') as f:
+        json.dump(report, f, indent=4)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='FireEye INT8 quantization')
+    parser.add_argument('calibration', help='folder of representative images / videos, e.g. testSources')
+    parser.add_argument('--config', default='config/config.json')
+    parser.add_argument('--model', help='weights to quantize, default: Model.ModelPath of the config')
+    parser.add_argument('--tolerance', type=float, help='accepted fire recall drop, default: Model.quantRecallTolerance')
+    parser.add_argument('--data', help='labeled dataset yaml for real mAP / recall instead of the fp32 reference')
+    parser.add_argument('--max-frames', type=int, default=300)
+    args = parser.parse_args()
+
+    settings = Settings(args.config)
+    tolerance = args.tolerance if args.tolerance is not None else settings.quantRecallTolerance
+    result = quantize(args.model or settings.ModelPath, args.calibration, tolerance, args.data, args.max_frames)
+    print(json.dumps(result, indent=4))
+    if not result['accepted']:
+        print(f"fire recall dropped by {result['fireRecallDrop']} > {tolerance}, the INT8 model was not published",
+              file=sys.stderr)
+    sys.exit(0 if result['accepted'] else 1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :resultcache.py
+
+"""
+persistent cache of detection results, so detecting the same list again only runs the new files.
+an entry is keyed by (file content hash, model hash, confidence, imgsz and the other options changing the output)
+and holds the boxes and the annotated output, named after the source that filled it and renamed for another
+source with the same content when restored. the content hash of a file is remembered per
+(path, size, mtime), a multi-GB video is only hashed again when it really changed.
+output files are hard linked into the cache and back out of it, a hit on a multi-GB video costs no copy and
+no second copy on disk. the detection has to replace a linked output instead of writing into it, see detach().
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from settings import pa
+
+
+def linkOrCopy(source: str, destination: str) -> None:
+    """hard link source to destination (replacing it), a copy where links are not possible (other drive, fat32)"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+class ResultCache:
+    """
+    index.json + one folder per entry under cacheDir. when the entries grow beyond maxBytes the least recently
+    used ones are dropped, an output larger than maxBytes on its own is not cached at all.
+    only used from one process, the scheduler workers never touch it. within that process several threads
+    (the detect thread, the watch folder) share one instance, every method takes its lock.
+    """
+
+    def __init__(self, cacheDir: str, maxBytes: int = 2 << 30, saveEvery: int = 50):
+        self.cacheDir = pa(cacheDir)
+        self.maxBytes = maxBytes
+        self.saveEvery = saveEvery
+        self.indexPath = pa(os.path.join(self.cacheDir, 'index.json'))
+        self.files: dict[str, list] = {}  # path -> [size, mtime_ns, content hash]
+        self.entries: dict[str, dict] = {}  # key -> {'files', 'records', 'bytes', 'used'}
+        self._unsaved = 0
+        self._lock = threading.RLock()
+
+        try:
+            with open(self.indexPath) as f:
+                index = json.load(f)
+            self.files, self.entries = index['files'], index['entries']
+        except (OSError, ValueError, KeyError):
+            pass  # no cache yet, or a broken index: start over
+
+    def fileHash(self, path: str) -> str:
+        stat = os.stat(path)
+        with self._lock:
+            known = self.files.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        # hashed without the lock, another thread must not wait for a multi-GB video
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        with self._lock:
+            self.files[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def makeKey(self, path: str, modelHash: str, conf: float, imgsz: int = 640, options: dict | None = None) -> str:
+        # the suffix too: an annotated image is encoded after it, the same bytes as .jpg and .png differ
+        suffix = os.path.splitext(path)[1].lower()
+        key = json.dumps([self.fileHash(path), suffix, modelHash, conf, imgsz, options or {}], sort_keys=True)
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if not all(os.path.exists(os.path.join(self.cacheDir, key, name)) for name in entry['files']):
+                self._drop(key)  # somebody cleaned the folder by hand
+                return None
+            entry['used'] = time.time()
+            return entry
+
+    def restore(self, key: str, outputDir: str, stem: str | None = None) -> tuple[list | None, list[str]] | None:
+        """
+        link the cached output files into outputDir, returns (cached boxes, restored files) or None on a miss.
+        the files are named after stem (the name of the source without suffix) when the entry was filled by
+        another source, a.jpg restored for b.jpg becomes b.jpg.
+        """
+        with self._lock:
+            entry = self.get(key)
+            if entry is None:
+                return None
+            source = entry.get('stem')
+            if stem is not None and stem != source:
+                if source is None or not all(name.startswith(source) for name in entry['files']):
+                    return None  # an entry of an older version, which part of the names to replace is unknown
+            os.makedirs(outputDir, exist_ok=True)
+            restored = []
+            for name in entry['files']:
+                restored.append(os.path.join(outputDir, name if stem is None else stem + name[len(source):]))
+                linkOrCopy(os.path.join(self.cacheDir, key, name), restored[-1])
+            return entry['records'], restored
+
+    @staticmethod
+    def detach(paths: list[str]) -> None:
+        """
+        remove the outputs that are linked to the cache before they are written again: the writers truncate
+        and write into the existing file, which would change the cached copy under the same inode.
+        """
+        for path in paths:
+            try:
+                if os.stat(path).st_nlink > 1:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def put(self, key: str, outputFiles: list[str], records: list | None = None, stem: str | None = None) -> None:
+        """cache the outputs of the source named stem (without suffix) under key"""
+        outputFiles = [path for path in outputFiles if os.path.exists(path)]
+        size = sum(os.path.getsize(path) for path in outputFiles)
+        if size > self.maxBytes:  # would be evicted again right away
+            print(f'result cache: {size >> 20} MB of output is more than the cache holds, not cached')
+            return
+        with self._lock:
+            entryDir = os.path.join(self.cacheDir, key)
+            os.makedirs(entryDir, exist_ok=True)
+            for path in outputFiles:
+                linkOrCopy(path, os.path.join(entryDir, os.path.basename(path)))
+            self.entries[key] = {'files': [os.path.basename(path) for path in outputFiles], 'records': records,
+                                 'bytes': size, 'used': time.time(), 'stem': stem}
+            self._evict()
+            self._unsaved += 1
+            if self._unsaved >= self.saveEvery:
+                self.save()
+
+    def _drop(self, key: str) -> None:
+        self.entries.pop(key, None)
+        shutil.rmtree(os.path.join(self.cacheDir, key), ignore_errors=True)
+
+    def _evict(self) -> None:
+        total = sum(entry['bytes'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['used']):
+            if total <= self.maxBytes:
+                break
+            total -= self.entries[key]['bytes']
+            self._drop(key)
+
+    def save(self) -> None:
+        # forget the hashes of files that are gone, write to a temp file first so a crash never leaves half an index
+        with self._lock:
+            self.files = {path: known for path, known in self.files.items() if os.path.exists(path)}
+            os.makedirs(self.cacheDir, exist_ok=True)
+            with open(self.indexPath + '.tmp', 'w') as f:
+                json.dump({'files': self.files, 'entries': self.entries}, f)
+            os.replace(self.indexPath + '.tmp', self.indexPath)
+            self._unsaved = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :scanner.py
+
+"""
+recursive source discovery for big trees (a NAS archive with a million files).
+directories are walked with os.scandir, the found files are handed out in chunks while the walk goes on,
+so the caller can show the first thousands before the last directory was even opened.
+nothing in here may import Qt.
+
+    python scanner.py /mnt/archive --include "*.jpg" --exclude "@eaDir" --exclude ".*"
+"""
+
+import os
+import sys
+import time
+import fnmatch
+import argparse
+import threading
+
+from settings import pa, isImagePath, isVideoPath
+
+# first bytes of the formats the detection can open, (offset, signature)
+IMAGE_SIGNATURES = ((0, b'\xff\xd8\xff'), (0, b'\x89PNG\r\n\x1a\n'), (0, b'BM'))
+VIDEO_SIGNATURES = ((4, b'ftyp'), (4, b'moov'), (4, b'mdat'), (4, b'wide'), (4, b'free'),  # mp4 / mov
+                    (8, b'AVI '), (0, b'\x1a\x45\xdf\xa3'), (0, b'FLV'),  # avi, mkv, flv
+                    (0, b'\x00\x00\x01\xba'), (0, b'\x00\x00\x01\xb3'))  # mpeg program / video stream
+
+
+def sniffType(path: str) -> str | None:
+    """'image', 'video' or None, from the first bytes of the file"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        return None
+    for kind, signatures in (('image', IMAGE_SIGNATURES), ('video', VIDEO_SIGNATURES)):
+        if any(head[offset:offset + len(signature)] == signature for offset, signature in signatures):
+            return kind
+    return None
+
+
+def matchesAny(relPath: str, name: str, patterns: list[str]) -> bool:
+    # a pattern with a / is matched against the path below the root, any other only against the name
+    return any(fnmatch.fnmatch(relPath if '/' in pattern else name, pattern) for pattern in patterns)
+
+
+class SourceScanner:
+    """
+    walks the roots depth first and yields lists of up to chunkSize absolute paths.
+
+    include: a file must match one of these globs (none = every image / video), exclude: files and whole
+    directories matching one of these are skipped. symlinks are followed, but every file and directory is
+    visited once by (device, inode), so links, hard links and link loops neither duplicate sources nor hang.
+    with sniff the first bytes of every candidate are checked, a .jpg that is really an html error page or a
+    half written .mp4 never reaches the model. the detection picks images / videos by suffix, so files
+    without an image / video suffix are not considered at all.
+    """
+
+    def __init__(self, include: list[str] | None = None, exclude: list[str] | None = None, sniff: bool = True,
+                 chunkSize: int = 500):
+        self.include = include or []
+        self.exclude = exclude or []
+        self.sniff = sniff
+        self.chunkSize = max(1, chunkSize)
+        self.stopped = threading.Event()
+
+        self.files = 0  # sources found
+        self.dirs = 0
+        self.duplicates = 0
+        self.rejected = 0  # wrong content
+        self._seen: set[tuple[int, int]] = set()
+
+    def stop(self) -> None:
+        """ends scan() after the current file, may be called from any thread"""
+        self.stopped.set()
+
+    @staticmethod
+    def _identity(entry: os.DirEntry) -> tuple[int, int]:
+        stat = entry.stat()
+        if not stat.st_ino:  # windows does not fill the inode from scandir
+            stat = os.stat(entry.path)
+        return stat.st_dev, stat.st_ino
+
+    def _accept(self, entry: os.DirEntry, relPath: str) -> bool:
+        name = entry.name
+        kind = 'image' if isImagePath(name) else 'video' if isVideoPath(name) else None
+        if kind is None or (self.include and not matchesAny(relPath, name, self.include)):
+            return False
+        if self.sniff and sniffType(entry.path) != kind:
+            self.rejected += 1
+            return False
+        return True
+
+    def scan(self, roots: list[str]):
+        chunk: list[str] = []
+        for root in roots:
+            root = os.path.abspath(root)
+            try:
+                stat = os.stat(root)
+            except OSError as e:
+                print(f'can not scan {root}: {e}')
+                continue
+            if (stat.st_dev, stat.st_ino) in self._seen:  # the same tree given twice, or below another root
+                continue
+            self._seen.add((stat.st_dev, stat.st_ino))
+            stack = [(root, '')]
+            while stack and not self.stopped.is_set():
+                directory, relDir = stack.pop()
+                try:
+                    with os.scandir(directory) as it:
+                        entries = sorted(it, key=lambda entry: entry.name)
+                except OSError as e:
+                    print(f'can not scan {directory}: {e}')
+                    continue
+                self.dirs += 1
+
+                subDirs = []
+                for entry in entries:
+                    if self.stopped.is_set():
+                        break
+                    relPath = f'{relDir}/{entry.name}' if relDir else entry.name
+                    if self.exclude and matchesAny(relPath, entry.name, self.exclude):
+                        continue
+                    try:
+                        isDir = entry.is_dir()
+                        if not isDir and not entry.is_file():
+                            continue
+                        identity = self._identity(entry)
+                    except OSError:  # a dangling link, or gone while scanning
+                        continue
+                    if identity in self._seen:
+                        self.duplicates += not isDir
+                        continue
+                    if isDir:
+                        self._seen.add(identity)
+                        subDirs.append((entry.path, relPath))
+                    elif self._accept(entry, relPath):
+                        self._seen.add(identity)
+                        chunk.append(pa(entry.path))
+                        self.files += 1
+                        if len(chunk) >= self.chunkSize:
+                            yield chunk
+                            chunk = []
+                stack.extend(reversed(subDirs))  # keep the sorted order, the first sub directory is popped next
+        if chunk:
+            yield chunk
+
+    def stats(self) -> dict:
+        return {'files': self.files, 'dirs': self.dirs, 'duplicates': self.duplicates, 'rejected': self.rejected}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='list the images / videos FireEye would pick up below a directory')
+    parser.add_argument('roots', nargs='+')
+    parser.add_argument('--include', action='append', default=[])
+    parser.add_argument('--exclude', action='append', default=[])
+    parser.add_argument('--no-sniff', action='store_true', help='trust the file suffix')
+    args = parser.parse_args()
+
+    scanner = SourceScanner(args.include, args.exclude, sniff=not args.no_sniff)
+    started = time.perf_counter()
+    for paths in scanner.scan(args.roots):
+        print('\n'.join(paths))
+    print(f'{scanner.stats()} in {time.perf_counter() - started:.1f} s', file=sys.stderr)
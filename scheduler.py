@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :scheduler.py
+
+"""
+spreads the checked sources over several worker processes.
+every worker holds its own cached model, so one slow file never blocks the others and the
+python side of the work (decode, pre/post-processing, nms) is no longer serialized by one GIL.
+the pool stays up between runs, starting it (torch import, model load) costs seconds per process.
+fire alerts and video progress of the workers come back through one queue, the calling process hands them
+to its sinks / callbacks like it does for the files it detects itself.
+"""
+
+import os
+import time
+import queue
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from settings import pa
+from engine import modelRegistry, detectImages, detectVideo, resultToRecords, isVideoPath
+from prefilter import mergeStats
+from store import DetectionStore
+from alerts import FireTracker
+
+# per worker process state, filled by _initWorker
+_workerConfig: dict = {}
+_workerEvents = None  # multiprocessing queue back to DetectionScheduler.run
+_workerStores: dict = {}  # (database, model) -> DetectionStore, opened once per worker
+
+MIN_PARALLEL_TASKS = 4  # below this many tasks the warm model of the calling process is faster than the pool
+
+
+def cpuCount() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on windows / macos
+        return os.cpu_count() or 1
+
+
+def planWorkers(workers: int, taskCount: int | None, device: str = 'cpu',
+                minTasks: int = MIN_PARALLEL_TASKS) -> tuple[int, int]:
+    """
+    decide (worker processes, torch threads per worker).
+    workers <= 0 means auto: on cpu about one process per 4 cores, on gpu a single process.
+    fewer than minTasks tasks always run in one process. taskCount None sizes a pool that stays up for lists
+    of any length, only the cores and the device count then.
+    """
+    cores = cpuCount()
+    if workers <= 0:
+        workers = max(1, cores // 4) if device.startswith('cpu') else 1
+    if taskCount is not None:
+        workers = 1 if taskCount < minTasks else min(workers, taskCount)
+    workers = max(1, min(workers, cores))
+    return workers, max(1, cores // workers)
+
+
+def makeTasks(paths: list[str], batchSize: int) -> list[list[str]]:
+    """every video is one task, images are sent in chunks of batchSize so the workers still batch them"""
+    batchSize = max(1, batchSize)
+    videos = [[path] for path in paths if isVideoPath(path)]
+    images = [path for path in paths if not isVideoPath(path)]
+    chunks = [images[i:i + batchSize] for i in range(0, len(images), batchSize)]
+    return videos + chunks  # the long videos first, the image chunks fill the gaps at the end
+
+
+def _initWorker(modelPath: str, device: str, backend: str, threads: int, events) -> None:
+    global _workerEvents
+    import cv2
+    import torch
+
+    # stdout belongs to the caller (the json lines of cli.py), whatever a worker prints goes to stderr
+    os.dup2(2, 1)
+
+    # split the cores between the workers instead of letting every process spawn one thread per core
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+
+    _workerConfig.update(modelPath=modelPath, device=device, backend=backend)
+    _workerEvents = events
+    modelRegistry.get(modelPath, device=device, backend=backend)  # load and warm up once per process
+
+
+def _workerStore(storePath: str | None, model: str) -> DetectionStore | None:
+    if not storePath:
+        return None
+    if (storePath, model) not in _workerStores:
+        _workerStores[(storePath, model)] = DetectionStore(storePath, model=model)
+    return _workerStores[(storePath, model)]
+
+
+class QueueSink:
+    """alert sink of a worker, the tracker events go to the calling process"""
+
+    def __init__(self, runId: int):
+        self.runId = runId
+
+    def emit(self, event: dict) -> None:
+        _workerEvents.put(('alert', self.runId, event))
+
+    def close(self) -> None:
+        pass
+
+
+def _runTask(runId: int, taskId: int, paths: list[str],
+             options: dict) -> tuple[list[tuple[str, bool, list | None]], dict]:
+    try:
+        return _detectTask(runId, paths, options)
+    finally:
+        _workerEvents.put(('end', runId, taskId))  # behind every event of the task in the queue
+
+
+def _detectTask(runId: int, paths: list[str], options: dict) -> tuple[list[tuple[str, bool, list | None]], dict]:
+    config = _workerConfig
+    model = modelRegistry.get(config['modelPath'], device=config['device'], backend=config['backend'])
+    prefilter, tiler = options['prefilter'], options['tiler']
+    prefilter.resetCounts() if prefilter is not None else None
+    tiler.resetCounts() if tiler is not None else None
+    store = _workerStore(options['storePath'], config['modelPath'])
+    done: list[tuple[str, bool, list | None]] = []  # (path, ok, boxes of an image)
+
+    if len(paths) == 1 and isVideoPath(paths[0]):
+        path, alerts = paths[0], options['alerts']
+        lastPercent, lastSent = -1, 0.0
+
+        def onProgress(frameIndex: int, frameCount: int) -> None:
+            # a line per percent is enough, not one queue message per frame. without a frame count (streams,
+            # broken metadata) one a second
+            nonlocal lastPercent, lastSent
+            if frameCount:
+                percent = frameIndex * 100 // frameCount
+                if percent == lastPercent:
+                    return
+                lastPercent = percent
+            elif time.monotonic() - lastSent < 1:
+                return
+            lastSent = time.monotonic()
+            _workerEvents.put(('progress', runId, path, frameIndex, frameCount))
+
+        try:
+            detectVideo(model, path, options['outputDir'], options['conf'], onProgress=onProgress,
+                        sampleInterval=options['sampleInterval'], motionThreshold=options['motionThreshold'],
+                        prefilter=prefilter, annotate=options['annotate'], store=store,
+                        clipPadding=options['clipPadding'], decodeProcess=options['decodeProcess'],
+                        tracker=FireTracker(path, [QueueSink(runId)], alerts['window'], alerts['threshold'])
+                        if alerts else None)
+            done.append((path, True, None))
+        except Exception as e:
+            print(f'failed to detect {path}: {e}')
+            done.append((path, False, None))
+    else:
+        detectImages(model, paths, options['outputDir'], options['conf'], options['batchSize'],
+                     onResult=lambda path, result: done.append(
+                         (path, result is not None, resultToRecords(result) if result is not None else None)),
+                     prefilter=prefilter, tiler=tiler, annotate=options['annotate'], store=store)
+    store.flush() if store is not None else None  # one short transaction per task
+    return done, {'prefilter': prefilter.stats() if prefilter is not None else None,
+                  'tiling': tiler.stats() if tiler is not None else None}
+
+
+class DetectionScheduler:
+    """
+    runs detection over a list of sources on a pool of worker processes that outlives the single run.
+    the workers keep torch imported and their model loaded, so the next run (the next click of detect) starts
+    right away. the pool is only started again when the model, device, backend or number of workers changes.
+    whoever detects over and over (the window, the cli) owns one scheduler and close()s it at the end.
+    """
+
+    def __init__(self):
+        self.pool = None
+        self.poolKey = None
+        self.events = None  # alerts / progress / task ends of the workers, lives as long as the pool
+        self._runIds = itertools.count()  # events of an earlier, aborted run are told apart by it
+        self._lock = threading.Lock()  # one run at a time
+
+    def _ensurePool(self, modelPath: str, device: str, backend: str, workers: int, threads: int):
+        key = (pa(os.path.abspath(modelPath)), device, backend, workers, threads)
+        if self.pool is not None and self.poolKey == key:
+            return self.pool
+        self.close()
+        # spawn instead of fork: forking a process that already holds torch / Qt state is not safe
+        context = multiprocessing.get_context('spawn')
+        self.events = context.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_initWorker,
+                                        initargs=(modelPath, device, backend, threads, self.events))
+        self.poolKey = key
+        print(f'started {workers} detection processes x {threads} threads')
+        return self.pool
+
+    def close(self) -> None:
+        """stop the worker processes, a task still running is finished first"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = None
+        self.poolKey = None
+        self.events = None
+
+    def run(self, paths: list[str], modelPath: str, options: dict, workers: int = 0, device: str = 'cpu',
+            backend: str = 'pytorch', onFinished=None, onRecords=None, onProgress=None, onAlert=None) -> dict:
+        """
+        detect every path, options are the per run values every task gets (outputDir, conf, batchSize, ...,
+        see engine._detectSources). onFinished(path, ok) is called in this process as soon as a file is done,
+        onRecords(path, boxes) right before it for every detected image. onProgress(path, frameIndex, frameCount)
+        whenever the percentage of a video changes and onAlert(event) for the fire start / end events of the
+        videos, both in this process and before the onFinished of their file.
+        returns the prefilter / tiling counts summed over all workers, {'prefilter': ..., 'tiling': ...},
+        None for a stage that is off.
+        """
+        tasks = makeTasks(paths, options['batchSize'])
+        prefilterStats = {} if options['prefilter'] is not None else None
+        tilingStats = {} if options['tiler'] is not None else None
+        if not tasks:
+            return {'prefilter': prefilterStats, 'tiling': tilingStats}
+        # sized without the task count: a shorter list submits fewer tasks to the same pool instead of a new one
+        workers, threads = planWorkers(workers, None, device)
+        print(f'detect {len(paths)} sources on {min(workers, len(tasks))} processes x {threads} threads')
+        modelRegistry.resolve(modelPath, backend)  # export once here, not once per worker
+
+        with self._lock:
+            pool = self._ensurePool(modelPath, device, backend, workers, threads)
+            runId = next(self._runIds)
+            futures = {pool.submit(_runTask, runId, taskId, task, options): (taskId, task)
+                       for taskId, task in enumerate(tasks)}
+            results: dict[int, tuple] = {}  # done tasks, held back until their last event arrived
+            ended: set[int] = set()
+            broken = False
+            while futures or results:
+                self._dispatchEvents(runId, ended, onProgress, onAlert)
+                for future in [future for future in futures if future.done()]:
+                    taskId, task = futures.pop(future)
+                    try:
+                        results[taskId] = future.result()
+                    except Exception as e:  # the worker died, every file of the task failed
+                        print(f'detect task failed: {e}')
+                        broken = broken or isinstance(e, BrokenProcessPool)
+                        results[taskId] = [(path, False, None) for path in task], None
+                        ended.add(taskId)  # a dead worker sends no end
+                for taskId in [taskId for taskId in results if taskId in ended]:
+                    done, stats = results.pop(taskId)
+                    if stats and stats['prefilter']:
+                        mergeStats(prefilterStats, stats['prefilter'])
+                    if stats and stats['tiling']:
+                        for key, value in stats['tiling'].items():
+                            tilingStats[key] = tilingStats.get(key, 0) + value
+                    for path, ok, records in done:
+                        onRecords(path, records) if onRecords and records is not None else None
+                        onFinished(path, ok) if onFinished else None
+            if broken:  # started again on the next run
+                self.close()
+
+        if prefilterStats is not None:
+            print(f'prefilter: {prefilterStats}')
+        if tilingStats is not None:
+            print(f'tiling: {tilingStats}')
+        return {'prefilter': prefilterStats, 'tiling': tilingStats}
+
+    def _dispatchEvents(self, runId: int, ended: set[int], onProgress, onAlert) -> None:
+        # waits a moment for the first event, then takes whatever else is there
+        try:
+            event = self.events.get(timeout=0.05)
+            while True:
+                kind, eventRunId, *values = event
+                if eventRunId == runId:
+                    if kind == 'end':
+                        ended.add(values[0])
+                    elif kind == 'progress':
+                        onProgress(*values) if onProgress else None
+                    elif kind == 'alert':
+                        onAlert(values[0]) if onAlert else None
+                event = self.events.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :settings.py
+
+"""
+config file and path helpers. this module is imported by every entry point before anything heavy,
+so it may only use the standard library.
+"""
+
+import os
+import sys
+import json
+from typing import Dict, Any
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.bmp', '.png')
+VIDEO_SUFFIXES = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.mpeg')
+MODEL_SUFFIXES = ('.pt', '.onnx', '.xml')  # pytorch weights, onnx, openvino IR
+BACKENDS = ('pytorch', 'onnx', 'openvino')  # how a .pt model is run, onnx / openvino are exported once and cached
+VIDEO_OUTPUTS = ('full', 'clips')  # the whole annotated video, or only padded clips around the detections
+SCAN_EXCLUDE = ('.*', '@eaDir', '#recycle', '$RECYCLE.BIN')  # hidden files, nas thumbnails and recycle bins
+
+
+def pa(path: str) -> str:
+    return path.replace('\\', '/')
+
+
+def isVideoPath(path: str) -> bool:
+    return path.lower().endswith(VIDEO_SUFFIXES)
+
+
+def isImagePath(path: str) -> bool:
+    return path.lower().endswith(IMAGE_SUFFIXES)
+
+
+def outputFilePath(outputDir: str, sourcePath: str) -> str:
+    """where the annotated copy of sourcePath is written, videos are always re-encoded to .avi"""
+    fileName = pa(sourcePath).split('/')[-1]
+    if isVideoPath(fileName):
+        fileName = os.path.splitext(fileName)[0] + '.avi'
+    return pa(os.path.join(outputDir, fileName))
+
+
+def clipFilePath(outputDir: str, sourcePath: str, index: int) -> str:
+    """event clip number index (from 1) of a video in clip output mode"""
+    stem = os.path.splitext(pa(sourcePath).split('/')[-1])[0]
+    return pa(os.path.join(outputDir, f'{stem}.event{index:03d}.avi'))
+
+
+def eventsFilePath(outputDir: str, sourcePath: str) -> str:
+    stem = os.path.splitext(pa(sourcePath).split('/')[-1])[0]
+    return pa(os.path.join(outputDir, f'{stem}.events.json'))
+
+
+class Settings:
+    """
+    the config file without any gui, shared by the window and the headless runner.
+    invalid values are replaced by defaults and reported through warn().
+    """
+
+    def __init__(self, configFilePath: str = 'config/config.json'):
+        """
+        initialize and read the config file
+        """
+
+        self.configFilePath = pa(configFilePath)
+        self.configFileFolder = os.path.dirname(self.configFilePath) or '.'
+
+        self.sourcePathList = []
+        # outputPath 是在系统中的绝对路径
+        self.outputPath = pa(os.path.join(os.getcwd(), 'output'))
+        self.alertAfterComplete = True
+        self.resultCache = True  # restore unchanged sources from <outputPath>/.cache instead of detecting them again
+        self.cacheSizeMB = 2048
+        self.detectionStore = True  # every box into <outputPath>/detections.sqlite, see store.py
+        self.saveAnnotated = True  # write the annotated images / videos into <outputPath>/predict
+        self.videoOutput = 'full'  # full: the whole annotated video, clips: only the events, see clips.py
+        self.clipPadding = 2.0  # seconds kept before and after an event
+        self.alertSinks = ['log']  # where fire start / end events go: log, file:<path> or a webhook url, see alerts.py
+        self.alertWindow = 15  # inferred frames a fire is followed over, for its hit ratio and mean confidence
+        # a fire seen in >= 40% of the window starts an event once its mean confidence over the frames it was
+        # seen in reaches alertThreshold, the event ends when it is seen in < 20% or that mean falls below half
+        self.alertThreshold = 0.5
+        self.scanInclude = []  # globs a file found in an added directory must match, empty = every image / video
+        self.scanExclude = list(SCAN_EXCLUDE)  # files and directories skipped, see scanner.py
+        self.scanSniff = True  # check the first bytes of every found file, not only its suffix
+        self.watchSettle = 1.0  # seconds a watched file must stay unchanged before it is detected, see watch.py
+        self.watchPollInterval = 2.0  # seconds between two looks at a watched folder without inotify
+        self.watchPolling = False  # poll even where inotify works, e.g. a share written to by other machines
+
+        self.ModelPath = pa(os.path.join(os.getcwd(), 'model/best.pt'))
+        self.confidence = 0.5
+        self.batchSize = 8  # images sent to the model in one forward pass
+        self.workers = 0  # detection processes, 0 = decide from the number of cores
+        self.backend = 'pytorch'
+        self.sampleInterval = 1  # run the model on every n-th video frame, 1 = every frame
+        self.motionThreshold = 0.0  # share of changed pixels that triggers the model between samples, 0 = off
+        self.prefilter = False  # colour / flicker test in front of the model, see prefilter.py
+        self.prefilterColor = 0.0005  # share of fire coloured pixels a frame needs to reach the model
+        self.prefilterFlicker = 0.0  # mean brightness change of those pixels between video frames, 0 = off
+        self.tiling = False  # detect large images in full resolution tiles, see tiling.py
+        self.tileSize = 640
+        self.tileOverlap = 0.2  # share of a tile shared with its neighbour
+        self.tileColor = 0.003  # share of fire coloured pixels a tile no coarse box touched needs to be run
+        self.quantRecallTolerance = 0.02  # fire recall an INT8 model may lose against FP32 and still be published
+        self.decodeProcess = False  # decode videos in a child process, frames shared through framering.FrameRing
+
+        # check if the config file and folder exist
+        if not os.path.exists(self.configFilePath):
+            self.createDefaultConfig()
+        else:
+            self.readConfigFile()
+
+    def warn(self, message: str) -> None:
+        print(f'Warning: {message}', file=sys.stderr)
+
+    def modelPathChanged(self, oldModelPath: str) -> None:
+        pass
+
+    def _modelPathValidator(self, modelPath: str) -> str:
+        if os.path.exists(modelPath):
+            if modelPath.endswith(MODEL_SUFFIXES):
+                return modelPath
+            else:
+                self.warn('The model should be a .pt, .onnx or openvino .xml file')
+                return "model/yolo8n.pt"
+        else:
+            self.warn('The model path is not valid!')
+            return "model/yolo8n.pt"
+
+    def _outputPathValidator(self, outputPath: str) -> str:
+        if os.path.exists(outputPath):
+            return outputPath
+        else:
+            self.warn('The output path is not valid\n auto create it now')
+            try:
+                os.makedirs(outputPath)
+            except OSError:  # e.g. a drive of another machine in a shared config
+                outputPath = pa(os.path.join(os.getcwd(), 'output'))
+                self.warn(f'The output path can not be created, use {outputPath} now')
+                os.makedirs(outputPath, exist_ok=True)
+            return outputPath
+
+    def cacheSizeValidator(self, cacheSizeMB) -> int:
+        try:
+            cacheSizeMB = int(cacheSizeMB)
+            if cacheSizeMB >= 0:
+                return cacheSizeMB
+            else:
+                self.warn('The cache size should be 0 or more MB, set cacheSizeMB = 2048 now')
+                return 2048
+        except (TypeError, ValueError):
+            self.warn('The cache size should be an integer (MB), set cacheSizeMB = 2048 now')
+            return 2048
+
+    def videoOutputValidator(self, videoOutput) -> str:
+        if videoOutput in VIDEO_OUTPUTS:
+            return videoOutput
+        else:
+            self.warn(f'The video output should be one of {", ".join(VIDEO_OUTPUTS)}, set videoOutput = full now')
+            return 'full'
+
+    def clipPaddingValidator(self, clipPadding) -> float:
+        try:
+            clipPadding = float(clipPadding)
+            if clipPadding >= 0:
+                return clipPadding
+            else:
+                self.warn('The clip padding should be 0 or more seconds, set clipPadding = 2 now')
+                return 2.0
+        except (TypeError, ValueError):
+            self.warn('The clip padding should be a number (seconds), set clipPadding = 2 now')
+            return 2.0
+
+    def alertSinksValidator(self, alertSinks) -> list[str]:
+        if isinstance(alertSinks, str):
+            alertSinks = [alertSinks]
+        if isinstance(alertSinks, list) and all(isinstance(sink, str) for sink in alertSinks):
+            return alertSinks
+        else:
+            self.warn('The alert sinks should be a list of strings, set alertSinks = ["log"] now')
+            return ['log']
+
+    def globListValidator(self, patterns, name: str, default: list[str]) -> list[str]:
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if isinstance(patterns, list) and all(isinstance(pattern, str) for pattern in patterns):
+            return patterns
+        else:
+            self.warn(f'The {name} should be a list of glob patterns, set {name} = {json.dumps(default)} now')
+            return list(default)
+
+    def secondsValidator(self, seconds, name: str, default: float) -> float:
+        try:
+            seconds = float(seconds)
+            if seconds >= 0:
+                return seconds
+            else:
+                self.warn(f'The {name} should be 0 or more seconds, set {name} = {default} now')
+                return default
+        except (TypeError, ValueError):
+            self.warn(f'The {name} should be a number (seconds), set {name} = {default} now')
+            return default
+
+    def alertWindowValidator(self, alertWindow) -> int:
+        try:
+            alertWindow = int(alertWindow)
+            if alertWindow >= 1:
+                return alertWindow
+            else:
+                self.warn('The alert window should be at least 1 frame, set alertWindow = 15 now')
+                return 15
+        except (TypeError, ValueError):
+            self.warn('The alert window should be an integer, set alertWindow = 15 now')
+            return 15
+
+    def alertThresholdValidator(self, alertThreshold) -> float:
+        try:
+            alertThreshold = float(alertThreshold)
+            if 0 < alertThreshold <= 1:
+                return alertThreshold
+            else:
+                self.warn('The alert threshold should be a number between 0 and 1, set alertThreshold = 0.5 now')
+                return 0.5
+        except (TypeError, ValueError):
+            self.warn('The alert threshold should be a number, set alertThreshold = 0.5 now')
+            return 0.5
+
+    def confidenceValidator(self, confidence: str) -> float:
+        try:
+            confidence = float(confidence)
+            if 0 < confidence <= 1:
+                return confidence
+            else:
+                self.warn('The confidence should be a number between 0 and 1, set confidence = 0.5 now')
+                return 0.5
+        except (TypeError, ValueError):
+            self.warn('The confidence should be a number, set confidence = 0.5 now')
+            return 0.5
+
+    def batchSizeValidator(self, batchSize) -> int:
+        try:
+            batchSize = int(batchSize)
+            if batchSize >= 1:
+                return batchSize
+            else:
+                self.warn('The batch size should be at least 1, set batchSize = 8 now')
+                return 8
+        except (TypeError, ValueError):
+            self.warn('The batch size should be an integer, set batchSize = 8 now')
+            return 8
+
+    def workersValidator(self, workers) -> int:
+        try:
+            workers = int(workers)
+            if workers >= 0:
+                return workers
+            else:
+                self.warn('The workers should be 0 (auto) or more, set workers = 0 now')
+                return 0
+        except (TypeError, ValueError):
+            self.warn('The workers should be an integer, set workers = 0 now')
+            return 0
+
+    def backendValidator(self, backend) -> str:
+        if backend in BACKENDS:
+            return backend
+        else:
+            self.warn(f'The backend should be one of {", ".join(BACKENDS)}, set backend = pytorch now')
+            return 'pytorch'
+
+    def sampleIntervalValidator(self, sampleInterval) -> int:
+        try:
+            sampleInterval = int(sampleInterval)
+            if sampleInterval >= 1:
+                return sampleInterval
+            else:
+                self.warn('The sample interval should be at least 1, set sampleInterval = 1 now')
+                return 1
+        except (TypeError, ValueError):
+            self.warn('The sample interval should be an integer, set sampleInterval = 1 now')
+            return 1
+
+    def motionThresholdValidator(self, motionThreshold) -> float:
+        try:
+            motionThreshold = float(motionThreshold)
+            if 0 <= motionThreshold <= 1:
+                return motionThreshold
+            else:
+                self.warn('The motion threshold should be between 0 and 1, set motionThreshold = 0 now')
+                return 0.0
+        except (TypeError, ValueError):
+            self.warn('The motion threshold should be a number, set motionThreshold = 0 now')
+            return 0.0
+
+    def prefilterThresholdValidator(self, threshold, default: float) -> float:
+        try:
+            threshold = float(threshold)
+            if 0 <= threshold <= 1:
+                return threshold
+            else:
+                self.warn(f'The prefilter threshold should be between 0 and 1, set it to {default} now')
+                return default
+        except (TypeError, ValueError):
+            self.warn(f'The prefilter threshold should be a number, set it to {default} now')
+            return default
+
+    def tileSizeValidator(self, tileSize) -> int:
+        try:
+            tileSize = int(tileSize)
+            if tileSize >= 32:
+                return tileSize
+            else:
+                self.warn('The tile size should be at least 32, set tileSize = 640 now')
+                return 640
+        except (TypeError, ValueError):
+            self.warn('The tile size should be an integer, set tileSize = 640 now')
+            return 640
+
+    def tileOverlapValidator(self, tileOverlap) -> float:
+        try:
+            tileOverlap = float(tileOverlap)
+            if 0 <= tileOverlap < 1:
+                return tileOverlap
+            else:
+                self.warn('The tile overlap should be between 0 and 1, set tileOverlap = 0.2 now')
+                return 0.2
+        except (TypeError, ValueError):
+            self.warn('The tile overlap should be a number, set tileOverlap = 0.2 now')
+            return 0.2
+
+    def quantRecallToleranceValidator(self, tolerance) -> float:
+        try:
+            tolerance = float(tolerance)
+            if 0 <= tolerance <= 1:
+                return tolerance
+            else:
+                self.warn('The quantization recall tolerance should be between 0 and 1, set quantRecallTolerance = 0.02 now')
+                return 0.02
+        except (TypeError, ValueError):
+            self.warn('The quantization recall tolerance should be a number, set quantRecallTolerance = 0.02 now')
+            return 0.02
+
+    def readConfigFile(self) -> None:
+        """read config file (json)
+        and give out data"""
+        with open(self.configFilePath) as f:
+            config = json.load(f)
+
+            # common settings
+            self.outputPath = self._outputPathValidator(config['common']['OutputPath']) if config['common']['OutputPath'] != "" else self.outputPath
+            self.alertAfterComplete = config['common']['alertAfterComplete']
+            self.resultCache = bool(config['common'].get('resultCache', self.resultCache))
+            self.cacheSizeMB = self.cacheSizeValidator(config['common']['cacheSizeMB']) if config['common'].get('cacheSizeMB', "") != "" else self.cacheSizeMB
+            self.detectionStore = bool(config['common'].get('detectionStore', self.detectionStore))
+            self.saveAnnotated = bool(config['common'].get('saveAnnotated', self.saveAnnotated))
+            self.videoOutput = self.videoOutputValidator(config['common']['videoOutput']) if config['common'].get('videoOutput', "") != "" else self.videoOutput
+            self.clipPadding = self.clipPaddingValidator(config['common']['clipPadding']) if config['common'].get('clipPadding', "") != "" else self.clipPadding
+            self.alertSinks = self.alertSinksValidator(config['common']['alertSinks']) if config['common'].get('alertSinks', "") != "" else self.alertSinks
+            self.alertWindow = self.alertWindowValidator(config['common']['alertWindow']) if config['common'].get('alertWindow', "") != "" else self.alertWindow
+            self.alertThreshold = self.alertThresholdValidator(config['common']['alertThreshold']) if config['common'].get('alertThreshold', "") != "" else self.alertThreshold
+            self.scanInclude = self.globListValidator(config['common']['scanInclude'], 'scanInclude', []) if config['common'].get('scanInclude', "") != "" else self.scanInclude
+            self.scanExclude = self.globListValidator(config['common']['scanExclude'], 'scanExclude', self.scanExclude) if config['common'].get('scanExclude', "") != "" else self.scanExclude
+            self.scanSniff = bool(config['common'].get('scanSniff', self.scanSniff))
+            self.watchSettle = self.secondsValidator(config['common']['watchSettle'], 'watchSettle', 1.0) if config['common'].get('watchSettle', "") != "" else self.watchSettle
+            self.watchPollInterval = self.secondsValidator(config['common']['watchPollInterval'], 'watchPollInterval', 2.0) if config['common'].get('watchPollInterval', "") != "" else self.watchPollInterval
+            self.watchPolling = bool(config['common'].get('watchPolling', self.watchPolling))
+
+            # model settings
+            self.ModelPath = self._modelPathValidator(config['Model']['ModelPath']) if config['Model']['ModelPath'] != "" else self.ModelPath
+            self.confidence = self.confidenceValidator(config['Model']['confidence']) if config['Model']['confidence'] != "" else self.confidence
+            self.batchSize = self.batchSizeValidator(config['Model']['batchSize']) if config['Model'].get('batchSize', "") != "" else self.batchSize
+            self.workers = self.workersValidator(config['Model']['workers']) if config['Model'].get('workers', "") != "" else self.workers
+            self.backend = self.backendValidator(config['Model']['backend']) if config['Model'].get('backend', "") != "" else self.backend
+            self.sampleInterval = self.sampleIntervalValidator(config['Model']['sampleInterval']) if config['Model'].get('sampleInterval', "") != "" else self.sampleInterval
+            self.motionThreshold = self.motionThresholdValidator(config['Model']['motionThreshold']) if config['Model'].get('motionThreshold', "") != "" else self.motionThreshold
+            self.prefilter = bool(config['Model'].get('prefilter', self.prefilter))
+            self.prefilterColor = self.prefilterThresholdValidator(config['Model']['prefilterColor'], 0.0005) if config['Model'].get('prefilterColor', "") != "" else self.prefilterColor
+            self.prefilterFlicker = self.prefilterThresholdValidator(config['Model']['prefilterFlicker'], 0.0) if config['Model'].get('prefilterFlicker', "") != "" else self.prefilterFlicker
+            self.tiling = bool(config['Model'].get('tiling', self.tiling))
+            self.tileSize = self.tileSizeValidator(config['Model']['tileSize']) if config['Model'].get('tileSize', "") != "" else self.tileSize
+            self.tileOverlap = self.tileOverlapValidator(config['Model']['tileOverlap']) if config['Model'].get('tileOverlap', "") != "" else self.tileOverlap
+            self.tileColor = self.prefilterThresholdValidator(config['Model']['tileColor'], 0.003) if config['Model'].get('tileColor', "") != "" else self.tileColor
+            self.quantRecallTolerance = self.quantRecallToleranceValidator(config['Model']['quantRecallTolerance']) if config['Model'].get('quantRecallTolerance', "") != "" else self.quantRecallTolerance
+            self.decodeProcess = bool(config['Model'].get('decodeProcess', self.decodeProcess))
+
+        # Done: analyse the data: for example: does the ckpt exist?
+
+    def updateConfigFile(self, **kwargs) -> None:
+        # validation and update first
+        self.outputPath = self._outputPathValidator(kwargs.get('OutputPath', self.outputPath))
+        self.alertAfterComplete = kwargs.get('alertAfterComplete', self.alertAfterComplete)
+        self.resultCache = bool(kwargs.get('resultCache', self.resultCache))
+        self.cacheSizeMB = self.cacheSizeValidator(kwargs.get('cacheSizeMB', self.cacheSizeMB))
+        self.detectionStore = bool(kwargs.get('detectionStore', self.detectionStore))
+        self.saveAnnotated = bool(kwargs.get('saveAnnotated', self.saveAnnotated))
+        self.videoOutput = self.videoOutputValidator(kwargs.get('videoOutput', self.videoOutput))
+        self.clipPadding = self.clipPaddingValidator(kwargs.get('clipPadding', self.clipPadding))
+        self.alertSinks = self.alertSinksValidator(kwargs.get('alertSinks', self.alertSinks))
+        self.alertWindow = self.alertWindowValidator(kwargs.get('alertWindow', self.alertWindow))
+        self.alertThreshold = self.alertThresholdValidator(kwargs.get('alertThreshold', self.alertThreshold))
+        self.scanInclude = self.globListValidator(kwargs.get('scanInclude', self.scanInclude), 'scanInclude', [])
+        self.scanExclude = self.globListValidator(kwargs.get('scanExclude', self.scanExclude), 'scanExclude',
+                                                  list(SCAN_EXCLUDE))
+        self.scanSniff = bool(kwargs.get('scanSniff', self.scanSniff))
+        self.watchSettle = self.secondsValidator(kwargs.get('watchSettle', self.watchSettle), 'watchSettle', 1.0)
+        self.watchPollInterval = self.secondsValidator(kwargs.get('watchPollInterval', self.watchPollInterval), 'watchPollInterval', 2.0)
+        self.watchPolling = bool(kwargs.get('watchPolling', self.watchPolling))
+        self.confidence = self.confidenceValidator(kwargs.get('confidence', self.confidence))
+        self.batchSize = self.batchSizeValidator(kwargs.get('batchSize', self.batchSize))
+        self.workers = self.workersValidator(kwargs.get('workers', self.workers))
+        self.backend = self.backendValidator(kwargs.get('backend', self.backend))
+        self.sampleInterval = self.sampleIntervalValidator(kwargs.get('sampleInterval', self.sampleInterval))
+        self.motionThreshold = self.motionThresholdValidator(kwargs.get('motionThreshold', self.motionThreshold))
+        self.prefilter = bool(kwargs.get('prefilter', self.prefilter))
+        self.prefilterColor = self.prefilterThresholdValidator(kwargs.get('prefilterColor', self.prefilterColor), 0.0005)
+        self.prefilterFlicker = self.prefilterThresholdValidator(kwargs.get('prefilterFlicker', self.prefilterFlicker), 0.0)
+        self.tiling = bool(kwargs.get('tiling', self.tiling))
+        self.tileSize = self.tileSizeValidator(kwargs.get('tileSize', self.tileSize))
+        self.tileOverlap = self.tileOverlapValidator(kwargs.get('tileOverlap', self.tileOverlap))
+        self.tileColor = self.prefilterThresholdValidator(kwargs.get('tileColor', self.tileColor), 0.003)
+        self.quantRecallTolerance = self.quantRecallToleranceValidator(kwargs.get('quantRecallTolerance', self.quantRecallTolerance))
+        self.decodeProcess = bool(kwargs.get('decodeProcess', self.decodeProcess))
+        oldModelPath = self.ModelPath
+        self.ModelPath = self._modelPathValidator(kwargs.get('ModelPath', self.ModelPath))
+        if self.ModelPath != oldModelPath:
+            self.modelPathChanged(oldModelPath)  # the cached model is only dropped when the path really changes
+
+        with open(self.configFilePath, 'w') as f:
+            config = {
+                "common": {
+                    "OutputPath": self.outputPath,
+                    "alertAfterComplete": self.alertAfterComplete,
+                    "resultCache": self.resultCache,
+                    "cacheSizeMB": self.cacheSizeMB,
+                    "detectionStore": self.detectionStore,
+                    "saveAnnotated": self.saveAnnotated,
+                    "videoOutput": self.videoOutput,
+                    "clipPadding": self.clipPadding,
+                    "alertSinks": self.alertSinks,
+                    "alertWindow": self.alertWindow,
+                    "alertThreshold": self.alertThreshold,
+                    "scanInclude": self.scanInclude,
+                    "scanExclude": self.scanExclude,
+                    "scanSniff": self.scanSniff,
+                    "watchSettle": self.watchSettle,
+                    "watchPollInterval": self.watchPollInterval,
+                    "watchPolling": self.watchPolling
+                },
+                "Model": {
+                    "ModelPath": self.ModelPath,
+                    "confidence": self.confidence,
+                    "batchSize": self.batchSize,
+                    "workers": self.workers,
+                    "backend": self.backend,
+                    "sampleInterval": self.sampleInterval,
+                    "motionThreshold": self.motionThreshold,
+                    "prefilter": self.prefilter,
+                    "prefilterColor": self.prefilterColor,
+                    "prefilterFlicker": self.prefilterFlicker,
+                    "tiling": self.tiling,
+                    "tileSize": self.tileSize,
+                    "tileOverlap": self.tileOverlap,
+                    "tileColor": self.tileColor,
+                    "quantRecallTolerance": self.quantRecallTolerance,
+                    "decodeProcess": self.decodeProcess
+                }
+            }
+            json.dump(config, f, indent=4)
+
+        # self.readConfigFile()  # update information in the class' attributes  # no need now
+
+    def createDefaultConfig(self) -> None:
+        """Create the folder 'config' and put default config file in it."""
+        if not os.path.exists(self.configFileFolder):
+            os.mkdir(self.configFileFolder)
+
+        new_config: Dict[str, Dict[str, Any]] = {
+            "common": {
+                "OutputPath": "",
+                "alertAfterComplete": True,
+                "resultCache": True,
+                "cacheSizeMB": "",
+                "detectionStore": True,
+                "saveAnnotated": True,
+                "videoOutput": "",
+                "clipPadding": "",
+                "alertSinks": ["log"],
+                "alertWindow": "",
+                "alertThreshold": "",
+                "scanInclude": [],
+                "scanExclude": "",
+                "scanSniff": True,
+                "watchSettle": "",
+                "watchPollInterval": "",
+                "watchPolling": False
+            },
+            "Model": {
+                "ModelPath": "",
+                "confidence": "",
+                "batchSize": "",
+                "workers": "",
+                "backend": "",
+                "sampleInterval": "",
+                "motionThreshold": "",
+                "prefilter": False,
+                "prefilterColor": "",
+                "prefilterFlicker": "",
+                "tiling": False,
+                "tileSize": "",
+                "tileOverlap": "",
+                "tileColor": "",
+                "quantRecallTolerance": "",
+                "decodeProcess": False
+            }
+        }
+
+        with open(self.configFilePath, 'w') as f:
+            json.dump(new_config, f, indent=4)
+            print("Default config file created at", self.configFilePath)
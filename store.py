@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :store.py
+
+"""
+append-only sqlite store of every detection: source, frame, timestamp, class, confidence and box.
+
+    python store.py output/detections.sqlite --min-conf 0.7 [--class fire] [--frames]
+
+answers "which files and frames had fire above 0.7" from the index instead of running the model again.
+every detection of a source is one run, queries look at the latest run of every source unless told otherwise.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    model TEXT NOT NULL,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detections (
+    run TEXT NOT NULL,
+    frame INTEGER NOT NULL,
+    timestampMs REAL,
+    class TEXT NOT NULL,
+    conf REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL
+);
+CREATE INDEX IF NOT EXISTS runsPath ON runs (path, started);
+CREATE INDEX IF NOT EXISTS detectionsConf ON detections (conf, class);
+CREATE INDEX IF NOT EXISTS detectionsRun ON detections (run, frame);
+'''
+
+
+class DetectionStore:
+    """
+    rows are buffered and written batchSize at a time in one short transaction (wal mode), so the worker
+    processes of the scheduler can all append to the same file. run ids are uuids, no row has to be
+    written before the first flush.
+    """
+
+    def __init__(self, dbPath: str, model: str = '', batchSize: int = 1000):
+        self.dbPath = dbPath
+        self.model = model  # recorded with every run
+        self.batchSize = batchSize
+        self._runs: list[tuple] = []
+        self._rows: list[tuple] = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(dbPath)), exist_ok=True)
+        self.db = sqlite3.connect(dbPath, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def beginRun(self, path: str) -> str:
+        runId = uuid.uuid4().hex
+        self._runs.append((runId, path, self.model, time.time()))
+        return runId
+
+    def add(self, runId: str, frame: int, timestampMs: float | None, records: list[dict]) -> None:
+        for record in records:
+            self._rows.append((runId, frame, timestampMs, record['class'], record['conf'], *record['xyxy']))
+        if len(self._rows) >= self.batchSize:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._runs and not self._rows:
+            return
+        with self.db:  # one transaction
+            self.db.executemany('INSERT INTO runs VALUES (?, ?, ?, ?)', self._runs)
+            self.db.executemany('INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', self._rows)
+        self._runs.clear()
+        self._rows.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+    @staticmethod
+    def _where(minConf: float, className: str | None, path: str | None, latest: bool) -> tuple[str, list]:
+        sql = ' FROM detections d JOIN runs r ON r.id = d.run WHERE d.conf >= ?'
+        parameters: list = [minConf]
+        if className is not None:
+            sql += ' AND d.class = ?'
+            parameters.append(className)
+        if path is not None:
+            sql += ' AND r.path = ?'
+            parameters.append(path)
+        if latest:
+            sql += ' AND r.started = (SELECT MAX(started) FROM runs WHERE path = r.path)'
+        return sql, parameters
+
+    def query(self, minConf: float = 0.0, className: str | None = None, path: str | None = None,
+              latest: bool = True) -> list[dict]:
+        """every detection matching the filters, ordered by source and frame"""
+        where, parameters = self._where(minConf, className, path, latest)
+        sql = 'SELECT r.path, d.frame, d.timestampMs, d.class, d.conf, d.x1, d.y1, d.x2, d.y2' + where
+        return [{'path': row[0], 'frame': row[1], 'timestampMs': row[2], 'class': row[3], 'conf': row[4],
+                 'xyxy': list(row[5:9])} for row in self.db.execute(sql + ' ORDER BY r.path, d.frame', parameters)]
+
+    def sources(self, minConf: float = 0.0, className: str | None = None, latest: bool = True) -> list[dict]:
+        """per source: how many frames have a matching detection, the first of them and the highest confidence"""
+        where, parameters = self._where(minConf, className, None, latest)
+        sql = 'SELECT r.path, COUNT(DISTINCT d.frame), MIN(d.frame), MAX(d.conf)' + where + ' GROUP BY r.path'
+        return [{'path': row[0], 'frames': row[1], 'firstFrame': row[2], 'maxConf': row[3]}
+                for row in self.db.execute(sql + ' ORDER BY r.path', parameters)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='query the FireEye detection store')
+    parser.add_argument('database', nargs='?', default='output/detections.sqlite')
+    parser.add_argument('--min-conf', type=float, default=0.0)
+    parser.add_argument('--class', dest='className')
+    parser.add_argument('--all-runs', action='store_true', help='also look at older runs of a source')
+    parser.add_argument('--frames', action='store_true', help='print every detection instead of one line per source')
+    args = parser.parse_args()
+
+    store = DetectionStore(args.database)
+    started = time.perf_counter()
+    if args.frames:
+        rows = store.query(args.min_conf, args.className, latest=not args.all_runs)
+    else:
+        rows = store.sources(args.min_conf, args.className, latest=not args.all_runs)
+    elapsed = time.perf_counter() - started
+    for row in rows:
+        print(json.dumps(row))
+    print(f'{len(rows)} rows in {elapsed * 1000:.1f} ms')
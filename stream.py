@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :stream.py
+
+"""
+real-time detection on a live stream (webcam, rtsp / http, or a looping local video standing in for one).
+capture, inference and render run on three threads that only ever hand over their newest item,
+so a slow stage drops frames instead of building up latency.
+nothing in here may import Qt.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from engine import resultToRecords
+
+STREAM_PREFIXES = ('rtsp://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://', 'camera:', 'loop:')
+
+
+def isStreamPath(path: str) -> bool:
+    return path.lower().startswith(STREAM_PREFIXES)
+
+
+def parseStreamSource(path: str) -> tuple[int | str, bool]:
+    """
+    'camera:0' -> webcam 0, 'loop:/a/b.mp4' -> local file replayed forever at its own fps,
+    anything else is handed to opencv as an url. returns (capture source, is a looping file)
+    """
+    if path.startswith('camera:'):
+        return int(path[len('camera:'):] or 0), False
+    if path.startswith('loop:'):
+        return path[len('loop:'):], True
+    return path, False
+
+
+class LatestSlot:
+    """a one item mailbox, put() overwrites whatever the consumer has not picked up yet"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+
+    def put(self, item) -> None:
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, lastSeq: int, timeout: float = 0.5) -> tuple[int, object]:
+        """wait for an item newer than lastSeq, returns (seq, item) or (lastSeq, None) on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != lastSeq, timeout):
+                return lastSeq, None
+            return self._seq, self._item
+
+
+class StreamPipeline:
+    """
+    capture -> inference -> render, every stage on its own thread.
+
+    onFrame(annotated, stats) is called from the render thread for every rendered frame, stats holds the
+    end-to-end latency (capture to render) and the rendered fps. onStopped() is called once the capture ends,
+    error then holds why when it ended on a failure (a source that can not be opened or read).
+    with a tracker fire start / end alerts are raised as soon as the inference thread sees them.
+    model may be None with loadModel, a function returning it: it is called on the inference thread, so a
+    model loading for seconds never blocks the caller. a failing load ends the pipeline with error.
+    """
+
+    def __init__(self, source: str, model, conf: float, onFrame=None, onStopped=None, reconnectDelay: float = 2.0,
+                 tracker=None, loadModel=None):
+        self.source = source
+        self.tracker = tracker  # alerts.FireTracker, fed from the inference thread
+        self.model = model
+        self.loadModel = loadModel
+        self.conf = conf
+        self.onFrame = onFrame
+        self.onStopped = onStopped
+        self.reconnectDelay = reconnectDelay
+
+        self.frames = LatestSlot()  # (capture time, frame)
+        self.results = LatestSlot()  # (capture time, result)
+        self.running = threading.Event()
+        self.error: str | None = None
+        self._endLock = threading.Lock()
+        self.threads: list[threading.Thread] = []
+        self.startedAt = time.monotonic()
+
+        self.captured = 0
+        self.inferred = 0
+        self.rendered = 0
+        self._latencies: deque[float] = deque(maxlen=30)
+        self._renderTimes: deque[float] = deque(maxlen=30)
+
+    def start(self) -> None:
+        self.startedAt = time.monotonic()
+        self.running.set()
+        for target in (self._capture, self._infer, self._render):
+            thread = threading.Thread(target=target, name=f'Stream {target.__name__}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self) -> None:
+        self.running.clear()
+        for thread in self.threads:
+            if thread is threading.current_thread():
+                continue
+            if thread.name == f'Stream {self._infer.__name__}' and self.model is None:
+                continue  # still loading the model, once loaded it returns without touching the tracker
+            thread.join()
+        self.threads.clear()
+        if self.tracker is not None:
+            self.tracker.close(self.inferred, (time.monotonic() - self.startedAt) * 1000)
+
+    def isRunning(self) -> bool:
+        return self.running.is_set()
+
+    def stats(self) -> dict:
+        times = self._renderTimes
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        latency = sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+        return {
+            'latencyMs': round(latency * 1000, 1),
+            'fps': round(fps, 1),
+            'captured': self.captured,
+            'inferred': self.inferred,
+            'rendered': self.rendered,
+            'dropped': self.captured - self.inferred,
+        }
+
+    def _ended(self, error: str | None = None) -> None:
+        """the pipeline stopped on its own, onStopped() once. nothing to report after stop()"""
+        with self._endLock:
+            if not self.running.is_set():
+                return
+            self.error = error
+            self.running.clear()
+        print(f'stream {self.source} stopped: {error}') if error else None
+        self.onStopped() if self.onStopped else None
+
+    def _capture(self) -> None:
+        source, loop = parseStreamSource(self.source)
+        reconnects = isinstance(source, str) and source.startswith(('rtsp://', 'rtmp://', 'http://', 'https://'))
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened() and not reconnects:
+            cap.release()
+            self._ended(f'can not open {self.source}')
+            return
+        frameTime = 1 / (cap.get(cv2.CAP_PROP_FPS) or 30) if loop else 0
+        nextFrameAt = time.monotonic()
+        failures = 0  # reads in a row without a frame
+        error = None
+        try:
+            while self.running.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    failures += 1
+                    if loop:  # a file standing in for a stream starts over
+                        if failures > 1:  # not even a frame right after the rewind
+                            error = f'no readable frame in {source}'
+                            break
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    if reconnects:
+                        print(f'stream {self.source} lost, reconnecting')
+                        cap.release()
+                        time.sleep(self.reconnectDelay)
+                        cap = cv2.VideoCapture(source)
+                        continue
+                    break
+                failures = 0
+
+                if frameTime:  # a file is read at decode speed, pace it like a real camera
+                    nextFrameAt += frameTime
+                    delay = nextFrameAt - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        nextFrameAt = time.monotonic()
+
+                self.frames.put((time.monotonic(), frame))
+                self.captured += 1
+        finally:
+            cap.release()
+            self._ended(error)
+
+    def _infer(self) -> None:
+        if self.model is None:
+            try:
+                self.model = self.loadModel()
+            except Exception as e:
+                self._ended(f'can not load the model: {e}')
+                return
+        seq = 0
+        while self.running.is_set():
+            seq, item = self.frames.get(seq)
+            if item is None:
+                continue
+            capturedAt, frame = item
+            result = self.model.predict(source=frame, conf=self.conf, verbose=False)[0]
+            self.inferred += 1
+            if self.tracker is not None:
+                self.tracker.update(self.inferred, (capturedAt - self.startedAt) * 1000, resultToRecords(result))
+            self.results.put((capturedAt, result))
+
+    def _render(self) -> None:
+        seq = 0
+        while self.running.is_set():
+            seq, item = self.results.get(seq)
+            if item is None:
+                continue
+            capturedAt, result = item
+            annotated = result.plot()
+            now = time.monotonic()
+            self._latencies.append(now - capturedAt)
+            self._renderTimes.append(now)
+            self.rendered += 1
+            self.onFrame(annotated, self.stats()) if self.onFrame else None
+
+
+class MjpegServer:
+    """
+    local http stand-in for an ip camera: serves a video file as an endless multipart mjpeg stream,
+    opencv reads it like a real camera at http://127.0.0.1:<port>/
+    """
+
+    def __init__(self, videoPath: str, port: int = 8090, host: str = '127.0.0.1', quality: int = 80):
+        self.videoPath = videoPath
+        self.address = (host, port)
+        self.quality = quality
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.address[0]}:{self.address[1]}/'
+
+    def _makeHandler(self):
+        videoPath, quality = self.videoPath, self.quality
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.end_headers()
+                cap = cv2.VideoCapture(videoPath)
+                if not cap.isOpened():
+                    return
+                frameTime = 1 / (cap.get(cv2.CAP_PROP_FPS) or 30)
+                failures = 0
+                try:
+                    while True:
+                        ok, frame = cap.read()
+                        if not ok:
+                            failures += 1
+                            if failures > 1:  # not even a frame right after the rewind, end the response
+                                return
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                            continue
+                        failures = 0
+                        jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+                        self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n')
+                        self.wfile.write(f'Content-Length: {len(jpeg)}\r\n\r\n'.encode() + jpeg + b'\r\n')
+                        time.sleep(frameTime)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client went away
+                finally:
+                    cap.release()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        self.server = ThreadingHTTPServer(self.address, self._makeHandler())
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MjpegServer', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == '__main__':
+    # python stream.py video.mp4 [port]: serve a local video as a fake ip camera for testing
+    import sys
+
+    server = MjpegServer(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 8090)
+    server.start()
+    print(f'serving {os.path.basename(sys.argv[1])} at {server.url}, ctrl+c to stop')
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
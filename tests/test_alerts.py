@@ -0,0 +1,53 @@
+from alerts import FireTracker, CallbackSink
+
+BOX = [100.0, 100.0, 200.0, 200.0]
+
+
+def fire(conf: float, xyxy: list[float] = BOX) -> list[dict]:
+    return [{'class': 'fire', 'conf': conf, 'xyxy': xyxy}]
+
+
+def track(frames: list[list[dict]], **kwargs) -> list[dict]:
+    events = []
+    tracker = FireTracker('test.mp4', [CallbackSink(events.append)], **kwargs)
+    for index, records in enumerate(frames):
+        tracker.update(index, index * 40.0, records)
+    tracker.close(len(frames), len(frames) * 40.0)
+    return events
+
+
+def test_steady_fire_starts_and_ends_once():
+    events = track([fire(0.8)] * 30 + [[]] * 30)
+    assert [event['event'] for event in events] == ['fireStart', 'fireEnd']
+    assert events[0]['frame'] == 5  # seen in 6 of 15 frames
+    assert events[1]['frame'] < 60  # ended by the misses, not by close()
+
+
+def test_intermittent_detections_start_an_alert():
+    # a fire the model finds at 0.9 in every other frame averages 0.45 when misses count as 0
+    events = track([fire(0.9) if index % 2 == 0 else [] for index in range(40)])
+    assert [event['event'] for event in events] == ['fireStart', 'fireEnd']
+    assert events[0]['conf'] == 0.9
+    assert events[1]['frame'] == 40  # it never flapped, close() ended it
+
+
+def test_moderate_confidence_does_not_need_a_full_window():
+    frames = [fire(0.6) if index % 3 != 2 else [] for index in range(15)]
+    assert [event['event'] for event in track(frames)][:1] == ['fireStart']
+
+
+def test_single_frames_never_start_an_alert():
+    frames = [fire(0.95) if index % 10 == 0 else [] for index in range(60)]
+    assert track(frames) == []
+
+
+def test_low_confidence_never_starts_an_alert():
+    assert track([fire(0.3)] * 30) == []
+
+
+def test_separate_boxes_are_separate_tracks():
+    left, right = [0.0, 0.0, 50.0, 50.0], [500.0, 500.0, 560.0, 560.0]
+    events = track([fire(0.8, left) + fire(0.8, right)] * 20)
+    starts = [event for event in events if event['event'] == 'fireStart']
+    assert len(starts) == 2
+    assert starts[0]['track'] != starts[1]['track']
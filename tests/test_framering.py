@@ -0,0 +1,84 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+
+from framering import FrameRing, decodeVideo  # noqa: E402
+
+SHAPE = (4, 6, 3)
+
+
+def test_frames_go_round_the_ring():
+    ring = FrameRing(2, SHAPE)
+    try:
+        for index in range(5):  # more frames than slots, every slot is used again
+            slot = ring.acquire(timeout=1)
+            assert slot is not None
+            ring.view(slot)[...] = index
+            ring.publish(slot, {'frame': index})
+            received, meta = ring.receive(timeout=1)
+            assert received == slot
+            assert meta == {'frame': index}
+            assert (ring.view(received) == index).all()
+            ring.release(received)
+        ring.finish({'frames': 5})
+        assert ring.receive(timeout=1) == (None, {'frames': 5})
+    finally:
+        ring.close()
+
+
+def test_acquire_blocks_while_every_slot_is_in_use():
+    ring = FrameRing(2, SHAPE)
+    try:
+        first, second = ring.acquire(timeout=1), ring.acquire(timeout=1)
+        assert {first, second} == {0, 1}
+        assert ring.acquire(timeout=0.1) is None
+        ring.release(first)
+        assert ring.acquire(timeout=1) == first
+    finally:
+        ring.close()
+
+
+def test_close_with_a_live_view():
+    ring = FrameRing(2, SHAPE)
+    name = ring.memory.name
+    view = ring.view(ring.acquire(timeout=1))  # e.g. the last input the model kept
+    ring.close()  # must not raise
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    del view
+
+
+def test_decode_process_fills_the_ring(tmp_path):
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for index in range(10):
+        writer.write(np.full((48, 64, 3), index * 20, dtype=np.uint8))
+    writer.release()
+    expected = []
+    cap = cv2.VideoCapture(path)
+    while (read := cap.read())[0]:
+        expected.append(read[1])
+    cap.release()
+
+    context = multiprocessing.get_context('spawn')
+    ring = FrameRing(3, (48, 64, 3), context=context)  # fewer slots than frames, the child has to wait for us
+    process = context.Process(target=decodeVideo, args=(path, ring), daemon=True)
+    process.start()
+    try:
+        received = []
+        while (item := ring.receive(timeout=30))[0] is not None:
+            slot, meta = item
+            assert meta == {'frame': len(received)}
+            received.append(ring.view(slot).copy())
+            ring.release(slot)
+        assert item[1]['frames'] == len(expected) == 10
+        assert all((frame == want).all() for frame, want in zip(received, expected))
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    finally:
+        process.terminate() if process.is_alive() else None
+        ring.close()
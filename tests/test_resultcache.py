@@ -0,0 +1,113 @@
+import os
+
+from resultcache import ResultCache
+
+
+def write(path, data: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def read(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def cached(cache: ResultCache, tmp_path, name: str, data: bytes) -> str:
+    """detect-like: a source and its output, put under the key of the source"""
+    source = write(tmp_path / 'sources' / name, name.encode() + data)
+    key = cache.makeKey(source, 'model', 0.5)
+    cache.put(key, [write(tmp_path / 'predict' / name, data)], [{'class': 'fire'}], os.path.splitext(name)[0])
+    return key
+
+
+def test_restore_links_the_output_back(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cached(cache, tmp_path, 'a.jpg', b'annotated')
+    records, restored = cache.restore(key, str(tmp_path / 'again'))
+    assert records == [{'class': 'fire'}]
+    assert restored == [os.path.join(str(tmp_path / 'again'), 'a.jpg')]
+    assert read(restored[0]) == b'annotated'
+    assert os.stat(restored[0]).st_ino == os.stat(tmp_path / 'cache' / key / 'a.jpg').st_ino
+    assert cache.restore('unknown', str(tmp_path / 'again')) is None
+
+
+def test_same_content_under_another_name(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    first = write(tmp_path / 'src' / 'a.mp4', b'same')
+    second = write(tmp_path / 'src' / 'b.mp4', b'same')
+    key = cache.makeKey(first, 'model', 0.5)
+    assert cache.makeKey(second, 'model', 0.5) == key
+    outputs = [write(tmp_path / 'predict' / name, name.encode()) for name in ('a.avi', 'a.jsonl', 'a.event001.avi')]
+    cache.put(key, outputs, None, 'a')
+    records, restored = cache.restore(key, str(tmp_path / 'again'), 'b')
+    assert sorted(os.path.basename(path) for path in restored) == ['b.avi', 'b.event001.avi', 'b.jsonl']
+    assert read(tmp_path / 'again' / 'b.jsonl') == b'a.jsonl'
+    assert not os.path.exists(tmp_path / 'again' / 'a.avi')
+    assert cache.makeKey(write(tmp_path / 'src' / 'c.mov', b'same'), 'model', 0.5) != key
+
+
+def test_entry_without_a_stem_is_only_restored_under_its_names(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cache.makeKey(write(tmp_path / 'src' / 'a.jpg', b'same'), 'model', 0.5)
+    cache.put(key, [write(tmp_path / 'predict' / 'a.jpg', b'annotated')])
+    assert cache.restore(key, str(tmp_path / 'again'), 'b') is None
+    assert cache.restore(key, str(tmp_path / 'again'))[1] == [os.path.join(str(tmp_path / 'again'), 'a.jpg')]
+
+
+def test_key_follows_the_content(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    source = write(tmp_path / 'a.jpg', b'one')
+    key = cache.makeKey(source, 'model', 0.5)
+    assert cache.makeKey(source, 'model', 0.5) == key
+    assert cache.makeKey(source, 'model', 0.6) != key
+    assert cache.makeKey(source, 'other', 0.5) != key
+    write(tmp_path / 'a.jpg', b'two')
+    os.utime(source, ns=(1, 1))  # the hash is only refreshed when size or mtime changed
+    assert cache.makeKey(source, 'model', 0.5) != key
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), maxBytes=20)
+    first = cached(cache, tmp_path, 'a.jpg', b'x' * 8)
+    second = cached(cache, tmp_path, 'b.jpg', b'x' * 8)
+    cache.entries[first]['used'], cache.entries[second]['used'] = 2, 1
+    third = cached(cache, tmp_path, 'c.jpg', b'x' * 8)
+    assert set(cache.entries) == {first, third}
+    assert not os.path.exists(tmp_path / 'cache' / second)
+
+
+def test_output_larger_than_the_cache_is_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), maxBytes=4)
+    cached(cache, tmp_path, 'a.jpg', b'x' * 8)
+    assert len(cache) == 0
+
+
+def test_detach_removes_linked_outputs_only(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cached(cache, tmp_path, 'a.jpg', b'annotated')
+    linked = str(tmp_path / 'predict' / 'a.jpg')
+    plain = write(tmp_path / 'predict' / 'b.jpg', b'plain')
+    ResultCache.detach([linked, plain, str(tmp_path / 'missing.jpg')])
+    assert not os.path.exists(linked)
+    assert os.path.exists(plain)
+    assert read(tmp_path / 'cache' / key / 'a.jpg') == b'annotated'
+
+
+def test_entry_with_a_missing_file_is_dropped(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cached(cache, tmp_path, 'a.jpg', b'annotated')
+    os.remove(tmp_path / 'cache' / key / 'a.jpg')
+    assert cache.get(key) is None
+    assert len(cache) == 0
+
+
+def test_index_survives_a_restart(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cached(cache, tmp_path, 'a.jpg', b'annotated')
+    cache.save()
+    again = ResultCache(str(tmp_path / 'cache'))
+    assert again.get(key)['records'] == [{'class': 'fire'}]
+    assert again.makeKey(str(tmp_path / 'sources' / 'a.jpg'), 'model', 0.5) == key
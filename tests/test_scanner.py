@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from scanner import SourceScanner, matchesAny, sniffType
+
+JPEG = b'\xff\xd8\xff\xe0' + b'\0' * 60
+MP4 = b'\0\0\0\x18ftypmp42' + b'\0' * 60
+
+
+def write(path, data: bytes = JPEG) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def scan(roots, **kwargs) -> list[str]:
+    return [path for chunk in SourceScanner(**kwargs).scan([str(root) for root in roots]) for path in chunk]
+
+
+def names(paths: list[str]) -> list[str]:
+    return sorted(os.path.basename(path) for path in paths)
+
+
+def test_finds_images_and_videos_recursively(tmp_path):
+    write(tmp_path / 'a.jpg')
+    write(tmp_path / 'sub' / 'deeper' / 'b.mp4', MP4)
+    write(tmp_path / 'notes.txt', b'hello')
+    assert names(scan([tmp_path])) == ['a.jpg', 'b.mp4']
+
+
+def test_exclude_skips_files_and_whole_folders(tmp_path):
+    write(tmp_path / 'keep.jpg')
+    write(tmp_path / 'skip.jpg')
+    write(tmp_path / '@eaDir' / 'thumb.jpg')
+    write(tmp_path / '.hidden' / 'c.jpg')
+    write(tmp_path / 'cams' / 'old' / 'd.jpg')
+    paths = scan([tmp_path], exclude=['skip.jpg', '@eaDir', '.*', 'cams/old'])
+    assert names(paths) == ['keep.jpg']
+
+
+def test_include_patterns(tmp_path):
+    write(tmp_path / 'a.jpg')
+    write(tmp_path / 'b.png', b'\x89PNG\r\n\x1a\n' + b'\0' * 8)
+    assert names(scan([tmp_path], include=['*.png'])) == ['b.png']
+
+
+def test_hard_links_and_repeated_roots_are_listed_once(tmp_path):
+    original = write(tmp_path / 'a.jpg')
+    os.link(original, tmp_path / 'b.jpg')
+    scanner = SourceScanner()
+    paths = [path for chunk in scanner.scan([str(tmp_path), str(tmp_path)]) for path in chunk]
+    assert len(paths) == 1
+    assert scanner.stats()['duplicates'] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink') or os.name == 'nt', reason='needs symlinks')
+def test_symlink_loops_terminate(tmp_path):
+    write(tmp_path / 'sub' / 'a.jpg')
+    os.symlink(tmp_path, tmp_path / 'sub' / 'loop')
+    os.symlink(tmp_path / 'sub' / 'a.jpg', tmp_path / 'link.jpg')
+    os.symlink(tmp_path / 'missing.jpg', tmp_path / 'dangling.jpg')
+    assert len(scan([tmp_path])) == 1  # a.jpg and link.jpg are one file, listed under the name met first
+
+
+def test_sniff_rejects_mislabelled_files(tmp_path):
+    write(tmp_path / 'good.jpg')
+    write(tmp_path / 'error.jpg', b'<html>404</html>')
+    write(tmp_path / 'video.jpg', MP4)
+    scanner = SourceScanner()
+    paths = [path for chunk in scanner.scan([str(tmp_path)]) for path in chunk]
+    assert names(paths) == ['good.jpg']
+    assert scanner.stats()['rejected'] == 2
+    assert names(scan([tmp_path], sniff=False)) == ['error.jpg', 'good.jpg', 'video.jpg']
+
+
+def test_chunks(tmp_path):
+    for index in range(7):
+        write(tmp_path / f'{index}.jpg')
+    chunks = list(SourceScanner(chunkSize=3).scan([str(tmp_path)]))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+
+
+def test_sniff_type():
+    assert sniffType(__file__) is None
+
+
+def test_matches_any():
+    assert matchesAny('a/b/c.jpg', 'c.jpg', ['*.jpg'])
+    assert matchesAny('a/b', 'b', ['a/*'])
+    assert not matchesAny('x/b', 'b', ['a/*'])
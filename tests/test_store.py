@@ -0,0 +1,64 @@
+import itertools
+
+import pytest
+
+import store
+from store import DetectionStore
+
+
+class Clock:
+    """runs of the same source started one second apart, never at the same time"""
+
+    def __init__(self):
+        self.time = itertools.count(1).__next__
+
+
+def box(className: str, conf: float) -> dict:
+    return {'class': className, 'conf': conf, 'xyxy': [1.0, 2.0, 3.0, 4.0]}
+
+
+@pytest.fixture
+def detections(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'time', Clock())
+    db = DetectionStore(str(tmp_path / 'out' / 'detections.sqlite'), model='best.pt', batchSize=2)
+    old = db.beginRun('a.mp4')
+    db.add(old, 0, 0.0, [box('fire', 0.95)])
+    run = db.beginRun('a.mp4')  # detected again, only this run counts by default
+    db.add(run, 3, 120.0, [box('fire', 0.6), box('smoke', 0.9)])
+    db.add(run, 7, 280.0, [box('fire', 0.8)])
+    run = db.beginRun('b.jpg')
+    db.add(run, 0, None, [box('smoke', 0.4)])
+    db.beginRun('c.jpg')  # nothing found
+    db.flush()
+    yield db
+    db.close()
+
+
+def test_query_latest_runs(detections):
+    rows = detections.query(minConf=0.7)
+    assert [(row['path'], row['frame'], row['class']) for row in rows] == [('a.mp4', 3, 'smoke'), ('a.mp4', 7, 'fire')]
+    assert rows[1] == {'path': 'a.mp4', 'frame': 7, 'timestampMs': 280.0, 'class': 'fire', 'conf': 0.8,
+                       'xyxy': [1.0, 2.0, 3.0, 4.0]}
+
+
+def test_query_filters(detections):
+    assert [row['frame'] for row in detections.query(className='fire')] == [3, 7]
+    assert [row['path'] for row in detections.query(path='b.jpg')] == ['b.jpg']
+    assert [row['frame'] for row in detections.query(minConf=0.9, className='fire', latest=False)] == [0]
+
+
+def test_sources(detections):
+    assert detections.sources(className='fire') == [
+        {'path': 'a.mp4', 'frames': 2, 'firstFrame': 3, 'maxConf': 0.8}]
+    assert [source['path'] for source in detections.sources()] == ['a.mp4', 'b.jpg']
+    assert detections.sources(minConf=0.9, className='fire', latest=False)[0]['maxConf'] == 0.95
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    db = DetectionStore(str(tmp_path / 'detections.sqlite'), batchSize=2)
+    run = db.beginRun('a.jpg')
+    db.add(run, 0, None, [box('fire', 0.9)])
+    assert DetectionStore(db.dbPath).query() == []  # still buffered
+    db.add(run, 1, None, [box('fire', 0.9)])
+    assert len(DetectionStore(db.dbPath).query()) == 2
+    db.close()
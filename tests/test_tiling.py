@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from tiling import Tiler, mergeBoxes, tileGrid  # noqa: E402
+
+
+def test_grid_covers_the_image():
+    tiles = tileGrid(1500, 1000, 640, 0.2)
+    assert all(x1 - x0 == 640 and y1 - y0 == 640 for x0, y0, x1, y1 in tiles)
+    assert max(x1 for _, _, x1, _ in tiles) == 1500  # the last column is moved inside, not cut off
+    assert max(y1 for _, _, _, y1 in tiles) == 1000
+    covered = np.zeros((1000, 1500), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+
+
+def test_grid_overlap():
+    tiles = tileGrid(2000, 640, 640, 0.25)
+    starts = [x0 for x0, _, _, _ in tiles]
+    assert starts[:3] == [0, 480, 960]
+
+
+def test_small_image_is_one_tile():
+    assert tileGrid(500, 300, 640, 0.2) == [(0, 0, 500, 300)]
+
+
+def merge(boxes, scores, classes):
+    keep = mergeBoxes(np.array(boxes, dtype=float), np.array(scores, dtype=float), np.array(classes))
+    return sorted(keep.tolist())
+
+
+def test_merge_folds_a_partial_box_into_the_complete_one():
+    # a fire cut by a tile border: the partial box lies inside the complete one, their iou is only 0.25
+    assert merge([[0, 0, 100, 100], [0, 0, 25, 100]], [0.9, 0.8], [0, 0]) == [0]
+    assert merge([[0, 0, 100, 100], [0, 0, 25, 100]], [0.7, 0.8], [0, 0]) == [1]  # the higher score wins
+
+
+def test_merge_keeps_separate_boxes_and_other_classes():
+    assert merge([[0, 0, 100, 100], [200, 200, 300, 300]], [0.9, 0.8], [0, 0]) == [0, 1]
+    assert merge([[0, 0, 100, 100], [10, 10, 90, 90]], [0.9, 0.8], [0, 1]) == [0, 1]
+
+
+def test_select_tiles_by_coarse_boxes():
+    tiler = Tiler(tileSize=640, overlap=0.2)
+    frame = np.zeros((1280, 1280, 3), dtype=np.uint8)  # nothing fire coloured
+    assert tiler.selectTiles(frame, np.zeros((0, 4))) == []
+    selected = tiler.selectTiles(frame, np.array([[10.0, 10.0, 20.0, 20.0]]))
+    assert selected == [(0, 0, 640, 640)]
+    assert tiler.stats() == {'tiles': 2 * len(tileGrid(1280, 1280, 640, 0.2)), 'tilesRun': 1}
+    tiler.resetCounts()
+    assert tiler.stats() == {'tiles': 0, 'tilesRun': 0}
+
+
+def test_applies_to_large_images_only():
+    tiler = Tiler(tileSize=640)
+    assert tiler.applies(np.zeros((720, 1280, 3), dtype=np.uint8))
+    assert not tiler.applies(np.zeros((720, 1279, 3), dtype=np.uint8))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :tiling.py
+
+"""
+sliced inference for very large stills (drone / satellite, 6000x4000 and up).
+the model only sees 640 px, a whole 6000 px image scaled down to that loses the small early fires.
+the image is cut into overlapping tiles at full resolution instead, a coarse pass over the whole image picks
+the tiles worth running, the picked tiles go through the model in batches and the boxes are merged back.
+"""
+
+import numpy as np
+from typing import TYPE_CHECKING
+
+from prefilter import FirePrefilter
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+    from ultralytics.engine.results import Results
+
+
+def tileGrid(width: int, height: int, tileSize: int, overlap: float) -> list[tuple[int, int, int, int]]:
+    """(x0, y0, x1, y1) of overlapping tiles covering the image, the last row / column is moved inside"""
+    stride = max(1, int(tileSize * (1 - overlap)))
+
+    def starts(length: int) -> list[int]:
+        if length <= tileSize:
+            return [0]
+        positions = list(range(0, length - tileSize, stride))
+        return positions + [length - tileSize]
+
+    return [(x, y, min(x + tileSize, width), min(y + tileSize, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def mergeBoxes(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, threshold: float = 0.5) -> np.ndarray:
+    """
+    class aware greedy nms, returns the indices to keep.
+    overlap is measured as intersection over the smaller box: a fire cut by a tile border leaves a partial box
+    inside the big one, their iou is small but the partial box lies almost completely in the big one.
+    """
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        x0 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        y0 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        x1 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        y1 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+        overlap = intersection / np.maximum(np.minimum(areas[best], areas[rest]), 1e-6)
+        order = rest[(overlap < threshold) | (classes[rest] != classes[best])]
+    return np.array(keep, dtype=int)
+
+
+class Tiler:
+    """
+    tiled detection for images larger than minSize (longer side).
+
+    coarse pass: the whole image once at coarseConf, far below the real confidence. a tile is run when a coarse
+    box touches it or when its share of fire coloured pixels reaches colorThreshold (tiny fires the scaled down
+    image does not show at all). colorThreshold is far above the frame prefilter one, at that level nearly
+    every tile of a drone image with some orange roof or dry grass in it would be run. tiles of batchSize go
+    through the model together, the tile boxes and the confident coarse boxes (the large fires a tile only sees
+    a part of) are merged with mergeBoxes.
+    """
+
+    def __init__(self, tileSize: int = 640, overlap: float = 0.2, batchSize: int = 8, coarseConf: float = 0.05,
+                 colorThreshold: float = 0.003, minSize: int | None = None, mergeThreshold: float = 0.5):
+        self.tileSize = tileSize
+        self.overlap = overlap
+        self.batchSize = max(1, batchSize)
+        self.coarseConf = coarseConf
+        self.colorFilter = FirePrefilter(colorThreshold)
+        self.minSize = minSize or tileSize * 2
+        self.mergeThreshold = mergeThreshold
+
+        self.tiles = 0
+        self.tilesRun = 0
+
+    def applies(self, frame: np.ndarray) -> bool:
+        return max(frame.shape[:2]) >= self.minSize
+
+    def selectTiles(self, frame: np.ndarray, coarseBoxes: np.ndarray) -> list[tuple[int, int, int, int]]:
+        height, width = frame.shape[:2]
+        selected = []
+        for x0, y0, x1, y1 in tileGrid(width, height, self.tileSize, self.overlap):
+            touched = bool(len(coarseBoxes)) and bool(np.any(
+                (coarseBoxes[:, 0] < x1) & (coarseBoxes[:, 2] > x0) & (coarseBoxes[:, 1] < y1) & (coarseBoxes[:, 3] > y0)))
+            if touched or self.colorFilter.decide(self.colorFilter.scores(frame[y0:y1, x0:x1])[0], None)[0]:
+                selected.append((x0, y0, x1, y1))
+            self.tiles += 1
+        self.tilesRun += len(selected)
+        return selected
+
+    def detect(self, model: 'YOLO', frame: np.ndarray, conf: float, path: str = '') -> 'Results':
+        import torch
+        from ultralytics.engine.results import Results
+
+        coarse = model.predict(source=frame, conf=self.coarseConf, verbose=False)[0].boxes
+        coarseBoxes = coarse.xyxy.cpu().numpy()
+        confident = (coarse.conf >= conf).cpu().numpy()
+        boxes = [coarse.data.cpu().numpy()[confident]]
+
+        tiles = self.selectTiles(frame, coarseBoxes)
+        for i in range(0, len(tiles), self.batchSize):
+            batch = tiles[i:i + self.batchSize]
+            crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in batch]
+            for (x0, y0, _, _), result in zip(batch, model.predict(source=crops, conf=conf, imgsz=self.tileSize,
+                                                                   verbose=False)):
+                data = result.boxes.data.cpu().numpy().copy()
+                data[:, [0, 2]] += x0
+                data[:, [1, 3]] += y0
+                boxes.append(data)
+
+        data = np.concatenate(boxes) if boxes else np.zeros((0, 6), dtype=np.float32)
+        if len(data):
+            data = data[mergeBoxes(data[:, :4], data[:, 4], data[:, 5], self.mergeThreshold)]
+        return Results(frame, path=path, names=model.names, boxes=torch.from_numpy(data.astype(np.float32)))
+
+    def resetCounts(self) -> None:
+        self.tiles = 0
+        self.tilesRun = 0
+
+    def stats(self) -> dict:
+        return {'tiles': self.tiles, 'tilesRun': self.tilesRun}
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# @FileName    :watch.py
+
+"""
+watch folder mode: files dropped into a folder (or any folder below it) are detected as soon as they are
+completely written, with a model that stays loaded between them.
+linux uses inotify, everything else (and shares where inotify misses the writes of other machines) polls.
+nothing in here may import Qt, the engine is only imported once detection starts.
+"""
+
+import os
+import time
+import queue
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+
+from settings import isImagePath, isVideoPath, pa
+from scanner import SourceScanner, matchesAny, sniffType
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+class Inotify:
+    """the few inotify calls needed here, through ctypes"""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs: dict[int, str] = {}  # watch descriptor -> directory
+
+    def add(self, directory: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                         IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'can not watch {directory}')
+        self.dirs[wd] = directory
+
+    def read(self, timeout: float) -> list[tuple[str, int]] | None:
+        """(path, mask) of the events of the next timeout seconds, None when the kernel queue overflowed"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if wd in self.dirs and name:
+                events.append((os.path.join(self.dirs[wd], os.fsdecode(name)), mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    calls onReady(paths) from its own thread with the new or rewritten images / videos below root.
+
+    a file is only handed out once it can be opened and its size and mtime did not change for `settle` seconds,
+    or right away when inotify saw its writer close it (or it was moved in) and it did not change since.
+    a camera still uploading a snapshot or a video still being copied is never detected half written.
+    include / exclude / sniff work like in scanner.SourceScanner. files that are already there when the
+    watch starts are left alone, add the folder to the list to detect them.
+    """
+
+    def __init__(self, root: str, onReady, include: list[str] | None = None, exclude: list[str] | None = None,
+                 sniff: bool = True, settle: float = 1.0, pollInterval: float = 2.0, polling: bool = False):
+        self.root = os.path.abspath(root)
+        self.onReady = onReady
+        self.include = include or []
+        self.exclude = exclude or []
+        self.sniff = sniff
+        self.settle = settle
+        self.pollInterval = pollInterval
+        self.polling = polling
+
+        self.known: dict[str, tuple[int, int]] = {}  # path -> (size, mtime_ns) of the version already handed out
+        self.pending: dict[str, list] = {}  # path -> [size, mtime_ns, last change, closed by its writer]
+        self.running = threading.Event()
+        self.thread = None
+        self.backend = ''
+
+    def start(self) -> None:
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, name='FolderWatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """without wait the thread ends on its own after its current poll / read"""
+        self.running.clear()
+        if wait and self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def _relPath(self, path: str) -> str:
+        return pa(os.path.relpath(path, self.root))
+
+    def _excluded(self, path: str) -> bool:
+        # a file is excluded when one of its folders is
+        parts = self._relPath(path).split('/')
+        return any(matchesAny('/'.join(parts[:i]), parts[i - 1], self.exclude) for i in range(1, len(parts) + 1))
+
+    def _candidate(self, path: str) -> bool:
+        name = os.path.basename(path)
+        if not (isImagePath(name) or isVideoPath(name)):
+            return False
+        if self.include and not matchesAny(self._relPath(path), name, self.include):
+            return False
+        return not (self.exclude and self._excluded(path))
+
+    def _walk(self) -> list[str]:
+        return [path for paths in SourceScanner(self.include, self.exclude, sniff=False).scan([self.root])
+                for path in paths]
+
+    def _touch(self, path: str, closed: bool = False) -> None:
+        """a file was written to, (re)start its settle time"""
+        path = pa(path)
+        try:
+            stat = os.stat(path)
+        except OSError:  # already gone again
+            self.pending.pop(path, None)
+            return
+        version = (stat.st_size, stat.st_mtime_ns)
+        if self.known.get(path) == version:
+            return
+        entry = self.pending.get(path)
+        if entry is None or (entry[0], entry[1]) != version:
+            self.pending[path] = [*version, time.monotonic(), closed]
+        elif closed:
+            entry[3] = True
+
+    def _collectReady(self) -> list[str]:
+        ready = []
+        for path in list(self.pending):
+            self._touch(path)  # picks up size / mtime changes no event was seen for (network shares)
+            entry = self.pending.get(path)
+            if entry is None or not entry[0]:
+                continue
+            if not entry[3] and time.monotonic() - entry[2] < self.settle:
+                continue
+            try:
+                open(path, 'rb').close()  # windows: fails while the writer still holds the file
+            except OSError:
+                continue
+            del self.pending[path]
+            self.known[path] = (entry[0], entry[1])
+            kind = 'image' if isImagePath(path) else 'video'
+            if self.sniff and sniffType(path) != kind:
+                print(f'watch: {path} is not a valid {kind}, skipped')
+                continue
+            ready.append(path)
+        return ready
+
+    def _run(self) -> None:
+        inotify = None
+        if not self.polling:
+            try:
+                inotify = Inotify()
+            except (OSError, AttributeError) as e:  # not linux, or no inotify in this libc
+                print(f'watch: inotify not available ({e}), polling every {self.pollInterval} s')
+
+        # what is there now is not new
+        for path in self._walk():
+            try:
+                stat = os.stat(path)
+                self.known[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+        try:
+            if inotify is not None:
+                self._watchDirs(inotify, self.root)
+        except OSError as e:  # e.g. the inotify watch limit
+            print(f'watch: {e}, polling every {self.pollInterval} s')
+            inotify.close()
+            inotify = None
+        self.backend = 'inotify' if inotify is not None else 'polling'
+        print(f'watching {self.root} ({self.backend})')
+
+        lastPoll = time.monotonic()
+        try:
+            while self.running.is_set():
+                if inotify is not None:
+                    events = inotify.read(0.1 if self.pending else 1.0)
+                    if events is None:  # events were lost, look at everything again
+                        events = [(path, 0) for path in self._walk()]
+                    for path, mask in events:
+                        if mask & IN_ISDIR:
+                            if not self._excluded(path):
+                                self._watchDirs(inotify, path)
+                                for found in self._listFiles(path):  # written before the watch was in place
+                                    self._touch(found)
+                        elif self._candidate(path):
+                            self._touch(path, closed=bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)))
+                else:
+                    self.running.wait(min(self.settle, self.pollInterval) / 2)
+                    if time.monotonic() - lastPoll >= self.pollInterval:
+                        lastPoll = time.monotonic()
+                        for path in self._walk():
+                            self._touch(path)
+
+                ready = self._collectReady()
+                if ready:
+                    self.onReady(ready)
+        finally:
+            inotify.close() if inotify is not None else None
+
+    def _watchDirs(self, inotify: Inotify, top: str) -> None:
+        inotify.add(top)
+        for directory, subDirs, _ in os.walk(top):
+            subDirs[:] = [name for name in subDirs if not self._excluded(os.path.join(directory, name))]
+            for name in subDirs:
+                inotify.add(os.path.join(directory, name))
+
+    def _listFiles(self, top: str) -> list[str]:
+        return [os.path.join(directory, name) for directory, _, names in os.walk(top) for name in names
+                if self._candidate(os.path.join(directory, name))]
+
+
+class WatchDetector:
+    """
+    detects what a FolderWatcher hands out on its own thread, in this process with a model that stays loaded,
+    files arriving while a batch runs are detected together in the next one.
+    onFinished / onAlert are the ones of engine.detectSources, onQueued(paths) is called when files arrive.
+    stop() cancels a running video after its current frame (it is reported as failed). once the thread ended
+    onCancelled(paths) gets the queued files that were never detected, files arriving after stop() are dropped.
+    """
+
+    modelLock = threading.Lock()  # a detector still finishing its last frame and a new one share the 'watch' model
+
+    def __init__(self, settings, root: str, onQueued=None, onFinished=None, onAlert=None, device: str | None = None,
+                 onCancelled=None):
+        self.settings = settings
+        self.onQueued = onQueued
+        self.onFinished = onFinished
+        self.onCancelled = onCancelled
+        self.onAlert = onAlert
+        self.device = device
+        self.queue: queue.Queue = queue.Queue()
+        self.watcher = FolderWatcher(root, self.add, settings.scanInclude, settings.scanExclude,
+                                     sniff=settings.scanSniff, settle=settings.watchSettle,
+                                     pollInterval=settings.watchPollInterval, polling=settings.watchPolling)
+        self.thread = None
+        self.stopping = threading.Event()
+        self.pending: set[str] = set()  # handed to onQueued, no onFinished yet
+        self._lock = threading.Lock()
+        self.latencies: list[float] = []  # seconds from handed out to detected
+
+    def add(self, paths: list[str]) -> None:
+        with self._lock:
+            if self.stopping.is_set():  # the watcher thread may still hand out files after stop()
+                return
+            self.pending.update(paths)
+            self.onQueued(paths) if self.onQueued else None
+            for path in paths:
+                self.queue.put((path, time.monotonic()))
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, name='WatchDetector', daemon=True)
+        self.thread.start()
+        self.watcher.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """without wait nothing blocks, e.g. on the gui thread: the threads end on their own within a frame"""
+        with self._lock:
+            self.stopping.set()
+        self.watcher.stop(wait)
+        self.queue.put(None)
+        if wait and self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+    def _run(self) -> None:
+        from engine import modelRegistry, defaultDevice
+
+        settings = self.settings
+        device = self.device or ('cpu' if settings.backend != 'pytorch' else defaultDevice())
+        try:
+            # loaded now, the first file must not wait for it
+            modelRegistry.get(settings.ModelPath, device=device, backend=settings.backend, slot='watch')
+        except Exception as e:
+            print(f'watch: failed to load model: {e}')
+
+        queued: dict[str, float] = {}
+
+        def onFinished(path: str, ok: bool) -> None:
+            self.latencies.append(time.monotonic() - queued.pop(path, time.monotonic()))
+            with self._lock:
+                self.pending.discard(path)
+            self.onFinished(path, ok) if self.onFinished else None
+
+        try:
+            self._detectQueued(settings, device, queued, onFinished)
+        finally:
+            with self._lock:
+                cancelled, self.pending = sorted(self.pending), set()
+            self.onCancelled(cancelled) if self.onCancelled and cancelled else None
+
+    def _detectQueued(self, settings, device: str, queued: dict[str, float], onFinished) -> None:
+        from engine import detectSources
+
+        while (item := self.queue.get()) is not None and not self.stopping.is_set():  # the rest is cancelled
+            batch = [item]
+            while len(batch) < settings.batchSize:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)
+                    break
+                batch.append(item)
+            queued.update(batch)
+            try:
+                with self.modelLock:
+                    detectSources([path for path, _ in batch], settings, device=device, onFinished=onFinished,
+                                  onAlert=self.onAlert, workers=1, slot='watch', cancel=self.stopping)
+            except Exception as e:
+                print(f'watch: detection failed: {e}')
+                for path, _ in batch:
+                    onFinished(path, False) if path in queued else None
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {'backend': self.watcher.backend, 'detected': len(latencies),
+                'latencyMs': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None}